@@ -23,5 +23,33 @@ app.conf.beat_schedule = {
     'loan_paid':{
         'task': 'bank.tasks.loan_paid',
         'schedule': crontab(hour=6, minute=46)
+    },
+    'sweep-expired-statements': {
+        'task': 'bank.tasks.sweep_expired_statements',
+        'schedule': crontab(minute=15)
+    },
+    'run-scheduled-transfers': {
+        'task': 'bank.tasks.run_scheduled_transfers',
+        'schedule': crontab()
+    },
+    'accrue-savings-interest': {
+        'task': 'bank.tasks.accrue_savings_interest',
+        'schedule': crontab(hour=0, minute=30)
+    },
+    'collect-loan-installments': {
+        'task': 'bank.tasks.run_loan_collection',
+        'schedule': crontab(hour=1, minute=0)
+    },
+    'archive-old-transactions': {
+        'task': 'bank.tasks.archive_old_transactions',
+        'schedule': crontab(hour=2, minute=30)
+    },
+    'resolve-cross-shard-transfers': {
+        'task': 'bank.tasks.resolve_cross_shard_transfers',
+        'schedule': crontab()
+    },
+    'sweep-authorization-holds': {
+        'task': 'bank.tasks.sweep_authorization_holds',
+        'schedule': crontab()
     }
 }
\ No newline at end of file
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 import os
 from pathlib import Path
+from decimal import Decimal
 from dotenv import load_dotenv
 from decouple import config
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bank.middleware.QueryMetricsMiddleware',
+    'bank.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,12 +82,93 @@ WSGI_APPLICATION = 'Bank.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=postgres selects the production profile; everything else is read
+# from the environment. Setting DB_REPLICA_HOST adds a read replica that
+# read-only requests are routed to (see bank/routers.py).
+
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+# DB_SHARDS > 1 spreads accounts and everything hanging off them (transactions,
+# loans, schedules, accruals) over 'default' plus shard1..shard<N-1> (see
+# bank/sharding.py). Fix it before accounts exist: an account's shard is
+# derived from its id and number.
+DB_SHARDS = config('DB_SHARDS', default=1, cast=int)
+
+if DB_ENGINE == 'postgres':
+    DB_POOL = config('DB_POOL', default=False, cast=bool)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='bank'),
+            'USER': config('DB_USER', default='bank'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            # persistent connections and psycopg's pool are mutually exclusive
+            'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+            },
+        }
+    }
+    if DB_POOL:
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        }
+    if config('DB_REPLICA_HOST', default=''):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+            'HOST': config('DB_REPLICA_HOST'),
+            'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+    for shard in range(1, DB_SHARDS):
+        DATABASES[f'shard{shard}'] = {
+            **DATABASES['default'],
+            'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+            'NAME': config(f'DB_SHARD{shard}_NAME', default=f"{DATABASES['default']['NAME']}_shard{shard}"),
+            'HOST': config(f'DB_SHARD{shard}_HOST', default=DATABASES['default']['HOST']),
+            'PORT': config(f'DB_SHARD{shard}_PORT', default=DATABASES['default']['PORT']),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+    # shard1 always exists locally so the sharding tests have a second database
+    for shard in range(1, max(DB_SHARDS, 2)):
+        DATABASES[f'shard{shard}'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / f'db_shard{shard}.sqlite3',
+        }
+
+ACCOUNT_SHARDS = ['default'] + [f'shard{shard}' for shard in range(1, DB_SHARDS)]
+# cross-shard transfers still PENDING after this long are finished by the sweeper
+CROSS_SHARD_RESOLVE_AFTER_SECONDS = config('CROSS_SHARD_RESOLVE_AFTER_SECONDS', default=60, cast=int)
+
+DATABASE_ROUTERS = ['bank.routers.ShardRouter', 'bank.routers.PrimaryReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = config('DB_REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+# A shared cache (Redis) is needed for replica stickiness to work across
+# processes; without CACHE_URL each process keeps its own local cache.
+if config('CACHE_URL', default=''):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('CACHE_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 AUTH_USER_MODEL = 'bank.CustomUser'
 
@@ -131,6 +215,23 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],  
+    'DEFAULT_RENDERER_CLASSES': [
+        'bank.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'bank.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # token buckets per endpoint class, see bank/throttling.py
+    'DEFAULT_THROTTLE_RATES': {
+        'transfers': config('THROTTLE_TRANSFERS', default='30/min'),
+        'loans': config('THROTTLE_LOANS', default='5/hour'),
+        'statements': config('THROTTLE_STATEMENTS', default='10/hour'),
+        'exports': config('THROTTLE_EXPORTS', default='20/hour'),
+        'search': config('THROTTLE_SEARCH', default='60/min'),
+    },
 }
 
 CORS_ALLOW_CREDENTIALS = True
@@ -164,6 +265,126 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_ENABLE_UTC= True
 CELERY_TIMEZONE = 'UTC'
 
+# Task lanes: one queue per kind of work so a backlog of statement renders
+# or nightly jobs never delays a transfer notification. Run a worker per lane
+# with `manage.py lane_worker <lane>`, which passes the lane's concurrency and
+# prefetch to celery. Time limits apply to every task routed to the lane,
+# whichever worker runs it.
+TASK_LANES = {
+    # per-event notifications, short and latency sensitive
+    'realtime': {'concurrency': 8, 'prefetch_multiplier': 4, 'soft_time_limit': 20, 'time_limit': 30},
+    # mail sent to many recipients in one task
+    'mail': {'concurrency': 2, 'prefetch_multiplier': 1, 'soft_time_limit': 600, 'time_limit': 660},
+    # weasyprint rendering, CPU bound; recycle children to cap memory. preload
+    # is imported by the worker before it forks, so children share it
+    'pdf': {'concurrency': 2, 'prefetch_multiplier': 1, 'soft_time_limit': 120, 'time_limit': 180, 'max_tasks_per_child': 50, 'preload': ['bank.rendering']},
+    # scheduled and chunked batch jobs
+    'batch': {'concurrency': 4, 'prefetch_multiplier': 1, 'soft_time_limit': 7200, 'time_limit': 7500},
+}
+TASK_LANE_ROUTES = {
+    'realtime': [
+        'bank.tasks.welcome_user', 'bank.tasks.send_transaction_email', 'bank.tasks.send_transfer_email',
+        'bank.tasks.loan_accepted', 'bank.tasks.loan_payment_interest', 'bank.tasks.settle_account_holds',
+    ],
+    'mail': ['bank.tasks.loan_payment_due', 'bank.tasks.loan_paid', 'bank.tasks.notify_loan_decisions'],
+    'pdf': ['bank.tasks.generate_transaction_pdf'],
+}
+CELERY_TASK_DEFAULT_QUEUE = 'batch'
+CELERY_TASK_ROUTES = {
+    task: {'queue': lane} for lane, tasks in TASK_LANE_ROUTES.items() for task in tasks
+}
+CELERY_TASK_ANNOTATIONS = {
+    task: {'soft_time_limit': TASK_LANES[lane]['soft_time_limit'], 'time_limit': TASK_LANES[lane]['time_limit']}
+    for lane, tasks in TASK_LANE_ROUTES.items() for task in tasks
+}
+CELERY_TASK_SOFT_TIME_LIMIT = TASK_LANES['batch']['soft_time_limit']
+CELERY_TASK_TIME_LIMIT = TASK_LANES['batch']['time_limit']
+
+# Rendered PDF statements, see bank/statements.py. Set STATEMENT_SENDFILE_HEADER
+# to X-Accel-Redirect (nginx) or X-Sendfile (Apache) to offload downloads.
+STATEMENT_STORAGE_DIR = config('STATEMENT_STORAGE_DIR', default=str(BASE_DIR / 'statements'))
+STATEMENT_TTL_HOURS = config('STATEMENT_TTL_HOURS', default=24, cast=int)
+STATEMENT_SENDFILE_HEADER = config('STATEMENT_SENDFILE_HEADER', default='')
+STATEMENT_ACCEL_PREFIX = config('STATEMENT_ACCEL_PREFIX', default='/protected/statements/')
+
+# Server-Sent Events (/api/events/, needs ASGI). The in-process broker only
+# reaches clients connected to the same process; use redis when running
+# several web processes or to deliver events published by Celery workers.
+EVENTS_BACKEND = config('EVENTS_BACKEND', default='memory')
+EVENTS_REDIS_URL = config('EVENTS_REDIS_URL', default=CELERY_BROKER_URL)
+EVENTS_HEARTBEAT_SECONDS = config('EVENTS_HEARTBEAT_SECONDS', default=15, cast=int)
+
+# Daily interest on SAVINGS accounts, see bank/accrual.py. SAVINGS_DAY_COUNT is
+# ACT/365 (fixed 365-day year) or ACT/ACT (366 days in leap years).
+SAVINGS_INTEREST_RATE = config('SAVINGS_INTEREST_RATE', default='3.00', cast=Decimal)
+SAVINGS_DAY_COUNT = config('SAVINGS_DAY_COUNT', default='ACT/365')
+ACCRUAL_CHUNK_SIZE = config('ACCRUAL_CHUNK_SIZE', default=1000, cast=int)
+
+# Currency conversion, see bank/fx.py. Rates are loaded with the
+# load_fx_rates command; processes re-check the rate table version at most
+# every FX_VERSION_CHECK_SECONDS.
+FX_BASE_CURRENCY = config('FX_BASE_CURRENCY', default='NPR')
+FX_RATES_FILE = config('FX_RATES_FILE', default=str(BASE_DIR / 'bank' / 'data' / 'fx_rates.csv'))
+FX_VERSION_CHECK_SECONDS = config('FX_VERSION_CHECK_SECONDS', default=5, cast=float)
+
+# Throttling backend: 'memory' limits per process, 'redis' shares buckets
+# across processes. Endpoints that enqueue Celery work answer 503 while the
+# lane's queue holds more than CELERY_BACKPRESSURE_DEPTH messages (0 = off).
+THROTTLE_BACKEND = config('THROTTLE_BACKEND', default='memory')
+THROTTLE_REDIS_URL = config('THROTTLE_REDIS_URL', default=CELERY_BROKER_URL)
+CELERY_BACKPRESSURE_DEPTH = config('CELERY_BACKPRESSURE_DEPTH', default=5000, cast=int)
+CELERY_BACKPRESSURE_CHECK_SECONDS = config('CELERY_BACKPRESSURE_CHECK_SECONDS', default=5, cast=int)
+
+# Velocity limits on money leaving an account (transfers and withdrawals),
+# see bank/velocity.py. 0 disables a limit. The memory backend only sees
+# activity in its own process; use redis when running several web processes.
+VELOCITY_BACKEND = config('VELOCITY_BACKEND', default='memory')
+VELOCITY_REDIS_URL = config('VELOCITY_REDIS_URL', default=CELERY_BROKER_URL)
+VELOCITY_HOURLY_COUNT = config('VELOCITY_HOURLY_COUNT', default=20, cast=int)
+VELOCITY_HOURLY_AMOUNT = config('VELOCITY_HOURLY_AMOUNT', default='200000', cast=Decimal)
+VELOCITY_DAILY_COUNT = config('VELOCITY_DAILY_COUNT', default=100, cast=int)
+VELOCITY_DAILY_AMOUNT = config('VELOCITY_DAILY_AMOUNT', default='1000000', cast=Decimal)
+
+# Hot/cold transaction storage, see bank/archive.py. Transactions older
+# than TRANSACTION_HOT_DAYS are moved nightly into bank_transactionarchive
+# (range-partitioned by month on Postgres); history reads and exports
+# include the archive only when their date range reaches it.
+TRANSACTION_HOT_DAYS = config('TRANSACTION_HOT_DAYS', default=365, cast=int)
+TRANSACTION_ARCHIVE_CHUNK_SIZE = config('TRANSACTION_ARCHIVE_CHUNK_SIZE', default=5000, cast=int)
+TRANSACTION_ARCHIVE_TIME_LIMIT = config('TRANSACTION_ARCHIVE_TIME_LIMIT', default=3000, cast=int)
+
+# Balance-chain audit, see bank/reconciliation.py: account ids per chunk and
+# worker processes for manage.py reconcile_balances
+RECONCILE_CHUNK_SIZE = config('RECONCILE_CHUNK_SIZE', default=1000, cast=int)
+RECONCILE_WORKERS = config('RECONCILE_WORKERS', default=4, cast=int)
+
+# User offboarding, see bank/offboarding.py: rows archived or deleted per DB
+# transaction, and how long a pending or running job may go without progress
+# before a repeated DELETE queues it again
+OFFBOARDING_CHUNK_SIZE = config('OFFBOARDING_CHUNK_SIZE', default=1000, cast=int)
+OFFBOARDING_STALE_SECONDS = config('OFFBOARDING_STALE_SECONDS', default=900, cast=int)
+
+# Authorization holds on transfers and withdrawals, see bank/posting.py:
+# funds are reserved with one conditional UPDATE and posted by settlement.
+# With SETTLE_HOLDS_ASYNC the API answers 202 with the hold and a task
+# settles each account's open holds in batches; otherwise the request
+# settles its own hold. Holds still open after HOLD_EXPIRY_SECONDS are
+# released, after the sweeper has settled what async settlement missed.
+SETTLE_HOLDS_ASYNC = config('SETTLE_HOLDS_ASYNC', default=False, cast=bool)
+HOLD_SETTLEMENT_BATCH = config('HOLD_SETTLEMENT_BATCH', default=500, cast=int)
+HOLD_EXPIRY_SECONDS = config('HOLD_EXPIRY_SECONDS', default=900, cast=int)
+
+# Request/query instrumentation, see bank/middleware.py and /metrics.
+# /metrics answers 403 until METRICS_AUTH_TOKEN is set, then wants it as a Bearer token.
+METRICS_SAMPLE_RATE = config('METRICS_SAMPLE_RATE', default=1.0, cast=float)
+METRICS_SLOW_REQUEST_MS = config('METRICS_SLOW_REQUEST_MS', default=500, cast=int)
+METRICS_AUTH_TOKEN = config('METRICS_AUTH_TOKEN', default='')
+# Celery workers store their task metrics in the cache for /metrics to merge,
+# at most every METRICS_PUSH_SECONDS; the cache has to be shared (CACHE_URL)
+# for them to reach the web processes.
+METRICS_PUSH_SECONDS = config('METRICS_PUSH_SECONDS', default=10, cast=float)
+METRICS_WORKER_TTL = config('METRICS_WORKER_TTL', default=300, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
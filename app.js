@@ -133,6 +133,7 @@ async function logout() {
             headers: { 'Authorization': `Token ${authToken}` }
         });
     } catch (err) { }
+    disconnectEvents();
     localStorage.removeItem("authToken");
     localStorage.removeItem("isAdmin");
     authToken = null;
@@ -145,9 +146,12 @@ async function logout() {
 
 async function loadDashboard() {
     if (!authToken) return;
+    connectEvents();
     try {
-        const res = await fetch(`${API_URL}/accounts/`, { headers: { 'Authorization': `Token ${authToken}` } });
-        const accounts = await res.json();
+        // one request for accounts and recent transactions instead of a waterfall
+        const res = await fetch(`${API_URL}/home/?fields=accounts,transactions`, { headers: { 'Authorization': `Token ${authToken}` } });
+        const home = await res.json();
+        const accounts = home.accounts;
         if (!Array.isArray(accounts) || accounts.length === 0) {
             document.getElementById('noAccountView').style.display = 'block';
             document.getElementById('accountView').style.display = 'none';
@@ -156,7 +160,7 @@ async function loadDashboard() {
             document.getElementById('noAccountView').style.display = 'none';
             document.getElementById('accountView').style.display = 'block';
             displayAccountDetails(currentAccount);
-            await loadTransactions(currentAccount.id);
+            setTransactions(home.transactions, currentAccount.id);
         }
     } catch (err) {
         console.error(err);
@@ -189,6 +193,56 @@ function displayAccountDetails(account) {
     `;
 }
 
+// --- Live updates (Server-Sent Events) ---
+let eventSource = null;
+const pendingStatements = {};
+const finishedStatements = new Set();
+
+function connectEvents() {
+    if (eventSource || !authToken || typeof EventSource === 'undefined') return;
+    eventSource = new EventSource(`${API_URL}/events/?token=${authToken}`);
+    eventSource.addEventListener('balance', e => {
+        const data = JSON.parse(e.data);
+        if (currentAccount && currentAccount.id === data.account_id) {
+            currentAccount.balance = data.balance;
+            displayAccountDetails(currentAccount);
+        }
+    });
+    eventSource.addEventListener('transaction', e => {
+        const tx = JSON.parse(e.data);
+        if (currentAccount && tx.account === currentAccount.id) {
+            allTransactions.unshift(tx);
+            renderTransactions(currentAccount.id);
+        }
+    });
+    eventSource.addEventListener('statement', e => {
+        const data = JSON.parse(e.data);
+        if (pendingStatements[data.task_id]) {
+            pendingStatements[data.task_id]();
+            delete pendingStatements[data.task_id];
+        } else {
+            finishedStatements.add(data.task_id);
+        }
+    });
+}
+
+function disconnectEvents() {
+    if (eventSource) eventSource.close();
+    eventSource = null;
+}
+
+function liveUpdates() {
+    return eventSource !== null && eventSource.readyState === EventSource.OPEN;
+}
+
+function waitForStatement(taskId, timeoutMs = 60000) {
+    return new Promise(resolve => {
+        if (finishedStatements.delete(taskId)) return resolve();
+        pendingStatements[taskId] = resolve;
+        setTimeout(resolve, timeoutMs);
+    });
+}
+
 // --- Transactions ---
 async function loadTransactions(accountId) {
     if (!authToken) return;
@@ -198,13 +252,7 @@ async function loadTransactions(accountId) {
         });
         const data = await res.json();
         if (res.ok) {
-            allTransactions = data.map(t => {
-                if (t.recipient_account && typeof t.recipient_account === 'object') {
-                    t.recipient_account_number = t.recipient_account.account_number || '';
-                }
-                return t;
-            });
-            renderTransactions(accountId);
+            setTransactions(data, accountId);
         } else {
             document.getElementById("dashboardTransactionsList").innerHTML = "<p>No transactions</p>";
         }
@@ -214,6 +262,16 @@ async function loadTransactions(accountId) {
     }
 }
 
+function setTransactions(data, accountId) {
+    allTransactions = data.map(t => {
+        if (t.recipient_account && typeof t.recipient_account === 'object') {
+            t.recipient_account_number = t.recipient_account.account_number || '';
+        }
+        return t;
+    });
+    renderTransactions(accountId);
+}
+
 function renderTransactions(accountId) {
     let filtered = allTransactions;
 
@@ -242,7 +300,7 @@ function renderTransactions(accountId) {
                 <div class="transaction-desc">${new Date(t.created_at).toLocaleString()}</div>
             </div>
             <div class="transaction-amount ${t.transaction_type.toLowerCase()}">
-                ${t.transaction_type === 'DEPOSIT' ? '+' : t.transaction_type === 'TRANSFER' ? (t.recipient_account === accountId ? '+' : '-') : '-'}${parseFloat(t.amount).toFixed(2)}
+                ${['DEPOSIT', 'INTEREST'].includes(t.transaction_type) ? '+' : t.transaction_type === 'TRANSFER' ? (t.recipient_account === accountId ? '+' : '-') : '-'}${parseFloat(t.recipient_account === accountId && t.recipient_amount ? t.recipient_amount : t.amount).toFixed(2)}
             </div>
         </div>
         `;
@@ -330,7 +388,8 @@ async function handleTransaction(e) {
         const result = await res.json();
         if (res.ok) {
             hideTransactionForm();
-            await loadDashboard();
+            // with a live event stream the balance and history update themselves
+            if (!liveUpdates()) await loadDashboard();
             showMessage('transactionMessage', 'Transaction successful', 'success');
         } else {
             const errorMsg = typeof result === 'object' ? Object.values(result).flat().join(', ') : 'Transaction failed';
@@ -608,22 +667,39 @@ document.getElementById("downloadTransactionsBtn").addEventListener("click", asy
         const res = await fetch(`${API_URL}/download-pdf/`, {
             headers: { 'Authorization': `Token ${authToken}` }
         });
-        const { task_id } = await res.json();
-        let status;
-        do {
+        if (!res.ok) {
+            // 429 when over the statement limit, 503 while the job queue is backed up
+            const { detail } = await res.json();
+            alert(detail || 'Could not start the download');
+            return;
+        }
+        const { task_id, notify } = await res.json();
+        // notify is false when worker events cannot reach this stream; poll straight away
+        if (notify && liveUpdates()) await waitForStatement(task_id);
+        let status = "pending";
+        while (status === "pending" || status === "running") {
             const check = await fetch(`${API_URL}/check-pdf-status/${task_id}/`, {
                 headers: { 'Authorization': `Token ${authToken}` }
             });
 
             if (check.headers.get("Content-Type") === "application/pdf") {
-                window.location.href = `${API_URL}/check-pdf-status/${task_id}/`;
+                const blob = await check.blob();
+                const link = document.createElement("a");
+                link.href = URL.createObjectURL(blob);
+                link.download = "transactions.pdf";
+                link.click();
+                URL.revokeObjectURL(link.href);
                 break;
             }
 
             const data = await check.json();
             status = data.status;
-            await new Promise(r => setTimeout(r, 3000));
-        } while (status === "pending");
+            if (status === "pending" || status === "running") {
+                // still rendering: wait as long as the server asks before checking again
+                const seconds = Number(check.headers.get("Retry-After")) || 3;
+                await new Promise(resolve => setTimeout(resolve, seconds * 1000));
+            }
+        }
     } catch (err) {
         console.error("Download failed", err);
     }
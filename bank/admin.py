@@ -1,37 +1,127 @@
 # admin.py
-from django.contrib import admin
-from .models import CustomUser, Account, Transaction, Loan, LoanInterest
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib import admin, messages
+from django.db.models import DecimalField, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import CustomUser, Account, Transaction, Loan, LoanInterest, StatementJob, ScheduledTransfer, ScheduledTransferRun, InterestAccrual, AccrualRun, FxRate, TransactionArchive, AuditRun, AuditDiscrepancy, OffboardingJob, AuthorizationHold
+from .paginators import EstimatedCountPaginator
+from .search import SearchError, match_accounts, match_transactions, match_users
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with millions of rows: no exact COUNT(*), no unfiltered total."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class IndexedSearchMixin:
+    """Changelist search through bank.search (FTS5 / pg_trgm indexes) instead of icontains scans."""
+    search_match = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        try:
+            return self.search_match(queryset, search_term), False
+        except SearchError as e:
+            self.message_user(request, str(e), messages.WARNING)
+            return queryset.none(), False
+
+
+class CreatedMonthFilter(admin.SimpleListFilter):
+    """
+    Month drill-down on created_at. The choices come from MIN/MAX (two index
+    probes) rather than the SELECT DISTINCT over every row that
+    date_hierarchy runs, and a choice filters on a [month, next month) range.
+    """
+    title = 'created month'
+    parameter_name = 'created_month'
+    max_months = 120
+
+    def lookups(self, request, model_admin):
+        bounds = model_admin.model._default_manager.aggregate(first=Min('created_at'), last=Max('created_at'))
+        if bounds['first'] is None:
+            return []
+        first, month = timezone.localtime(bounds['first']), timezone.localtime(bounds['last'])
+        choices = []
+        while (month.year, month.month) >= (first.year, first.month) and len(choices) < self.max_months:
+            choices.append((f'{month:%Y-%m}', f'{month:%B %Y}'))
+            month = month.replace(day=1) - timedelta(days=1)
+        return choices
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            start = timezone.make_aware(datetime.strptime(self.value(), '%Y-%m'))
+        except ValueError:
+            return queryset.none()
+        end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+        return queryset.filter(created_at__gte=start, created_at__lt=end)
+
 
 @admin.register(CustomUser)
-class CustomUserAdmin(admin.ModelAdmin):
+class CustomUserAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['username', 'email', 'first_name', 'last_name', 'is_staff', 'is_active']
     list_filter = ['is_staff', 'is_active', 'date_joined']
-    search_fields = ['username', 'email', 'first_name', 'last_name']
+    search_fields = ['username', 'email']
+    search_help_text = 'Username or email, at least 3 characters.'
+    search_match = staticmethod(match_users)
     ordering = ['-date_joined']
 
 @admin.register(Account)
-class AccountAdmin(admin.ModelAdmin):
+class AccountAdmin(IndexedSearchMixin, LargeTableAdmin):
     list_display = ['account_number', 'user', 'account_type', 'balance', 'currency', 'is_active', 'created_at']
     list_filter = ['account_type', 'is_active', 'currency']
+    list_select_related = ['user']
     search_fields = ['account_number', 'user__username', 'user__email']
-    readonly_fields = ['account_number', 'created_at', 'updated_at']
-    ordering = ['-created_at']
+    search_help_text = 'Account number prefix, or owner username/email.'
+    search_match = staticmethod(match_accounts)
+    readonly_fields = ['account_number', 'held_balance', 'created_at', 'updated_at']
+    raw_id_fields = ['user']
+    # ids grow with created_at, and the primary key index serves the sort
+    ordering = ['-id']
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(IndexedSearchMixin, LargeTableAdmin):
     list_display = ['id', 'account', 'transaction_type', 'amount', 'status', 'created_at']
-    list_filter = ['transaction_type', 'status', 'created_at']
+    list_filter = [CreatedMonthFilter, 'created_at', 'transaction_type', 'status']
+    list_select_related = ['account__user']
     search_fields = ['account__account_number', 'description']
+    search_help_text = 'Description text, or an account number prefix.'
+    search_match = staticmethod(match_transactions)
     readonly_fields = ['id', 'balance_after', 'created_at']
-    ordering = ['-created_at']
+    raw_id_fields = ['account', 'recipient_account']
+    ordering = ['-id']
+
+@admin.register(TransactionArchive)
+class TransactionArchiveAdmin(LargeTableAdmin):
+    list_display = ['id', 'account', 'transaction_type', 'amount', 'status', 'created_at', 'archived_at']
+    list_filter = [CreatedMonthFilter, 'transaction_type', 'status']
+    list_select_related = ['account__user']
+    search_fields = ['account__account_number__exact']
+    ordering = ['-id']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 @admin.register(Loan)
-class LoanAdmin(admin.ModelAdmin):
-    list_display = ['loan_id', 'borrower', 'loan_amount', 'interest_rate', 'loan_term_months', 'monthly_payment', 'status', 'applied_date']
+class LoanAdmin(LargeTableAdmin):
+    list_display = ['loan_id', 'borrower', 'loan_amount', 'interest_rate', 'loan_term_months', 'monthly_payment', 'total_paid_display', 'remaining_amount_display', 'status', 'applied_date']
     list_filter = ['status', 'is_accepted', 'applied_date']
-    search_fields = ['borrower__account_number', 'borrower__user__username']
+    list_select_related = ['borrower__user']
+    search_fields = ['loan_id__exact', 'borrower__account_number__exact', 'borrower__user__username__exact']
     readonly_fields = ['loan_id', 'monthly_payment', 'applied_date', 'accepted_date', 'total_payable_display', 'remaining_amount_display', 'total_paid_display']
-    ordering = ['-applied_date']
+    raw_id_fields = ['borrower']
+    ordering = ['-loan_id']
     
     fieldsets = (
         ('Loan Information', {
@@ -48,6 +138,17 @@ class LoanAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        # a correlated subquery is evaluated for the page's rows only, where
+        # with_payment_totals() would GROUP BY every loan before the LIMIT
+        paid = (
+            LoanInterest.objects.filter(loan=OuterRef('pk'))
+            .order_by().values('loan').annotate(total=Sum('amount')).values('total')
+        )
+        return super().get_queryset(request).annotate(
+            paid_total=Coalesce(Subquery(paid), Value(Decimal('0.00')), output_field=DecimalField(max_digits=12, decimal_places=2))
+        )
+
     def total_payable_display(self, obj):
         return f"NPR {obj.total_payable():,.2f}"
     total_payable_display.short_description = 'Total Payable'
@@ -61,9 +162,92 @@ class LoanAdmin(admin.ModelAdmin):
     total_paid_display.short_description = 'Total Paid'
 
 @admin.register(LoanInterest)
-class LoanInterestAdmin(admin.ModelAdmin):
+class LoanInterestAdmin(LargeTableAdmin):
     list_display = ['id', 'loan', 'amount', 'payment_date', 'payment_method']
     list_filter = ['payment_date', 'payment_method']
-    search_fields = ['loan__loan_id', 'transaction_id', 'notes']
+    list_select_related = ['loan__borrower__user']
+    search_fields = ['loan__loan_id__exact', 'transaction_id__exact']
     readonly_fields = ['id', 'payment_date']
-    ordering = ['-payment_date']
\ No newline at end of file
+    raw_id_fields = ['loan']
+    ordering = ['-payment_date']
+
+@admin.register(StatementJob)
+class StatementJobAdmin(LargeTableAdmin):
+    list_display = ['task_id', 'user', 'status', 'file_size', 'created_at', 'expires_at']
+    list_filter = ['status', 'created_at']
+    list_select_related = ['user']
+    search_fields = ['task_id', 'user__username']
+    readonly_fields = ['task_id', 'file_path', 'file_size', 'error', 'created_at', 'updated_at', 'completed_at', 'expires_at']
+    ordering = ['-created_at']
+
+@admin.register(ScheduledTransfer)
+class ScheduledTransferAdmin(admin.ModelAdmin):
+    list_display = ['id', 'account', 'recipient_account', 'amount', 'frequency', 'status', 'next_run_at', 'run_count', 'failure_count']
+    list_filter = ['status', 'frequency']
+    list_select_related = ['account__user', 'recipient_account__user']
+    search_fields = ['account__account_number', 'recipient_account__account_number']
+    readonly_fields = ['run_count', 'failure_count', 'last_run_at', 'last_error', 'created_at', 'updated_at']
+    raw_id_fields = ['account', 'recipient_account']
+    ordering = ['next_run_at']
+
+@admin.register(ScheduledTransferRun)
+class ScheduledTransferRunAdmin(LargeTableAdmin):
+    list_display = ['id', 'schedule', 'due_at', 'run_at', 'attempt', 'status', 'transaction_id']
+    list_filter = ['status', 'run_at']
+    list_select_related = ['schedule__account', 'schedule__recipient_account']
+    readonly_fields = ['schedule', 'due_at', 'run_at', 'attempt', 'status', 'error', 'transaction_id']
+    ordering = ['-run_at']
+
+@admin.register(InterestAccrual)
+class InterestAccrualAdmin(LargeTableAdmin):
+    list_display = ['id', 'account', 'accrual_date', 'balance', 'annual_rate', 'amount', 'transaction_id']
+    list_filter = ['accrual_date']
+    list_select_related = ['account__user']
+    raw_id_fields = ['account']
+    ordering = ['-accrual_date']
+
+@admin.register(AccrualRun)
+class AccrualRunAdmin(admin.ModelAdmin):
+    list_display = ['accrual_date', 'status', 'accounts_processed', 'accounts_credited', 'total_interest', 'seconds_elapsed', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['last_account_id', 'accounts_processed', 'accounts_credited', 'total_interest', 'seconds_elapsed', 'started_at', 'finished_at']
+    ordering = ['-accrual_date']
+
+@admin.register(FxRate)
+class FxRateAdmin(admin.ModelAdmin):
+    list_display = ['currency', 'rate', 'as_of', 'updated_at']
+    search_fields = ['currency']
+    ordering = ['currency']
+
+@admin.register(AuditRun)
+class AuditRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'accounts_checked', 'rows_checked', 'discrepancy_count', 'seconds_elapsed', 'started_at', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['last_account_id', 'max_account_id', 'accounts_checked', 'rows_checked', 'discrepancy_count', 'seconds_elapsed', 'started_at', 'finished_at']
+    ordering = ['-started_at']
+
+@admin.register(AuditDiscrepancy)
+class AuditDiscrepancyAdmin(LargeTableAdmin):
+    list_display = ['id', 'run', 'account', 'kind', 'transaction_id', 'expected', 'actual']
+    list_filter = ['kind', 'run']
+    list_select_related = ['run', 'account__user']
+    search_fields = ['account__account_number__exact', 'transaction_id__exact']
+    raw_id_fields = ['account']
+    ordering = ['account_id', 'transaction_id']
+
+@admin.register(OffboardingJob)
+class OffboardingJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'username', 'status', 'stage', 'rows_archived', 'rows_deleted', 'created_at', 'finished_at']
+    list_filter = ['status']
+    search_fields = ['username']
+    readonly_fields = ['user_id', 'username', 'account_ids', 'requested_by', 'status', 'stage', 'rows_archived', 'rows_deleted', 'error', 'created_at', 'updated_at', 'finished_at']
+    ordering = ['-created_at']
+
+@admin.register(AuthorizationHold)
+class AuthorizationHoldAdmin(LargeTableAdmin):
+    list_display = ['id', 'account', 'kind', 'amount', 'status', 'expires_at', 'created_at', 'settled_at']
+    list_filter = ['status', 'kind']
+    list_select_related = ['account__user']
+    search_fields = ['account__account_number__exact']
+    readonly_fields = ['account', 'kind', 'amount', 'recipient_account', 'description', 'status', 'error', 'transaction_id', 'expires_at', 'created_at', 'settled_at']
+    ordering = ['-id']
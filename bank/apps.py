@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class BankConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bank'
+
+    def ready(self):
+        from . import metrics  # noqa: F401  connects the Celery task signals
+        from . import fx  # noqa: F401  invalidates cached FX rates on change
+        from django.db.models.signals import post_migrate, post_save
+        from .search import on_post_migrate
+        from .sharding import on_user_saved
+        post_migrate.connect(on_post_migrate, sender=self)
+        post_save.connect(on_user_saved, sender=self.get_model('CustomUser'))
@@ -0,0 +1,148 @@
+# archive.py
+import logging
+import time
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Transaction, TransactionArchive
+from .sharding import per_shard, shards
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_UNTIL_KEY = 'transactions-archived-until'
+# columns copied from the hot table; archived_at is added on insert
+COLUMNS = [field.column for field in Transaction._meta.concrete_fields]
+
+
+def hot_cutoff(now=None):
+    return (now or timezone.now()) - timedelta(days=settings.TRANSACTION_HOT_DAYS)
+
+
+# each web process may have its own cache, which the archive job cannot clear
+ARCHIVED_UNTIL_TTL = 60
+
+
+def archived_until():
+    """Newest created_at in any shard's archive (None while empty), cached for a minute once there is one."""
+    value = cache.get(ARCHIVED_UNTIL_KEY)
+    if value is None:
+        value = max((
+            latest for queryset in per_shard(TransactionArchive.objects.all())
+            if (latest := queryset.aggregate(latest=Max('created_at'))['latest']) is not None
+        ), default=None)
+        if value is not None:
+            cache.set(ARCHIVED_UNTIL_KEY, value, ARCHIVED_UNTIL_TTL)
+    return value
+
+
+def transaction_sources(start=None, end=None, oldest_first=False):
+    """
+    Querysets that can hold transactions created in [start, end). The hot
+    table is always included (rows past the horizon stay there until the
+    next archive run); the archive only when the range reaches back to
+    what has been archived, or past the hot cutoff, which the archive job
+    may have moved since the cached horizon was read. Both expose the same
+    field names, so callers apply their filters and values() lookups to
+    each one.
+    """
+    sources = [Transaction.objects.all()]
+    latest_archived = archived_until()
+    if latest_archived is not None and (start is None or start <= latest_archived or start < hot_cutoff()):
+        sources.append(TransactionArchive.objects.all())
+    if start is not None:
+        sources = [qs.filter(created_at__gte=start) for qs in sources]
+    if end is not None:
+        sources = [qs.filter(created_at__lt=end) for qs in sources]
+    return sources[::-1] if oldest_first else sources
+
+
+def month_start(moment):
+    return moment.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(moment):
+    return (moment + timedelta(days=32)).replace(day=1)
+
+
+def ensure_partitions(first, last, alias=DEFAULT_DB_ALIAS):
+    """Postgres only: create the monthly archive partitions covering [first, last]."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return
+    table = TransactionArchive._meta.db_table
+    month = month_start(first)
+    with connection.cursor() as cursor:
+        while month <= last:
+            following = next_month(month)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {table}_y{month:%Y}m{month:%m} PARTITION OF {table} '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+            )
+            month = following
+
+
+def move_to_archive(rows, alias=DEFAULT_DB_ALIAS):
+    """
+    Copy transactions on shard `alias`, given as (id, created_at) pairs,
+    into that shard's archive and delete them from the hot table: one
+    INSERT ... SELECT and one DELETE. Call inside transaction.atomic(using=alias).
+    """
+    ids = [row_id for row_id, _ in rows]
+    stamps = [created_at for _, created_at in rows]
+    ensure_partitions(min(stamps), max(stamps), alias)
+    connection = connections[alias]
+
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(column) for column in COLUMNS)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(TransactionArchive._meta.db_table)} ({columns}, {quote("archived_at")}) '
+            f'SELECT {columns}, %s FROM {quote(Transaction._meta.db_table)} WHERE {quote("id")} IN ({placeholders})',
+            [timezone.now(), *ids],
+        )
+    # nothing references Transaction rows by FK, so this is a single DELETE
+    Transaction.objects.using(alias).filter(id__in=ids).delete()
+
+
+def archive_chunk(cutoff, chunk_size, alias=DEFAULT_DB_ALIAS):
+    """
+    Move up to `chunk_size` transactions on shard `alias` created before
+    `cutoff` into the archive in a single short DB transaction. Returns how
+    many rows moved.
+    """
+    with transaction.atomic(using=alias):
+        rows = list(
+            Transaction.objects.using(alias).filter(created_at__lt=cutoff)
+            .order_by('id')
+            .values_list('id', 'created_at')[:chunk_size]
+        )
+        if rows:
+            move_to_archive(rows, alias)
+    return len(rows)
+
+
+def archive_transactions(cutoff=None, chunk_size=None, time_limit=None):
+    """Archive everything past the hot horizon in chunks, shard by shard; returns (rows moved, seconds)."""
+    cutoff = cutoff or hot_cutoff()
+    chunk_size = chunk_size or settings.TRANSACTION_ARCHIVE_CHUNK_SIZE
+    started = time.monotonic()
+    moved = 0
+    for alias in shards():
+        while True:
+            count = archive_chunk(cutoff, chunk_size, alias)
+            moved += count
+            elapsed = time.monotonic() - started
+            if not count or (time_limit and elapsed > time_limit):
+                break
+            logger.info('Archived %d transactions (%.0f rows/s)', moved, moved / max(elapsed, 1e-6))
+        if time_limit and time.monotonic() - started > time_limit:
+            break
+    if moved:
+        cache.delete(ARCHIVED_UNTIL_KEY)
+    return moved, time.monotonic() - started
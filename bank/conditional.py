@@ -0,0 +1,108 @@
+# conditional.py
+"""
+Validators for conditional GET (django.views.decorators.http.condition).
+Each one costs at most a single aggregate query on timestamps (one per shard
+for the account and loan lists), never a full row load, and is computed once per
+request for both ETag and Last-Modified.
+Representations embed the owner's profile (nested user, borrower name), so
+the user's own updated_at is part of every validator.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import Account, Loan
+from .sharding import per_shard
+
+
+def _etag(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _memoized(func):
+    def wrapper(request, *args, **kwargs):
+        cache = request.__dict__.setdefault('_validators', {})
+        if func.__name__ not in cache:
+            cache[func.__name__] = func(request, *args, **kwargs)
+        return cache[func.__name__]
+    return wrapper
+
+
+def conditional(validators):
+    """
+    condition() driven by one function returning (etag, last_modified) or
+    None; responses are marked private and always revalidated.
+    """
+    check = condition(
+        etag_func=lambda request, *args, **kwargs: (validators(request, *args, **kwargs) or (None, None))[0],
+        last_modified_func=lambda request, *args, **kwargs: (validators(request, *args, **kwargs) or (None, None))[1],
+    )
+
+    def decorator(view):
+        checked = check(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = checked(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def _latest(*stamps):
+    return max(stamp for stamp in stamps if stamp is not None)
+
+
+@_memoized
+def profile_validators(request, *args, **kwargs):
+    user = request.user
+    return _etag('profile', user.pk, user.updated_at.isoformat()), user.updated_at
+
+
+@_memoized
+def account_validators(request, pk, *args, **kwargs):
+    updated_at = Account.objects.filter(pk=pk, user=request.user).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    user = request.user
+    return (
+        _etag('account', pk, updated_at.isoformat(), user.updated_at.isoformat()),
+        _latest(updated_at, user.updated_at),
+    )
+
+
+@_memoized
+def account_list_validators(request, *args, **kwargs):
+    user = request.user
+    states = [
+        queryset.aggregate(count=Count('id'), latest=Max('updated_at'))
+        for queryset in per_shard(Account.objects.filter(user=user, is_active=True))
+    ]
+    count = sum(state['count'] for state in states)
+    latest = max((state['latest'] for state in states if state['latest'] is not None), default=None)
+    return (
+        _etag('accounts', user.pk, count, latest, user.updated_at.isoformat()),
+        _latest(latest, user.updated_at),
+    )
+
+
+@_memoized
+def loan_list_validators(request, account_id=None, *args, **kwargs):
+    user = request.user
+    loans = Loan.objects.filter(borrower__user=user)
+    if account_id:
+        # LoanView routes the request to the account's shard
+        querysets = [loans.filter(borrower_id=account_id)]
+    else:
+        querysets = per_shard(loans)
+    states = [queryset.aggregate(count=Count('loan_id'), latest=Max('updated_at')) for queryset in querysets]
+    count = sum(state['count'] for state in states)
+    latest = max((state['latest'] for state in states if state['latest'] is not None), default=None)
+    return (
+        _etag('loans', user.pk, account_id, count, latest, user.updated_at.isoformat()),
+        _latest(latest, user.updated_at),
+    )
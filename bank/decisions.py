@@ -0,0 +1,80 @@
+# decisions.py
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Loan
+from .repayments import PAYMENT_INTERVAL
+from .scheduling import chunked
+from .sharding import on_shard, shard_for_loan
+
+CHUNK_SIZE = 500
+MAX_BATCH = 10000
+
+# action -> (status the loan must be in, status it moves to)
+TRANSITIONS = {
+    'accept': ('PENDING', 'ACCEPTED'),
+    'reject': ('PENDING', 'REJECTED'),
+}
+
+
+def transition_values(action, now):
+    target = TRANSITIONS[action][1]
+    values = {
+        'status': target,
+        'is_accepted': target == 'ACCEPTED',
+        'version': F('version') + 1,
+        'updated_at': now,
+    }
+    if target == 'ACCEPTED':
+        values['accepted_date'] = now
+        values['next_payment_date'] = now.date() + PAYMENT_INTERVAL
+    return values
+
+
+def version_filter(loans):
+    """WHERE clause for (loan_id, version) pairs, one IN list per distinct version seen."""
+    by_version = defaultdict(list)
+    for loan_id, version in loans:
+        by_version[version].append(loan_id)
+    condition = Q()
+    for version, loan_ids in by_version.items():
+        if version is None:
+            condition |= Q(loan_id__in=loan_ids)
+        else:
+            condition |= Q(loan_id__in=loan_ids, version=version)
+    return condition
+
+
+def decide_loans(action, loans, now=None):
+    """
+    Apply `action` to many loans; `loans` is a list of (loan_id, version),
+    version None to skip the optimistic check. Each chunk is one conditional
+    UPDATE ... WHERE status='PENDING' [AND version=...], so a loan another
+    admin decided first, or that changed since the caller read it, is left
+    alone and reported as a conflict rather than overwritten. Loans are
+    grouped by shard, each shard's decisions committing in one DB
+    transaction. Returns (decided loan ids, conflicting loan ids).
+    """
+    source, target = TRANSITIONS[action]
+    loans = list(dict(loans).items())
+    now = now or timezone.now()
+    values = transition_values(action, now)
+    by_shard = defaultdict(list)
+    for loan in loans:
+        by_shard[shard_for_loan(loan[0])].append(loan)
+    decided = []
+    for alias, shard_loans in by_shard.items():
+        with on_shard(alias), transaction.atomic(using=alias):
+            for chunk in chunked(shard_loans, CHUNK_SIZE):
+                updated = Loan.objects.filter(version_filter(chunk), status=source).update(**values)
+                if updated:
+                    # rows this call moved carry its timestamp; a concurrent decision has its own
+                    decided += Loan.objects.filter(
+                        loan_id__in=[loan_id for loan_id, _ in chunk], status=target, updated_at=now,
+                    ).values_list('loan_id', flat=True)
+    moved = set(decided)
+    conflicts = [loan_id for loan_id, _ in loans if loan_id not in moved]
+    return sorted(decided), conflicts
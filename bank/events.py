@@ -0,0 +1,154 @@
+# events.py
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .sharding import shard_db
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessBroker:
+    """
+    Pub/sub inside one process. Publishing is thread-safe, so sync views and
+    on_commit hooks can publish to subscribers living on the ASGI event loop.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, message)
+
+    def subscription(self, channel):
+        return _LocalSubscription(self, channel)
+
+
+class _LocalSubscription:
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.entry = None
+
+    async def __aenter__(self):
+        self.entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.broker.queue_size))
+        with self.broker._lock:
+            self.broker._subscribers[self.channel].add(self.entry)
+        return self.entry[1]
+
+    async def __aexit__(self, *exc_info):
+        subscribers = self.broker._subscribers
+        with self.broker._lock:
+            subscribers[self.channel].discard(self.entry)
+            if not subscribers[self.channel]:
+                del subscribers[self.channel]
+
+
+class RedisBroker:
+    """Redis pub/sub, for when publishers (Celery workers, other web processes) live elsewhere."""
+
+    def __init__(self, url, queue_size=100):
+        self.url = url
+        self.queue_size = queue_size
+        self._client = None
+
+    def publish(self, channel, message):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url)
+        self._client.publish(f'bank-events:{channel}', message)
+
+    def subscription(self, channel):
+        return _RedisSubscription(self, f'bank-events:{channel}')
+
+
+class _RedisSubscription:
+    def __init__(self, broker, key):
+        self.broker = broker
+        self.key = key
+
+    async def __aenter__(self):
+        import redis.asyncio as aioredis
+
+        self.client = aioredis.Redis.from_url(self.broker.url)
+        self.pubsub = self.client.pubsub()
+        await self.pubsub.subscribe(self.key)
+        self.queue = asyncio.Queue(maxsize=self.broker.queue_size)
+        self.reader = asyncio.create_task(self.pump())
+        return self.queue
+
+    async def pump(self):
+        async for message in self.pubsub.listen():
+            if message['type'] == 'message':
+                _offer(self.queue, message['data'].decode())
+
+    async def __aexit__(self, *exc_info):
+        self.reader.cancel()
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+def _offer(queue, message):
+    # a client that stops reading loses events rather than growing memory
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        pass
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        if settings.EVENTS_BACKEND == 'redis':
+            _broker = RedisBroker(settings.EVENTS_REDIS_URL)
+        else:
+            _broker = InProcessBroker()
+    return _broker
+
+
+def reaches_workers():
+    """Whether events published from a Celery worker reach the web processes' subscribers."""
+    return settings.EVENTS_BACKEND == 'redis'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def publish(user_id, event, data):
+    message = json.dumps({'event': event, 'data': data}, cls=DjangoJSONEncoder)
+    try:
+        get_broker().publish(user_channel(user_id), message)
+    except Exception:
+        logger.exception('Could not publish %s event for user %s', event, user_id)
+
+
+def publish_on_commit(user_id, event, data):
+    transaction.on_commit(lambda: publish(user_id, event, data), using=shard_db())
+
+
+def balance_changed(account):
+    publish_on_commit(account.user_id, 'balance', {
+        'account_id': account.id,
+        'balance': account.balance,
+        'currency': account.currency,
+    })
+
+
+def format_sse(message):
+    payload = json.loads(message)
+    return f"event: {payload['event']}\ndata: {json.dumps(payload['data'])}\n\n"
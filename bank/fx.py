@@ -0,0 +1,128 @@
+# fx.py
+import time
+from decimal import Decimal, ROUND_HALF_EVEN
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Account, FxRate
+from .sharding import per_shard
+
+CENT = Decimal('0.01')
+RATE_PLACES = Decimal('0.00000001')
+
+
+class FxError(Exception):
+    pass
+
+
+# (version, {currency: rate}, monotonic time of the last version check)
+_cached = (None, None, 0.0)
+
+
+def current_version():
+    """
+    (row count, newest updated_at) of the rate table. Read from the database
+    rather than the Django cache, which may be per-process (LocMemCache) and
+    would then never see another process's rate load.
+    """
+    state = FxRate.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+    return state['count'], state['latest']
+
+
+def bump_version():
+    """Drop this process's rate table; the others notice the new version at their next check."""
+    global _cached
+    _cached = (None, None, 0.0)
+
+
+def get_rates():
+    """
+    {currency: units of FX_BASE_CURRENCY per unit}, served from process
+    memory. The table's version is checked at most every
+    FX_VERSION_CHECK_SECONDS and the table is re-read only when it changed,
+    so a conversion normally costs no query at all.
+    """
+    global _cached
+    version, rates, checked = _cached
+    now = time.monotonic()
+    if rates is not None and now - checked < settings.FX_VERSION_CHECK_SECONDS:
+        return rates
+    latest = current_version()
+    if rates is None or latest != version:
+        rates = dict(FxRate.objects.values_list('currency', 'rate'))
+        rates[settings.FX_BASE_CURRENCY] = Decimal(1)
+    _cached = (latest, rates, now)
+    return rates
+
+
+def exchange_rate(from_currency, to_currency):
+    if from_currency == to_currency:
+        return Decimal(1)
+    rates = get_rates()
+    for currency in (from_currency, to_currency):
+        if currency not in rates:
+            raise FxError(f'No exchange rate for {currency}')
+    return (rates[from_currency] / rates[to_currency]).quantize(RATE_PLACES, rounding=ROUND_HALF_EVEN)
+
+
+def convert(amount, from_currency, to_currency):
+    """Returns (converted amount, rate used); the recorded rate reproduces the amount exactly."""
+    rate = exchange_rate(from_currency, to_currency)
+    return (Decimal(amount) * rate).quantize(CENT, rounding=ROUND_HALF_EVEN), rate
+
+
+def is_supported(currency):
+    return currency in get_rates()
+
+
+def load_rates(rates, as_of):
+    """Upsert {currency: rate} in one statement and invalidate caches once it commits."""
+    with transaction.atomic():
+        FxRate.objects.bulk_create(
+            [FxRate(currency=currency, rate=rate, as_of=as_of) for currency, rate in rates.items()],
+            update_conflicts=True, unique_fields=['currency'], update_fields=['rate', 'as_of', 'updated_at'],
+        )
+        transaction.on_commit(bump_version)
+
+
+def revaluation(report_currency):
+    """
+    Active balances per currency restated in `report_currency`. The totals
+    come from a single GROUP BY currency query per shard; conversion happens
+    on the handful of aggregated rows.
+    """
+    totals = {}
+    for queryset in per_shard(Account.objects.filter(is_active=True)):
+        for row in queryset.values('currency').annotate(accounts=Count('id'), balance=Sum('balance')):
+            merged = totals.setdefault(row['currency'], {'currency': row['currency'], 'accounts': 0, 'balance': 0})
+            merged['accounts'] += row['accounts']
+            merged['balance'] += row['balance']
+    rows, total, missing = [], Decimal('0.00'), []
+    for row in sorted(totals.values(), key=itemgetter('currency')):
+        balance = Decimal(row['balance']).quantize(CENT)
+        try:
+            converted, rate = convert(balance, row['currency'], report_currency)
+        except FxError:
+            missing.append(row['currency'])
+            converted = rate = None
+        else:
+            total += converted
+        rows.append({
+            'currency': row['currency'],
+            'accounts': row['accounts'],
+            'balance': balance,
+            'rate': rate,
+            'converted': converted,
+        })
+    return {'currency': report_currency, 'rows': rows, 'total': total, 'missing_rates': missing}
+
+
+@receiver((post_save, post_delete), sender=FxRate)
+def invalidate_rates(sender, **kwargs):
+    # covers admin edits and loaddata; load_rates() bumps once per batch itself
+    transaction.on_commit(bump_version)
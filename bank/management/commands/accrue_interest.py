@@ -0,0 +1,27 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bank.accrual import accrue_savings_interest
+
+
+class Command(BaseCommand):
+    help = 'Accrue one day of interest on every active SAVINGS account (resumes an interrupted run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help='Accrual date, YYYY-MM-DD (default: yesterday)')
+        parser.add_argument('--chunk-size', type=int, default=settings.ACCRUAL_CHUNK_SIZE, help='Accounts per DB transaction')
+        parser.add_argument('--rate', type=Decimal, help='Annual rate in percent (default: SAVINGS_INTEREST_RATE)')
+
+    def handle(self, *args, **options):
+        day = options['date'] or timezone.localdate() - timedelta(days=1)
+        for run in accrue_savings_interest(day, chunk_size=options['chunk_size'], annual_rate=options['rate']):
+            elapsed = max(run.seconds_elapsed, 1e-6)
+            self.stdout.write(self.style.SUCCESS(
+                f'{run.accrual_date} [{run._state.db}]: {run.accounts_processed:,} accounts, '
+                f'{run.accounts_credited:,} credited, {run.total_interest} interest in {run.seconds_elapsed:.1f}s '
+                f'({run.accounts_processed / elapsed:,.0f} accounts/s)'
+            ))
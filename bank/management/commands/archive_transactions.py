@@ -0,0 +1,27 @@
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bank.archive import archive_transactions, hot_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Move transactions past the hot horizon into the archive table, in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=date.fromisoformat, help='Archive rows created before this date, YYYY-MM-DD (default: TRANSACTION_HOT_DAYS ago)')
+        parser.add_argument('--chunk-size', type=int, default=settings.TRANSACTION_ARCHIVE_CHUNK_SIZE, help='Rows moved per DB transaction')
+        parser.add_argument('--time-limit', type=int, help='Stop after this many seconds; the next run continues')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            cutoff = timezone.make_aware(datetime.combine(options['before'], time.min))
+        else:
+            cutoff = hot_cutoff()
+        moved, seconds = archive_transactions(cutoff, options['chunk_size'], options['time_limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved:,} transactions created before {cutoff:%Y-%m-%d} in {seconds:.1f}s '
+            f'({moved / max(seconds, 1e-6):,.0f} rows/s)'
+        ))
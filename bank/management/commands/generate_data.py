@@ -0,0 +1,284 @@
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from multiprocessing import Pool
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import signals
+from django.utils import timezone
+
+from bank.models import CustomUser, Account, Transaction, Loan, LoanInterest
+
+ACCOUNT_TYPES = (('SAVINGS', 60), ('CHECKING', 30), ('BUSINESS', 10))
+TRANSACTION_TYPES = (('DEPOSIT', 40), ('WITHDRAWAL', 35), ('TRANSFER', 25))
+LOAN_STATUSES = (('PENDING', 15), ('ACCEPTED', 55), ('REJECTED', 15), ('PAID', 15))
+LOAN_TERMS = (6, 12, 24, 36, 60, 120)
+MIN_BALANCE = Decimal('1000.00')
+CENT = Decimal('0.01')
+
+# Timestamp fields that normally stamp "now"; switched off so history can be backdated.
+HISTORICAL_FIELDS = (
+    (Account, 'created_at'), (Account, 'updated_at'),
+    (Transaction, 'created_at'),
+    (Loan, 'applied_date'),
+    (LoanInterest, 'payment_date'),
+)
+MUTED_SIGNALS = (signals.pre_save, signals.post_save, signals.pre_delete, signals.post_delete, signals.m2m_changed)
+
+
+@contextmanager
+def historical_timestamps():
+    saved = []
+    for model, name in HISTORICAL_FIELDS:
+        field = model._meta.get_field(name)
+        saved.append((field, field.auto_now, field.auto_now_add))
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+@contextmanager
+def muted_signals():
+    saved = []
+    for signal in MUTED_SIGNALS:
+        saved.append((signal, signal.receivers))
+        signal.receivers = []
+        signal.sender_receivers_cache.clear()
+    try:
+        yield
+    finally:
+        for signal, receivers in saved:
+            signal.receivers = receivers
+            signal.sender_receivers_cache.clear()
+
+
+def weighted(rng, choices):
+    return rng.choices([c for c, _ in choices], weights=[w for _, w in choices])[0]
+
+
+def money(value):
+    return Decimal(value).quantize(CENT)
+
+
+class Generator:
+    def __init__(self, options, start, end):
+        self.options = options
+        self.start = start
+        self.end = end
+        self.rng = random.Random(options['seed'] + start)
+        self.now = timezone.now()
+        self.password = make_password(options['password'])
+
+    def past(self, moment):
+        # offsets added to a short history can run past the present
+        return min(moment, self.now)
+
+    def run(self, report=None):
+        batch_size = self.options['batch_size']
+        totals = dict.fromkeys(('users', 'accounts', 'transactions', 'loans', 'payments'), 0)
+        with historical_timestamps(), muted_signals():
+            for first in range(self.start, self.end, batch_size):
+                counts = self.generate_batch(first, min(first + batch_size, self.end))
+                for key, value in counts.items():
+                    totals[key] += value
+                if report:
+                    report(totals)
+        return totals
+
+    def generate_batch(self, first, last):
+        opts = self.options
+        prefix = opts['prefix']
+        history_days = opts['days']
+        with transaction.atomic():
+            users = []
+            for n in range(first, last):
+                joined = self.now - timedelta(days=history_days, seconds=self.rng.randint(0, 86400 * 30))
+                users.append(CustomUser(
+                    username=f'{prefix}{n:09d}',
+                    email=f'{prefix}{n:09d}@example.com',
+                    password=self.password,
+                    first_name=f'First{n}',
+                    last_name=f'Last{n}',
+                    date_joined=joined,
+                ))
+            users = CustomUser.objects.bulk_create(users, batch_size=opts['insert_size'])
+
+            accounts, histories = [], []
+            for n, user in zip(range(first, last), users):
+                opened = self.past(user.date_joined + timedelta(hours=self.rng.randint(1, 48)))
+                opening = max(MIN_BALANCE, money(self.rng.lognormvariate(10, 1.2)))
+                accounts.append(Account(
+                    user=user,
+                    account_number=f'9{n:011d}',
+                    account_type=weighted(self.rng, ACCOUNT_TYPES),
+                    balance=opening,
+                    created_at=opened,
+                ))
+                histories.append(self.transaction_history(opened, opening))
+            for account, history in zip(accounts, histories):
+                account.balance = history[-1][2] if history else account.balance
+                account.updated_at = history[-1][3] if history else account.created_at
+            accounts = Account.objects.bulk_create(accounts, batch_size=opts['insert_size'])
+
+            account_ids = [account.id for account in accounts]
+            transactions = []
+            for account, history in zip(accounts, histories):
+                for tx_type, amount, balance_after, created_at in history:
+                    recipient_id = None
+                    if tx_type == 'TRANSFER' and len(account_ids) > 1:
+                        recipient_id = self.rng.choice(account_ids)
+                        if recipient_id == account.id:
+                            recipient_id = None
+                    transactions.append(Transaction(
+                        account_id=account.id,
+                        transaction_type=tx_type,
+                        amount=amount,
+                        balance_after=balance_after,
+                        description=f'Generated {tx_type.lower()}',
+                        recipient_account_id=recipient_id,
+                        status='COMPLETED',
+                        created_at=created_at,
+                    ))
+            Transaction.objects.bulk_create(transactions, batch_size=opts['insert_size'])
+
+            loans = [self.loan_for(account) for account in accounts if self.rng.random() < opts['loan_ratio']]
+            loans = Loan.objects.bulk_create(loans, batch_size=opts['insert_size'])
+            payments = [payment for loan in loans for payment in self.payments_for(loan)]
+            LoanInterest.objects.bulk_create(payments, batch_size=opts['insert_size'])
+
+        return {
+            'users': len(users), 'accounts': len(accounts), 'transactions': len(transactions),
+            'loans': len(loans), 'payments': len(payments),
+        }
+
+    def transaction_history(self, opened, balance):
+        mean = self.options['transactions']
+        count = min(int(self.rng.expovariate(1 / mean)) if mean else 0, mean * 5)
+        if not count:
+            return []
+        span = max((self.now - opened).total_seconds(), 1)
+        stamps = sorted(opened + timedelta(seconds=self.rng.uniform(0, span)) for _ in range(count))
+        history = []
+        for created_at in stamps:
+            tx_type = weighted(self.rng, TRANSACTION_TYPES)
+            amount = money(self.rng.lognormvariate(7.5, 1.1))
+            if tx_type != 'DEPOSIT' and balance - amount < MIN_BALANCE:
+                tx_type = 'DEPOSIT'
+            balance = balance + amount if tx_type == 'DEPOSIT' else balance - amount
+            history.append((tx_type, amount, balance, created_at))
+        return history
+
+    def loan_for(self, account):
+        status = weighted(self.rng, LOAN_STATUSES)
+        amount = money(min(max(self.rng.lognormvariate(12.5, 1), 10000), 5000000))
+        applied = self.past(account.created_at + timedelta(days=self.rng.randint(1, 60)))
+        loan = Loan(
+            borrower=account,
+            loan_amount=amount,
+            interest_rate=money(self.rng.uniform(5, 25)),
+            loan_term_months=self.rng.choice(LOAN_TERMS),
+            status=status,
+            is_accepted=status in ('ACCEPTED', 'PAID'),
+            applied_date=applied,
+            purpose='Generated loan',
+        )
+        loan.monthly_payment = loan.calculate_monthly_payment()
+        if loan.is_accepted:
+            loan.accepted_date = self.past(applied + timedelta(days=self.rng.randint(1, 10)))
+            months = loan.loan_term_months
+            if status == 'ACCEPTED':
+                elapsed = int((self.now - loan.accepted_date).days // 30)
+                months = max(0, min(elapsed, loan.loan_term_months - 1))
+            loan._generated_payments = months
+            first_due = loan.accepted_date.date() + timedelta(days=30)
+            if months:
+                # a PAID loan whose term would end in the future was paid off early, today at the latest
+                loan.last_payment_date = min(first_due + timedelta(days=30 * (months - 1)), self.now.date())
+            if status == 'ACCEPTED':
+                # the one date meant to be ahead: the installment still to come
+                loan.next_payment_date = first_due + timedelta(days=30 * months)
+        return loan
+
+    def payments_for(self, loan):
+        months = getattr(loan, '_generated_payments', 0)
+        if not months:
+            return []
+        total = loan.monthly_payment * loan.loan_term_months
+        payments = []
+        for month in range(months):
+            amount = loan.monthly_payment
+            if month == loan.loan_term_months - 1:
+                amount = total - loan.monthly_payment * month
+            payments.append(LoanInterest(
+                loan_id=loan.loan_id,
+                amount=amount,
+                payment_date=self.past(loan.accepted_date + timedelta(days=30 * (month + 1))),
+                payment_method='Online Transfer',
+                notes='Generated payment',
+            ))
+        return payments
+
+
+def _run_worker(args):
+    options, start, end = args
+    connections.close_all()
+    try:
+        return Generator(options, start, end).run()
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, accounts, transactions and loans for performance testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Number of users (one account each)')
+        parser.add_argument('--transactions', type=int, default=50, help='Mean transactions per account')
+        parser.add_argument('--loan-ratio', type=float, default=0.2, help='Fraction of accounts with a loan')
+        parser.add_argument('--days', type=int, default=365, help='Length of the generated history in days')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Users generated per DB transaction')
+        parser.add_argument('--insert-size', type=int, default=5000, help='Rows per INSERT statement')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes (use with Postgres)')
+        parser.add_argument('--offset', type=int, default=0, help='First user number, to append to existing data')
+        parser.add_argument('--prefix', default='load', help='Username prefix for generated users')
+        parser.add_argument('--password', default='password123', help='Password set on every generated user')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        first, total = options['offset'], options['users']
+        workers = max(1, options['workers'])
+
+        if workers == 1:
+            totals = Generator(options, first, first + total).run(report=lambda t: self.report(t, started))
+        else:
+            step = math.ceil(total / workers)
+            ranges = [
+                (options, start, min(start + step, first + total))
+                for start in range(first, first + total, step)
+            ]
+            connections.close_all()
+            with Pool(len(ranges)) as pool:
+                totals = dict.fromkeys(('users', 'accounts', 'transactions', 'loans', 'payments'), 0)
+                for result in pool.imap_unordered(_run_worker, ranges):
+                    for key, value in result.items():
+                        totals[key] += value
+                    self.report(totals, started)
+
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.monotonic() - started:.1f}s: {self.format(totals)}'))
+
+    def report(self, totals, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        rows = sum(totals.values())
+        self.stdout.write(f'{self.format(totals)} ({rows / elapsed:,.0f} rows/s)')
+
+    def format(self, totals):
+        return ', '.join(f'{value:,} {key}' for key, value in totals.items())
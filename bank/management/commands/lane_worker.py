@@ -0,0 +1,39 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Bank.celery import app
+
+
+class Command(BaseCommand):
+    help = 'Start a Celery worker for one task lane, sized from TASK_LANES'
+
+    def add_arguments(self, parser):
+        parser.add_argument('lane', help=f"One of: {', '.join(settings.TASK_LANES)}")
+        parser.add_argument('--concurrency', type=int, help="Override the lane's concurrency")
+        parser.add_argument('--loglevel', default='INFO')
+        parser.add_argument('--dry-run', action='store_true', help='Print the worker command instead of running it')
+
+    def handle(self, *args, **options):
+        lane = settings.TASK_LANES.get(options['lane'])
+        if lane is None:
+            raise CommandError(f"Unknown lane {options['lane']!r}, use one of: {', '.join(settings.TASK_LANES)}")
+        argv = [
+            'worker',
+            '--queues', options['lane'],
+            '--hostname', f"{options['lane']}@%h",
+            '--concurrency', str(options['concurrency'] or lane['concurrency']),
+            '--prefetch-multiplier', str(lane['prefetch_multiplier']),
+            '--loglevel', options['loglevel'],
+        ]
+        if lane.get('max_tasks_per_child'):
+            argv += ['--max-tasks-per-child', str(lane['max_tasks_per_child'])]
+        if options['dry_run']:
+            self.stdout.write('celery -A Bank ' + ' '.join(argv))
+            return
+        # modules only this lane's tasks need, loaded once in the parent
+        # instead of on the first task of every (recycled) child
+        for module in lane.get('preload', ()):
+            import_module(module)
+        app.worker_main(argv)
@@ -0,0 +1,37 @@
+import csv
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from bank.fx import load_rates
+
+
+class Command(BaseCommand):
+    help = 'Load FX rates (currency,rate per unit of FX_BASE_CURRENCY) from a local CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=settings.FX_RATES_FILE, help='CSV file with currency,rate columns')
+        parser.add_argument('--as-of', type=date.fromisoformat, help='Rate date, YYYY-MM-DD (default: today)')
+
+    def handle(self, *args, **options):
+        rates = {}
+        try:
+            with open(options['path'], newline='') as f:
+                for line, row in enumerate(csv.DictReader(f), start=2):
+                    currency = row['currency'].strip().upper()
+                    try:
+                        rate = Decimal(row['rate'])
+                    except InvalidOperation:
+                        raise CommandError(f'Line {line}: invalid rate {row["rate"]!r}')
+                    if len(currency) != 3 or rate <= 0:
+                        raise CommandError(f'Line {line}: invalid row {currency},{rate}')
+                    rates[currency] = rate
+        except (OSError, KeyError) as e:
+            raise CommandError(f'Could not read {options["path"]}: {e}')
+
+        rates.pop(settings.FX_BASE_CURRENCY, None)
+        load_rates(rates, options['as_of'] or timezone.localdate())
+        self.stdout.write(self.style.SUCCESS(f'Loaded {len(rates)} rates against {settings.FX_BASE_CURRENCY}'))
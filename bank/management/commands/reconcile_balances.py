@@ -0,0 +1,41 @@
+import csv
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bank.reconciliation import current_run, reconcile_balances
+from bank.sharding import shards
+
+
+class Command(BaseCommand):
+    help = 'Check every account\'s balance_after chain and balance against its transactions; resumes an unfinished run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.RECONCILE_WORKERS, help='Processes auditing chunks in parallel')
+        parser.add_argument('--chunk-size', type=int, default=settings.RECONCILE_CHUNK_SIZE, help='Account ids per chunk')
+        parser.add_argument('--restart', action='store_true', help='Start a new run instead of resuming an unfinished one')
+        parser.add_argument('--report', help='Write the run\'s discrepancies to this CSV file')
+
+    def handle(self, *args, **options):
+        runs = []
+        for alias in shards():
+            run = current_run(restart=options['restart'], alias=alias)
+            if run.last_account_id:
+                self.stdout.write(f'Resuming audit {run.pk} on {alias} after account {run.last_account_id}')
+            run = reconcile_balances(run, options['chunk_size'], options['workers'])
+            runs.append(run)
+
+            style = self.style.SUCCESS if not run.discrepancy_count else self.style.WARNING
+            self.stdout.write(style(
+                f'Audit {run.pk} on {alias}: {run.accounts_checked:,} accounts, {run.rows_checked:,} transactions, '
+                f'{run.discrepancy_count:,} discrepancies in {run.seconds_elapsed:.1f}s '
+                f'({run.rows_checked / max(run.seconds_elapsed, 1e-6):,.0f} rows/s)'
+            ))
+
+        if options['report']:
+            with open(options['report'], 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['kind', 'account_number', 'transaction_id', 'expected', 'actual'])
+                for run in runs:
+                    for item in run.discrepancies.select_related('account').iterator():
+                        writer.writerow([item.kind, item.account.account_number, item.transaction_id, item.expected, item.actual])
@@ -0,0 +1,66 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bank.models import Account, CustomUser, Transaction
+from bank.search import search_accounts, search_transactions
+
+WORDS = [
+    'rent', 'salary', 'groceries', 'electricity', 'school', 'fees', 'insurance', 'premium', 'mobile', 'recharge',
+    'internet', 'water', 'bill', 'loan', 'repayment', 'dinner', 'travel', 'ticket', 'medicine', 'hospital',
+    'gift', 'wedding', 'festival', 'dashain', 'tihar', 'savings', 'tuition', 'fuel', 'taxi', 'subscription',
+]
+
+
+class Command(BaseCommand):
+    help = 'Time the search queries (description, account prefix, user, own transactions) against the current data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='First bulk-insert this many synthetic transactions')
+        parser.add_argument('--iterations', type=int, default=50, help='Queries per case; p50/p99 are reported')
+
+    def handle(self, *args, **options):
+        accounts = list(Account.objects.values_list('id', 'account_number', 'user_id')[:10000])
+        if not accounts:
+            self.stdout.write('No accounts, run generate_data first')
+            return
+        if options['seed']:
+            self.seed(options['seed'], [account_id for account_id, _, _ in accounts])
+
+        rows = Transaction.objects.count()
+        user = CustomUser.objects.get(id=random.choice(accounts)[2])
+        own = Transaction.objects.filter(account__user=user)
+        cases = (
+            ('description (common word)', lambda: search_transactions(random.choice(WORDS))),
+            ('description (rare phrase)', lambda: search_transactions(f'{random.choice(WORDS)} #{random.randint(1, 99999)}')),
+            ('account number prefix', lambda: search_accounts(random.choice(accounts)[1][:8])),
+            ('transactions by account prefix', lambda: search_transactions(random.choice(accounts)[1])),
+            ('own transactions', lambda: search_transactions(random.choice(WORDS), own)),
+            ('user name/email', lambda: search_accounts(user.username[:4])),
+        )
+        self.stdout.write(f'{rows:,} transactions, {len(accounts):,} accounts sampled')
+        for name, query in cases:
+            samples = []
+            for _ in range(options['iterations']):
+                started = time.perf_counter()
+                list(query())
+                samples.append(time.perf_counter() - started)
+            samples.sort()
+            pick = lambda q: samples[min(int(len(samples) * q), len(samples) - 1)] * 1000
+            self.stdout.write(f'{name}: p50 {pick(0.5):.1f}ms, p99 {pick(0.99):.1f}ms')
+
+    def seed(self, count, account_ids, batch_size=10000):
+        started = time.perf_counter()
+        for start in range(0, count, batch_size):
+            with transaction.atomic():
+                Transaction.objects.bulk_create([
+                    Transaction(
+                        account_id=random.choice(account_ids), transaction_type='TRANSFER', amount=100,
+                        balance_after=1000, status='COMPLETED',
+                        description=f'{random.choice(WORDS)} {random.choice(WORDS)} #{random.randint(1, 99999)}',
+                    )
+                    for _ in range(min(batch_size, count - start))
+                ])
+        self.stdout.write(f'Seeded {count:,} transactions in {time.perf_counter() - started:.1f}s')
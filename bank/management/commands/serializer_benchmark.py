@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from bank.models import Account, Loan, Transaction
+from bank.renderers import ORJSONRenderer
+from bank.serializers import (
+    AccountSerializer, TransactionSerializer, LoanSerializer,
+    AccountValuesSerializer, TransactionValuesSerializer, LoanValuesSerializer,
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare ModelSerializer + JSONRenderer with the values() serializers + orjson on large listings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows per payload (use generate_data first)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path; the best is reported')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        cases = (
+            ('transactions', Transaction.objects.select_related('recipient_account').order_by('id')[:rows],
+             Transaction.objects.order_by('id')[:rows], TransactionSerializer, TransactionValuesSerializer),
+            ('accounts', Account.objects.select_related('user').order_by('id')[:rows],
+             Account.objects.order_by('id')[:rows], AccountSerializer, AccountValuesSerializer),
+            ('loans', Loan.objects.with_payment_totals().select_related('borrower__user').order_by('loan_id')[:rows],
+             Loan.objects.with_payment_totals().order_by('loan_id')[:rows], LoanSerializer, LoanValuesSerializer),
+        )
+        for name, model_qs, values_qs, model_serializer, values_serializer in cases:
+            slow, size = self.best(options['repeat'], lambda: JSONRenderer().render(model_serializer(model_qs.all(), many=True).data))
+            fast, _ = self.best(options['repeat'], lambda: ORJSONRenderer().render(values_serializer(values_qs.all()).data))
+            if size < 3:
+                self.stdout.write(f'{name}: no rows, skipped')
+                continue
+            self.stdout.write(
+                f'{name}: {len(model_qs):,} rows, {size / 1024:,.0f} KiB - '
+                f'ModelSerializer {slow * 1000:,.1f}ms, values()+orjson {fast * 1000:,.1f}ms '
+                f'({slow / max(fast, 1e-9):.1f}x)'
+            )
+
+    def best(self, repeat, render):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = render()
+            timings.append(time.perf_counter() - started)
+        return min(timings), len(body)
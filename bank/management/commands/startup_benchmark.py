@@ -0,0 +1,76 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# what each kind of process imports before it serves its first request or task
+PROCESS_TYPES = {
+    'web': ['Bank.wsgi', 'Bank.urls'],
+    'asgi': ['Bank.asgi', 'Bank.urls'],
+    'worker': ['Bank.celery', 'bank.tasks'],
+    'pdf-worker': ['Bank.celery', 'bank.tasks', *settings.TASK_LANES['pdf'].get('preload', [])],
+}
+# modules that should only ever show up in worker processes
+HEAVY_MODULES = ['weasyprint']
+
+# runs in a fresh interpreter, so nothing is already imported
+PROBE = '''
+import importlib, json, os, resource, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Bank.settings')
+started = time.perf_counter()
+import django
+django.setup()
+for name in {modules!r}:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - started
+try:
+    with open('/proc/self/status') as status:
+        rss_kb = next(int(line.split()[1]) for line in status if line.startswith('VmRSS:'))
+except OSError:
+    # no procfs: peak instead of current resident size (KB on Linux, bytes on macOS)
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    'seconds': elapsed,
+    'rss_kb': rss_kb,
+    'modules': len(sys.modules),
+    'heavy': [name for name in {heavy!r} if name in sys.modules],
+}}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure import time and memory of a freshly started web / worker process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('types', nargs='*', help=f"Process types (default: all of {', '.join(PROCESS_TYPES)})")
+        parser.add_argument('--repeat', type=int, default=5, help='Fresh processes started per type; the median is reported')
+
+    def probe(self, modules):
+        code = PROBE.format(modules=modules, heavy=HEAVY_MODULES)
+        result = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        types = options['types'] or list(PROCESS_TYPES)
+        unknown = set(types) - set(PROCESS_TYPES)
+        if unknown:
+            raise CommandError(f"Unknown process type(s) {', '.join(sorted(unknown))}, use: {', '.join(PROCESS_TYPES)}")
+
+        for name in types:
+            try:
+                samples = [self.probe(PROCESS_TYPES[name]) for _ in range(options['repeat'])]
+            except CommandError as e:
+                self.stdout.write(self.style.ERROR(f'{name:<11} failed to start: {e}'))
+                continue
+            seconds = statistics.median(sample['seconds'] for sample in samples)
+            rss = statistics.median(sample['rss_kb'] for sample in samples)
+            heavy = ', '.join(samples[0]['heavy']) or 'none'
+            self.stdout.write(
+                f'{name:<11} import {seconds * 1000:7.1f}ms  RSS {rss / 1024:6.1f}MB  '
+                f"{samples[0]['modules']:5} modules  heavy: {heavy}"
+            )
@@ -0,0 +1,43 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from bank.velocity import VelocityExceeded, check_velocity, get_store
+
+
+class Command(BaseCommand):
+    help = 'Measure the latency velocity checks add to a transfer (check + post-commit record)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=1000, help='Distinct account ids to spread load over')
+        parser.add_argument('--iterations', type=int, default=100000)
+        parser.add_argument('--amount', type=Decimal, default=Decimal('10.00'))
+
+    def handle(self, *args, **options):
+        store = get_store()
+        accounts, amount = options['accounts'], options['amount']
+
+        # warm up: the first check per account seeds its counters from the database
+        now = time.time()
+        for account_id in range(1, accounts + 1):
+            store.totals(account_id, now)
+
+        samples = []
+        for i in range(options['iterations']):
+            account_id = i % accounts + 1
+            started = time.perf_counter()
+            now = time.time()
+            try:
+                check_velocity(account_id, amount, now)
+            except VelocityExceeded:
+                pass
+            store.record(account_id, amount, now)
+            samples.append(time.perf_counter() - started)
+
+        samples.sort()
+        pick = lambda q: samples[min(int(len(samples) * q), len(samples) - 1)] * 1e6
+        self.stdout.write(self.style.SUCCESS(
+            f'{type(store).__name__}: {len(samples):,} checks, '
+            f'p50 {pick(0.5):.1f}us, p99 {pick(0.99):.1f}us, max {samples[-1] * 1e6:.1f}us'
+        ))
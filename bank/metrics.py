@@ -0,0 +1,282 @@
+# metrics.py
+import heapq
+import itertools
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+
+from celery.signals import before_task_publish, task_prerun, task_postrun, worker_process_shutdown
+from django.conf import settings
+from django.core.cache import cache
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_HELP = {
+    'bank_http_requests_total': ('counter', 'HTTP requests handled, by view, method and status.'),
+    'bank_http_request_duration_seconds': ('histogram', 'Wall time spent producing the response, by view.'),
+    'bank_http_sampled_requests_total': ('counter', 'Requests that had their DB queries instrumented.'),
+    'bank_db_queries_total': ('counter', 'DB queries issued by sampled requests, by view.'),
+    'bank_db_query_seconds_total': ('counter', 'DB time spent by sampled requests, by view.'),
+    'bank_celery_tasks_total': ('counter', 'Celery tasks finished, by task and state.'),
+    'bank_celery_task_duration_seconds': ('histogram', 'Celery task run time, by task.'),
+    'bank_celery_task_latency_seconds': ('histogram', 'Time a task waited between publish and start, by lane and task.'),
+    'bank_celery_lane_depth': ('gauge', 'Messages waiting in each task lane (-1 when the broker is unreachable).'),
+}
+
+
+class MetricsRegistry:
+    """
+    Process-local metric store.
+
+    Every thread writes into its own shard, so recording a value never takes a
+    lock; shards are only merged when /metrics is scraped. Shards of finished
+    threads are folded into one, so thread-per-request servers do not grow
+    the list without bound.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = defaultdict(float)
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = defaultdict(float)
+            with self._shards_lock:
+                self._fold_finished()
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+        return shard
+
+    def _fold_finished(self):
+        # caller holds _shards_lock; a finished thread can no longer write to its shard
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for key, value in shard.items():
+                    self._retired[key] += value
+        self._shards = live
+
+    def inc(self, name, labels=(), value=1):
+        self._shard()[(name, labels)] += value
+
+    def observe(self, name, labels, value, buckets=DURATION_BUCKETS):
+        shard = self._shard()
+        for bound in buckets:
+            if value <= bound:
+                shard[(name + '_bucket', labels + (('le', str(bound)),))] += 1
+                break
+        else:
+            shard[(name + '_bucket', labels + (('le', '+Inf'),))] += 1
+        shard[(name + '_sum', labels)] += value
+        shard[(name + '_count', labels)] += 1
+
+    def collect(self):
+        with self._shards_lock:
+            self._fold_finished()
+            shards = [shard for _, shard in self._shards]
+            totals = defaultdict(float, self._retired)
+        for shard in shards:
+            for key, value in shard.copy().items():
+                totals[key] += value
+        return totals
+
+    def reset(self):
+        with self._shards_lock:
+            self._retired.clear()
+            for _, shard in self._shards:
+                shard.clear()
+
+    def render(self, extra=(), merge=None):
+        totals = self.collect()
+        for key, value in (merge or {}).items():
+            totals[key] += value
+        families = defaultdict(list)
+        for (name, labels), value in totals.items():
+            if name.endswith('_bucket'):
+                families[name[:-len('_bucket')]].append((name, labels, value))
+            elif name.endswith('_sum') or name.endswith('_count'):
+                families[name.rsplit('_', 1)[0]].append((name, labels, value))
+            else:
+                families[name].append((name, labels, value))
+        for name, labels, value in extra:
+            families[name].append((name, labels, value))
+
+        lines = []
+        for family in sorted(families):
+            kind, help_text = METRIC_HELP.get(family, ('gauge', family))
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            samples = families[family]
+            if kind == 'histogram':
+                samples = _cumulative_buckets(samples)
+            for name, labels, value in sorted(samples, key=_sample_sort_key):
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _cumulative_buckets(samples):
+    series = defaultdict(dict)
+    others = []
+    for name, labels, value in samples:
+        if name.endswith('_bucket'):
+            base = tuple(pair for pair in labels if pair[0] != 'le')
+            series[(name, base)][dict(labels)['le']] = value
+        else:
+            others.append((name, labels, value))
+    result = []
+    for (name, base), counts in series.items():
+        running = 0
+        for bound in [str(b) for b in DURATION_BUCKETS] + ['+Inf']:
+            running += counts.get(bound, 0)
+            result.append((name, base + (('le', bound),), running))
+    return result + others
+
+
+def _sample_sort_key(sample):
+    name, labels, _ = sample
+    le = dict(labels).get('le')
+    order = float('inf') if le == '+Inf' else float(le) if le else 0
+    return (name, tuple(pair for pair in labels if pair[0] != 'le'), order)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+
+def record_request(view, method, status_code, duration, queries=None):
+    registry.inc('bank_http_requests_total', (('view', view), ('method', method), ('status', str(status_code))))
+    registry.observe('bank_http_request_duration_seconds', (('view', view),), duration)
+    if queries is not None:
+        labels = (('view', view),)
+        registry.inc('bank_http_sampled_requests_total', labels)
+        registry.inc('bank_db_queries_total', labels, queries.count)
+        registry.inc('bank_db_query_seconds_total', labels, queries.duration)
+
+
+class QueryCollector:
+    """
+    execute_wrapper that counts and times every query run through it,
+    keeping the `max_queries` slowest statements in a min-heap.
+    """
+
+    def __init__(self, max_queries=100):
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+        self.max_queries = max_queries
+        # tie-breaker, so equal timings never compare the SQL
+        self._order = itertools.count()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            entry = (elapsed, next(self._order), context['connection'].alias, sql)
+            if len(self.queries) < self.max_queries:
+                heapq.heappush(self.queries, entry)
+            elif elapsed > self.queries[0][0]:
+                heapq.heapreplace(self.queries, entry)
+
+    def slowest(self, limit=10):
+        return [(elapsed, alias, sql) for elapsed, _, alias, sql in heapq.nlargest(limit, self.queries)]
+
+
+# Task metrics are recorded in the worker processes. Each one stores its
+# totals in the shared cache under its own key, listed in WORKERS_KEY, and
+# /metrics adds them up; a worker gone for METRICS_WORKER_TTL drops out.
+WORKERS_KEY = 'bank-metrics:workers'
+_last_push = 0.0
+
+
+def push_worker_metrics(force=False):
+    """Store this worker process's totals for the web side, at most every METRICS_PUSH_SECONDS."""
+    global _last_push
+    now = time.monotonic()
+    if not force and now - _last_push < settings.METRICS_PUSH_SECONDS:
+        return
+    _last_push = now
+    key = f'{WORKERS_KEY}:{socket.gethostname()}:{os.getpid()}'
+    cache.set(key, dict(registry.collect()), settings.METRICS_WORKER_TTL)
+    workers = cache.get(WORKERS_KEY) or set()
+    # re-checked on every push, so an entry lost to a concurrent update comes back
+    if key not in workers:
+        cache.set(WORKERS_KEY, workers | {key}, None)
+
+
+def worker_totals():
+    """The summed totals of every worker process that pushed within METRICS_WORKER_TTL."""
+    workers = cache.get(WORKERS_KEY) or set()
+    snapshots = cache.get_many(workers)
+    if len(snapshots) < len(workers):
+        cache.set(WORKERS_KEY, set(snapshots), None)
+    totals = defaultdict(float)
+    for snapshot in snapshots.values():
+        for key, value in snapshot.items():
+            totals[key] += value
+    return totals
+
+
+_task_started = {}
+
+
+@before_task_publish.connect
+def _stamp_published(headers=None, **kwargs):
+    # wall clock: publisher and worker are different processes
+    if headers is not None:
+        headers.setdefault('published_at', time.time())
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+    published = getattr(task.request, 'published_at', None) if task is not None else None
+    if published is not None:
+        lane = (task.request.delivery_info or {}).get('routing_key') or 'unknown'
+        registry.observe(
+            'bank_celery_task_latency_seconds', (('lane', lane), ('task', task.name)),
+            max(time.time() - published, 0.0),
+        )
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is None or task is None:
+        return
+    labels = (('task', task.name),)
+    registry.inc('bank_celery_tasks_total', labels + (('state', state or 'UNKNOWN'),))
+    registry.observe('bank_celery_task_duration_seconds', labels, time.perf_counter() - started)
+    # an eager task ran in the web process, whose own registry /metrics already reads
+    if not task.request.is_eager:
+        push_worker_metrics()
+
+
+@worker_process_shutdown.connect
+def _worker_process_shutdown(**kwargs):
+    push_worker_metrics(force=True)
@@ -0,0 +1,123 @@
+# middleware.py
+import hashlib
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from . import routers
+from .metrics import QueryCollector, record_request
+
+logger = logging.getLogger('bank.metrics')
+
+
+class QueryMetricsMiddleware:
+    """
+    Records per-view latency for every request and, for a sampled fraction of
+    requests, the number of DB queries and time spent in the database.
+    Sampled requests slower than METRICS_SLOW_REQUEST_MS are logged together
+    with their slowest SQL statements. A streaming response is timed until
+    the server closes it; only the queries run before it is returned are
+    counted, since its body may be produced on another thread.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+        self.slow_threshold = getattr(settings, 'METRICS_SLOW_REQUEST_MS', 500) / 1000
+
+    def __call__(self, request):
+        collector = None
+        start = time.perf_counter()
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            collector = QueryCollector()
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(collector))
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        if response.streaming:
+            # the body is produced while the server iterates it; close() ends the request
+            response._resource_closers.append(lambda: self.finish(request, response, start, collector))
+        else:
+            self.finish(request, response, start, collector)
+        return response
+
+    def finish(self, request, response, start, collector):
+        duration = time.perf_counter() - start
+        view = self.view_label(request)
+        record_request(view, request.method, response.status_code, duration, collector)
+        if duration >= self.slow_threshold:
+            self.log_slow_request(request, view, duration, collector)
+
+    def view_label(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.route or match.view_name or 'unknown'
+
+    def log_slow_request(self, request, view, duration, collector):
+        if collector is None:
+            logger.warning('Slow request %s %s (%s) took %.0fms', request.method, request.path, view, duration * 1000)
+            return
+        statements = '\n'.join(
+            f'  {elapsed * 1000:.1f}ms [{alias}] {sql}' for elapsed, alias, sql in collector.slowest()
+        )
+        logger.warning(
+            'Slow request %s %s (%s) took %.0fms, %d queries / %.0fms in DB\n%s',
+            request.method, request.path, view, duration * 1000,
+            collector.count, collector.duration * 1000, statements,
+        )
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets read-only requests (GET/HEAD/OPTIONS) read from the replica.
+    After a client writes, its reads stay on the primary for
+    DB_REPLICA_STICKY_SECONDS so it always sees its own writes despite
+    replication lag. Clients are identified by their token or session cookie,
+    including one the writing request issued (see routers.issue_credential).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, 'DB_REPLICA_STICKY_SECONDS', 5)
+
+    def __call__(self, request):
+        if not routers.replica_configured():
+            return self.get_response(request)
+
+        pin_key = self.pin_key(request)
+        use_replica = request.method in ('GET', 'HEAD', 'OPTIONS')
+        if use_replica and pin_key and cache.get(pin_key):
+            use_replica = False
+
+        state, token = routers.begin_request(use_replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.end_request(token)
+        if state.wrote:
+            # a login or registration is followed by requests carrying what it issued
+            credentials = list(state.issued)
+            session = response.cookies.get(settings.SESSION_COOKIE_NAME)
+            if session is not None and session.value:
+                credentials.append(session.value)
+            keys = [pin_key] + [self.credential_key(credential) for credential in credentials]
+            cache.set_many(dict.fromkeys(filter(None, keys), 1), self.sticky_seconds)
+        return response
+
+    def pin_key(self, request):
+        return self.credential_key(
+            request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        )
+
+    def credential_key(self, credential):
+        if not credential:
+            return None
+        return 'db-pin:' + hashlib.sha1(credential.encode()).hexdigest()
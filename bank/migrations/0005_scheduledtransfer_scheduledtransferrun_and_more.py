@@ -0,0 +1,62 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:52
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0004_statementjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('description', models.TextField(blank=True)),
+                ('frequency', models.CharField(choices=[('ONCE', 'Once'), ('DAILY', 'Daily'), ('WEEKLY', 'Weekly'), ('MONTHLY', 'Monthly')], default='MONTHLY', max_length=10)),
+                ('start_at', models.DateTimeField(help_text='First occurrence; later ones keep its day and time')),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('due_at', models.DateTimeField(help_text='Occurrence currently being executed')),
+                ('next_run_at', models.DateTimeField(help_text='When the executor picks it up next, including retries')),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed'), ('CANCELLED', 'Cancelled')], default='ACTIVE', max_length=20)),
+                ('run_count', models.PositiveIntegerField(default=0)),
+                ('failure_count', models.PositiveIntegerField(default=0, help_text='Failed attempts for the current occurrence')),
+                ('max_retries', models.PositiveSmallIntegerField(default=3)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_transfers', to='bank.account')),
+                ('recipient_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incoming_scheduled_transfers', to='bank.account')),
+            ],
+            options={
+                'ordering': ['next_run_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduledTransferRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_at', models.DateTimeField()),
+                ('run_at', models.DateTimeField()),
+                ('attempt', models.PositiveIntegerField(default=1)),
+                ('status', models.CharField(choices=[('COMPLETED', 'Completed'), ('FAILED', 'Failed')], max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('transaction_id', models.BigIntegerField(blank=True, null=True)),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='bank.scheduledtransfer')),
+            ],
+            options={
+                'ordering': ['-run_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='scheduledtransfer',
+            index=models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['next_run_at'], name='scheduled_transfer_due_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:54
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0005_scheduledtransfer_scheduledtransferrun_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccrualRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('accrual_date', models.DateField(unique=True)),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('COMPLETED', 'Completed')], default='RUNNING', max_length=20)),
+                ('last_account_id', models.BigIntegerField(default=0, help_text='High-water mark: accounts up to this id are done')),
+                ('accounts_processed', models.PositiveIntegerField(default=0)),
+                ('accounts_credited', models.PositiveIntegerField(default=0)),
+                ('total_interest', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('seconds_elapsed', models.FloatField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-accrual_date'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_type',
+            field=models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAWAL', 'Withdrawal'), ('TRANSFER', 'Transfer'), ('INTEREST', 'Interest')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='InterestAccrual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('accrual_date', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, help_text='Balance the interest was computed on', max_digits=15)),
+                ('annual_rate', models.DecimalField(decimal_places=3, max_digits=6)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('transaction_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interest_accruals', to='bank.account')),
+            ],
+            options={
+                'ordering': ['-accrual_date'],
+                'constraints': [models.UniqueConstraint(fields=('account', 'accrual_date'), name='unique_interest_accrual_per_day')],
+            },
+        ),
+    ]
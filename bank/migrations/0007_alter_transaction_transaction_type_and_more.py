@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0006_accrualrun_alter_transaction_transaction_type_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_type',
+            field=models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAWAL', 'Withdrawal'), ('TRANSFER', 'Transfer'), ('INTEREST', 'Interest'), ('LOAN_PAYMENT', 'Loan payment')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('status', 'ACCEPTED')), fields=['next_payment_date'], name='loan_payment_due_idx'),
+        ),
+    ]
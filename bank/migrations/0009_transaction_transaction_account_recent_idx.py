@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0008_fxrate_transaction_exchange_rate_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', '-created_at'], name='transaction_account_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Postgres gets a table partitioned by month on created_at; partitions are
+# created by bank.archive.ensure_partitions() before rows are moved in. A
+# partitioned table's primary key has to include the partition key.
+POSTGRES_DDL = """
+CREATE TABLE bank_transactionarchive (
+    id bigint NOT NULL,
+    account_id bigint NOT NULL,
+    transaction_type varchar(20) NOT NULL,
+    amount numeric(15, 2) NOT NULL,
+    balance_after numeric(15, 2) NOT NULL,
+    description text NOT NULL,
+    recipient_account_id bigint NULL,
+    recipient_amount numeric(15, 2) NULL,
+    exchange_rate numeric(18, 8) NULL,
+    status varchar(20) NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    archived_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+CREATE INDEX archive_account_recent_idx ON bank_transactionarchive (account_id, created_at DESC);
+CREATE INDEX archive_created_idx ON bank_transactionarchive (created_at);
+"""
+
+
+def partition_archive_table(apps, schema_editor):
+    # the table CreateModel made is still empty, so it is simply replaced
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE bank_transactionarchive')
+        schema_editor.execute(POSTGRES_DDL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0010_customuser_updated_at_loan_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('transaction_type', models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAWAL', 'Withdrawal'), ('TRANSFER', 'Transfer'), ('INTEREST', 'Interest'), ('LOAN_PAYMENT', 'Loan payment')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('description', models.TextField(blank=True)),
+                ('recipient_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('exchange_rate', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('account', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_transactions', to='bank.account')),
+                ('recipient_account', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='bank.account')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['account', '-created_at'], name='archive_account_recent_idx'), models.Index(fields=['created_at'], name='archive_created_idx')],
+            },
+        ),
+        migrations.RunPython(partition_archive_table, migrations.RunPython.noop),
+    ]
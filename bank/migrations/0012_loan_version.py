@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0011_transactionarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0012_loan_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['created_at'], name='transaction_created_idx'),
+        ),
+    ]
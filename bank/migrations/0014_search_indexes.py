@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:22
+
+from django.db import migrations
+
+
+# Postgres only: pg_trgm GIN indexes serve the UPPER(col) LIKE UPPER('%term%')
+# that icontains compiles to. SQLite's FTS5 tables are created by
+# bank.search.install_sqlite_indexes() after every migrate.
+POSTGRES_INDEXES = {
+    'transaction_description_trgm': 'bank_transaction USING gin (UPPER(description) gin_trgm_ops)',
+    'customuser_username_trgm': 'bank_customuser USING gin (UPPER(username) gin_trgm_ops)',
+    'customuser_email_trgm': 'bank_customuser USING gin (UPPER(email) gin_trgm_ops)',
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, definition in POSTGRES_INDEXES.items():
+        # CONCURRENTLY keeps writes flowing while the 10M-row table is indexed
+        schema_editor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in POSTGRES_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('bank', '0013_transaction_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
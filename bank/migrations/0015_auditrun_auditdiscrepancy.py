@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0014_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('COMPLETED', 'Completed')], default='RUNNING', max_length=20)),
+                ('last_account_id', models.BigIntegerField(default=0, help_text='High-water mark: accounts up to this id are audited')),
+                ('max_account_id', models.BigIntegerField(default=0, help_text='Highest account id when the run started')),
+                ('accounts_checked', models.PositiveIntegerField(default=0)),
+                ('rows_checked', models.PositiveBigIntegerField(default=0)),
+                ('discrepancy_count', models.PositiveIntegerField(default=0)),
+                ('seconds_elapsed', models.FloatField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AuditDiscrepancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('CHAIN', 'Balance chain break'), ('BALANCE', 'Account balance mismatch')], max_length=20)),
+                ('transaction_id', models.BigIntegerField(blank=True, null=True)),
+                ('expected', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('actual', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audit_discrepancies', to='bank.account')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discrepancies', to='bank.auditrun')),
+            ],
+            options={
+                'ordering': ['account_id', 'transaction_id'],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0016_offboardingjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='recipient_account',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='received_transactions', to='bank.account'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed'), ('REVERSED', 'Reversed')], default='PENDING', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_type',
+            field=models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAWAL', 'Withdrawal'), ('TRANSFER', 'Transfer'), ('INTEREST', 'Interest'), ('LOAN_PAYMENT', 'Loan payment'), ('TRANSFER_IN', 'Incoming transfer')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='transactionarchive',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed'), ('REVERSED', 'Reversed')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='transactionarchive',
+            name='transaction_type',
+            field=models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAWAL', 'Withdrawal'), ('TRANSFER', 'Transfer'), ('INTEREST', 'Interest'), ('LOAN_PAYMENT', 'Loan payment'), ('TRANSFER_IN', 'Incoming transfer')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='CrossShardCredit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_shard', models.CharField(max_length=50)),
+                ('source_transaction_id', models.BigIntegerField()),
+                ('account_id', models.BigIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('status', models.CharField(choices=[('APPLIED', 'Applied'), ('REJECTED', 'Rejected')], max_length=20)),
+                ('transaction_id', models.BigIntegerField(blank=True, help_text='The TRANSFER_IN row, when applied', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source_shard', 'source_transaction_id'), name='crossshardcredit_source_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:49
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0017_cross_shard_transfers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='held_balance',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15),
+        ),
+        migrations.CreateModel(
+            name='AuthorizationHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('TRANSFER', 'Transfer'), ('WITHDRAWAL', 'Withdrawal')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('description', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('HELD', 'Held'), ('SETTLED', 'Settled'), ('RELEASED', 'Released'), ('EXPIRED', 'Expired')], default='HELD', max_length=20)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('transaction_id', models.BigIntegerField(blank=True, help_text='The posted row, once settled', null=True)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('settled_at', models.DateTimeField(blank=True, null=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='bank.account')),
+                ('recipient_account', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='bank.account')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'HELD')), fields=['account', 'id'], name='hold_open_account_idx'), models.Index(condition=models.Q(('status', 'HELD')), fields=['expires_at'], name='hold_open_expiry_idx')],
+            },
+        ),
+    ]
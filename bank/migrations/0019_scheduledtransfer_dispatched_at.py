@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0018_authorization_holds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledtransfer',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0019_scheduledtransfer_dispatched_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scheduledtransfer',
+            name='recipient_account',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='incoming_scheduled_transfers', to='bank.account'),
+        ),
+    ]
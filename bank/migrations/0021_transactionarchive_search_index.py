@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:02
+
+from django.db import migrations
+
+
+# Postgres only: the archive's description gets the same pg_trgm index as the
+# hot table (migration 0014). An index on the partitioned parent cascades to
+# every monthly partition, including ones created later, but cannot be built
+# CONCURRENTLY. SQLite's FTS5 table is created by
+# bank.search.install_sqlite_indexes() after every migrate.
+INDEX = 'transactionarchive_description_trgm'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX} ON bank_transactionarchive USING gin (UPPER(description) gin_trgm_ops)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0020_scheduledtransfer_recipient_any_shard'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
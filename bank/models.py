@@ -1,15 +1,42 @@
 # models.py
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 import random
 import string
 
+from .sharding import next_id, replicate_user, shard_for_account, shard_for_account_number, sharding_enabled
+
+
+def save_with_shard_id(instance, alias, save, *args, **kwargs):
+    """
+    Insert `instance` on `alias` through `save` (the model's own save), with
+    a primary key from that shard's residue class so the id alone routes
+    to it. Retries when a concurrent insert took the same id.
+    """
+    # objects.create() passes the manager's default database; the shard decides
+    kwargs['using'] = alias
+    pk = instance._meta.pk
+    for attempt in range(5):
+        instance.pk = next_id(alias, instance._meta.db_table, pk.column)
+        try:
+            with transaction.atomic(using=alias):
+                save(*args, **kwargs)
+            return
+        except IntegrityError:
+            instance.pk = None
+            if attempt == 4:
+                raise
+
+
 class CustomUser(AbstractUser):
     phone = models.CharField(max_length=15, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
     date_of_birth = models.DateField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.username
@@ -26,14 +53,31 @@ class Account(models.Model):
     account_type = models.CharField(max_length=20, choices=ACCOUNT_TYPES)
     balance = models.DecimalField(max_digits=15, decimal_places=2, default=1000.0,  validators=[MinValueValidator(Decimal(1000.00))])
     currency = models.CharField(max_length=3, default='NPR')
+    # part of the balance reserved by authorization holds not yet settled
+    held_balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    @property
+    def available_balance(self):
+        return self.balance - self.held_balance
+
     def save(self, *args, **kwargs):
         if not self.account_number:
             self.account_number = self.generate_account_number()
+        if self.pk is None and sharding_enabled():
+            return self.save_on_shard(*args, **kwargs)
         super().save(*args, **kwargs)
+
+    def save_on_shard(self, *args, **kwargs):
+        # the number picks the shard; the id is taken from that shard's
+        # residue class, so routing by either one finds the same database
+        alias = shard_for_account_number(self.account_number)
+        if alias != DEFAULT_DB_ALIAS:
+            # 'default' holds the user's own row; a stale copy must not overwrite it
+            replicate_user(self.user, alias)
+        save_with_shard_id(self, alias, super().save, *args, **kwargs)
     
     def generate_account_number(self):
         return ''.join(random.choices(string.digits, k=12))
@@ -46,12 +90,18 @@ class Transaction(models.Model):
         ('DEPOSIT', 'Deposit'),
         ('WITHDRAWAL', 'Withdrawal'),
         ('TRANSFER', 'Transfer'),
+        ('INTEREST', 'Interest'),
+        ('LOAN_PAYMENT', 'Loan payment'),
+        # the recipient's side of a transfer from another shard
+        ('TRANSFER_IN', 'Incoming transfer'),
     ]
     
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
         ('COMPLETED', 'Completed'),
         ('FAILED', 'Failed'),
+        # debited, then refunded by a later row: a cross-shard transfer the recipient's shard refused
+        ('REVERSED', 'Reversed'),
     ]
     
     account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='transactions')
@@ -64,17 +114,34 @@ class Transaction(models.Model):
         on_delete=models.SET_NULL, 
         null=True, 
         blank=True, 
+        # with sharding the recipient may live in another database
+        db_constraint=False,
         related_name='received_transactions'
     )
+    # set on cross-currency transfers: what the recipient was credited, in its currency
+    recipient_amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    exchange_rate = models.DecimalField(max_digits=18, decimal_places=8, null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['account', '-created_at'], name='transaction_account_recent_idx'),
+            # admin date filters and the archive job's created_at cutoff
+            models.Index(fields=['created_at'], name='transaction_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.transaction_type} - {self.amount} - {self.created_at}"
 
+class LoanQuerySet(models.QuerySet):
+    def with_payment_totals(self):
+        # one aggregate per loan instead of a payments scan per row
+        return self.annotate(
+            paid_total=Coalesce(Sum('payments__amount'), Value(Decimal('0.00')), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+        )
+
 class Loan(models.Model):
     LOAN_STATUS = [
         ('PENDING', 'Pending'),
@@ -113,6 +180,16 @@ class Loan(models.Model):
     next_payment_date = models.DateField(null=True, blank=True)
     last_payment_date = models.DateField(null=True, blank=True)
     purpose = models.TextField(blank=True, null=True, help_text="Purpose of the loan")
+    updated_at = models.DateTimeField(auto_now=True)
+    # bumped on every status change; admins send back the version they saw
+    version = models.PositiveIntegerField(default=0)
+
+    objects = LoanQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_payment_date'], condition=models.Q(status='ACCEPTED'), name='loan_payment_due_idx'),
+        ]
     
     def calculate_monthly_payment(self):
         if self.interest_rate > 0 and self.loan_term_months > 0:
@@ -129,16 +206,21 @@ class Loan(models.Model):
         return self.monthly_payment * self.loan_term_months
     
     def remaining_amount(self):
-        paid = sum(float(payment.amount) for payment in self.payments.all())
-        total = float(self.total_payable())
-        return max(Decimal(str(total - paid)), Decimal('0.00'))
+        return max((self.total_payable() - self.total_paid()).quantize(Decimal('0.01')), Decimal('0.00'))
     
     def total_paid(self):
-        return sum(float(payment.amount) for payment in self.payments.all())
+        if hasattr(self, 'paid_total'):
+            paid = Decimal(self.paid_total)
+        else:
+            paid = sum((payment.amount for payment in self.payments.all()), Decimal('0.00'))
+        return paid.quantize(Decimal('0.01'))
     
     def save(self, *args, **kwargs):
         if not self.monthly_payment or self.monthly_payment == 0:
             self.monthly_payment = self.calculate_monthly_payment()
+        if self.pk is None and sharding_enabled():
+            # on the borrower's shard, with an id that maps back to it
+            return save_with_shard_id(self, shard_for_account(self.borrower_id), super().save, *args, **kwargs)
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -158,3 +240,343 @@ class LoanInterest(models.Model):
     def __str__(self):
         return f"Payment for Loan #{self.loan.loan_id} - NPR {self.amount}"
     
+
+class StatementJob(models.Model):
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('READY', 'Ready'),
+        ('FAILED', 'Failed'),
+        ('EXPIRED', 'Expired'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='statement_jobs')
+    task_id = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    file_path = models.CharField(max_length=255, blank=True, help_text="File name inside STATEMENT_STORAGE_DIR")
+    file_size = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'expires_at'])]
+
+    def etag(self):
+        return f'"{self.task_id}-{self.status}-{int(self.updated_at.timestamp() * 1000)}"'
+
+    def __str__(self):
+        return f"Statement {self.task_id} - {self.user.username} - {self.status}"
+
+class ScheduledTransfer(models.Model):
+    FREQUENCY_CHOICES = [
+        ('ONCE', 'Once'),
+        ('DAILY', 'Daily'),
+        ('WEEKLY', 'Weekly'),
+        ('MONTHLY', 'Monthly'),
+    ]
+
+    STATUS_CHOICES = [
+        ('ACTIVE', 'Active'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='scheduled_transfers')
+    # with sharding the recipient may live in another database
+    recipient_account = models.ForeignKey(
+        Account, on_delete=models.CASCADE, db_constraint=False, related_name='incoming_scheduled_transfers'
+    )
+    amount = models.DecimalField(max_digits=15, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+    description = models.TextField(blank=True)
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='MONTHLY')
+    start_at = models.DateTimeField(help_text="First occurrence; later ones keep its day and time")
+    end_date = models.DateField(null=True, blank=True)
+    due_at = models.DateTimeField(help_text="Occurrence currently being executed")
+    next_run_at = models.DateTimeField(help_text="When the executor picks it up next, including retries")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ACTIVE')
+    run_count = models.PositiveIntegerField(default=0)
+    failure_count = models.PositiveIntegerField(default=0, help_text="Failed attempts for the current occurrence")
+    max_retries = models.PositiveSmallIntegerField(default=3)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    # set when a chunk task is queued for it, cleared when the task runs
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['next_run_at']
+        indexes = [
+            models.Index(fields=['next_run_at'], condition=models.Q(status='ACTIVE'), name='scheduled_transfer_due_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.due_at:
+            self.due_at = self.start_at
+        if not self.next_run_at:
+            self.next_run_at = self.due_at
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.frequency} {self.amount} {self.account.account_number} -> {self.recipient_account.account_number}"
+
+class ScheduledTransferRun(models.Model):
+    STATUS_CHOICES = [
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+
+    schedule = models.ForeignKey(ScheduledTransfer, on_delete=models.CASCADE, related_name='runs')
+    due_at = models.DateTimeField()
+    run_at = models.DateTimeField()
+    attempt = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    error = models.TextField(blank=True)
+    transaction_id = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-run_at']
+
+    def __str__(self):
+        return f"Run of schedule #{self.schedule_id} at {self.run_at} - {self.status}"
+
+class InterestAccrual(models.Model):
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='interest_accruals')
+    accrual_date = models.DateField()
+    balance = models.DecimalField(max_digits=15, decimal_places=2, help_text="Balance the interest was computed on")
+    annual_rate = models.DecimalField(max_digits=6, decimal_places=3)
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    transaction_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-accrual_date']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'accrual_date'], name='unique_interest_accrual_per_day'),
+        ]
+
+    def __str__(self):
+        return f"Interest {self.amount} on {self.account_id} for {self.accrual_date}"
+
+class AccrualRun(models.Model):
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+    ]
+
+    accrual_date = models.DateField(unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RUNNING')
+    last_account_id = models.BigIntegerField(default=0, help_text="High-water mark: accounts up to this id are done")
+    accounts_processed = models.PositiveIntegerField(default=0)
+    accounts_credited = models.PositiveIntegerField(default=0)
+    total_interest = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    seconds_elapsed = models.FloatField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-accrual_date']
+
+    def __str__(self):
+        return f"Accrual {self.accrual_date} - {self.status}"
+
+class FxRate(models.Model):
+    currency = models.CharField(max_length=3, unique=True)
+    rate = models.DecimalField(max_digits=18, decimal_places=8, help_text="Units of FX_BASE_CURRENCY per one unit of this currency")
+    as_of = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['currency']
+
+    def __str__(self):
+        return f"{self.currency} = {self.rate} ({self.as_of})"
+
+class TransactionArchive(models.Model):
+    """
+    Cold storage for transactions past TRANSACTION_HOT_DAYS (see bank/archive.py).
+    Rows keep their original id; on Postgres the table is range-partitioned
+    by month on created_at.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    account = models.ForeignKey(Account, on_delete=models.DO_NOTHING, db_constraint=False, related_name='archived_transactions')
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TRANSACTION_TYPES)
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    balance_after = models.DecimalField(max_digits=15, decimal_places=2)
+    description = models.TextField(blank=True)
+    recipient_account = models.ForeignKey(
+        Account,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    recipient_amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    exchange_rate = models.DecimalField(max_digits=18, decimal_places=8, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Transaction.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['account', '-created_at'], name='archive_account_recent_idx'),
+            models.Index(fields=['created_at'], name='archive_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_type} (archived)"
+
+class AuditRun(models.Model):
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RUNNING')
+    last_account_id = models.BigIntegerField(default=0, help_text="High-water mark: accounts up to this id are audited")
+    max_account_id = models.BigIntegerField(default=0, help_text="Highest account id when the run started")
+    accounts_checked = models.PositiveIntegerField(default=0)
+    rows_checked = models.PositiveBigIntegerField(default=0)
+    discrepancy_count = models.PositiveIntegerField(default=0)
+    seconds_elapsed = models.FloatField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Audit {self.started_at:%Y-%m-%d %H:%M} - {self.status}"
+
+class AuditDiscrepancy(models.Model):
+    KIND_CHOICES = [
+        ('CHAIN', 'Balance chain break'),
+        ('BALANCE', 'Account balance mismatch'),
+    ]
+
+    run = models.ForeignKey(AuditRun, on_delete=models.CASCADE, related_name='discrepancies')
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='audit_discrepancies')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # the row where the chain breaks (CHAIN) or the last row of the chain (BALANCE)
+    transaction_id = models.BigIntegerField(null=True, blank=True)
+    expected = models.DecimalField(max_digits=18, decimal_places=2)
+    actual = models.DecimalField(max_digits=18, decimal_places=2)
+
+    class Meta:
+        ordering = ['account_id', 'transaction_id']
+
+    def __str__(self):
+        return f"{self.kind} on {self.account_id}: expected {self.expected}, found {self.actual}"
+
+class OffboardingJob(models.Model):
+    """
+    A user being removed in the background (see bank/offboarding.py). The
+    user and accounts are deactivated when the job is created; the job then
+    archives transactions and deletes related rows in chunks, the user last.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+
+    # plain ids: the user and accounts are gone once the job completes
+    user_id = models.BigIntegerField(db_index=True)
+    username = models.CharField(max_length=150)
+    account_ids = models.JSONField(default=list)
+    requested_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    stage = models.CharField(max_length=30, blank=True)
+    rows_archived = models.PositiveBigIntegerField(default=0)
+    rows_deleted = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Offboarding {self.username} - {self.status}"
+
+class CrossShardCredit(models.Model):
+    """
+    Recipient-side record of a transfer posted on another shard (see
+    post_cross_shard_transfer). Stored on the recipient's shard and unique
+    per source row, so applying the credit a second time finds it instead.
+    """
+    STATUS_CHOICES = [
+        ('APPLIED', 'Applied'),
+        ('REJECTED', 'Rejected'),
+    ]
+
+    source_shard = models.CharField(max_length=50)
+    source_transaction_id = models.BigIntegerField()
+    # plain ids: a rejected credit may name an account that does not exist here
+    account_id = models.BigIntegerField()
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    transaction_id = models.BigIntegerField(null=True, blank=True, help_text="The TRANSFER_IN row, when applied")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source_shard', 'source_transaction_id'], name='crossshardcredit_source_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.source_shard}#{self.source_transaction_id} -> {self.account_id} ({self.status})"
+
+class AuthorizationHold(models.Model):
+    """
+    Funds reserved on an account for a transfer or withdrawal that is not
+    posted yet (see posting.reserve_funds). Lives on the account's shard.
+    Settlement posts the transaction and turns the hold SETTLED, or RELEASED
+    when the posting is refused; holds left HELD past expires_at are
+    released by the sweeper.
+    """
+    KIND_CHOICES = [
+        ('TRANSFER', 'Transfer'),
+        ('WITHDRAWAL', 'Withdrawal'),
+    ]
+
+    STATUS_CHOICES = [
+        ('HELD', 'Held'),
+        ('SETTLED', 'Settled'),
+        ('RELEASED', 'Released'),
+        ('EXPIRED', 'Expired'),
+    ]
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='holds')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    # with sharding the recipient may live in another database
+    recipient_account = models.ForeignKey(
+        Account, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False, related_name='+'
+    )
+    description = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='HELD')
+    error = models.CharField(max_length=255, blank=True)
+    transaction_id = models.BigIntegerField(null=True, blank=True, help_text="The posted row, once settled")
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    settled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # settlement and the sweeper only ever look at open holds
+            models.Index(fields=['account', 'id'], condition=models.Q(status='HELD'), name='hold_open_account_idx'),
+            models.Index(fields=['expires_at'], condition=models.Q(status='HELD'), name='hold_open_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} hold {self.amount} on {self.account_id} ({self.status})"
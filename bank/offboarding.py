@@ -0,0 +1,171 @@
+# offboarding.py
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .archive import ARCHIVED_UNTIL_KEY, move_to_archive
+from .models import (
+    CustomUser, Account, Transaction, Loan, LoanInterest, StatementJob, ScheduledTransfer,
+    ScheduledTransferRun, InterestAccrual, AuditDiscrepancy, OffboardingJob, AuthorizationHold
+)
+from .sharding import per_shard, shards
+from .statements import statement_path
+
+logger = logging.getLogger(__name__)
+
+
+def start_offboarding(user, requested_by=None):
+    """
+    Deactivate `user`, their accounts and any schedule paying from or into
+    them, and create the job that removes the rest. A few small UPDATEs per
+    shard, so the request returns at once and posting refuses the accounts
+    from here on. Returns (job, queue); queue is False while an earlier job
+    for the user is still pending or running. One that has made no progress
+    for OFFBOARDING_STALE_SECONDS lost its worker and is queued again.
+    """
+    now = timezone.now()
+    job = OffboardingJob.objects.filter(user_id=user.pk).exclude(status='COMPLETED').first()
+    if job is not None:
+        if job.status == 'FAILED':
+            return job, True
+        # claimed by touching updated_at, so concurrent requests queue it once
+        stale = now - timedelta(seconds=settings.OFFBOARDING_STALE_SECONDS)
+        claimed = OffboardingJob.objects.filter(pk=job.pk, status=job.status, updated_at__lt=stale).update(updated_at=now)
+        return job, bool(claimed)
+    account_ids = [
+        account_id for queryset in per_shard(Account.objects.filter(user_id=user.pk))
+        for account_id in queryset.values_list('id', flat=True)
+    ]
+    # accounts and schedules first: a job only exists once nothing can post for the user
+    for alias in shards():
+        with transaction.atomic(using=alias):
+            Account.objects.using(alias).filter(id__in=account_ids).update(is_active=False, updated_at=now)
+            # schedules live with their payer, who may be on any shard
+            ScheduledTransfer.objects.using(alias).filter(
+                Q(account_id__in=account_ids) | Q(recipient_account_id__in=account_ids), status='ACTIVE',
+            ).update(status='CANCELLED', updated_at=now)
+    with transaction.atomic():
+        CustomUser.objects.filter(pk=user.pk).update(is_active=False, updated_at=now)
+        job = OffboardingJob.objects.create(
+            user_id=user.pk, username=user.username, account_ids=account_ids, requested_by=requested_by,
+        )
+    return job, True
+
+
+def record_progress(job, **counts):
+    OffboardingJob.objects.filter(pk=job.pk).update(
+        updated_at=timezone.now(), **{field: F(field) + count for field, count in counts.items()}
+    )
+
+
+def archive_account_transactions(job, alias, chunk_size):
+    """Move the accounts' own transactions to the shard's archive, which is kept after the accounts go."""
+    moved = 0
+    while True:
+        with transaction.atomic(using=alias):
+            rows = list(
+                Transaction.objects.using(alias).filter(account_id__in=job.account_ids)
+                .order_by('id').values_list('id', 'created_at')[:chunk_size]
+            )
+            if not rows:
+                break
+            move_to_archive(rows, alias)
+        record_progress(job, rows_archived=len(rows))
+        moved += len(rows)
+    if moved:
+        cache.delete(ARCHIVED_UNTIL_KEY)
+
+
+def detach_incoming_transfers(job, alias, chunk_size):
+    """Other accounts' transfers into these ones keep their row, minus the recipient link."""
+    while True:
+        with transaction.atomic(using=alias):
+            ids = list(
+                Transaction.objects.using(alias).filter(recipient_account_id__in=job.account_ids)
+                .order_by('id').values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            Transaction.objects.using(alias).filter(id__in=ids).update(recipient_account=None)
+
+
+def remove_statement_files(job):
+    for file_path in StatementJob.objects.filter(user_id=job.user_id).exclude(file_path='').values_list('file_path', flat=True):
+        try:
+            os.remove(statement_path(StatementJob(file_path=file_path)))
+        except FileNotFoundError:
+            pass
+
+
+def related_rows(user_id, accounts):
+    """
+    What goes, in dependency order, so each chunked delete finds nothing left
+    below it to cascade into. Run against every shard: rows hanging off the
+    accounts live on theirs (schedules on the payer's), and the user has a
+    copy on each shard holding one of their accounts.
+    """
+    schedules = ScheduledTransfer.objects.filter(Q(account_id__in=accounts) | Q(recipient_account_id__in=accounts))
+    return [
+        ('loan payments', LoanInterest.objects.filter(loan__borrower_id__in=accounts)),
+        ('loans', Loan.objects.filter(borrower_id__in=accounts)),
+        ('schedule runs', ScheduledTransferRun.objects.filter(schedule_id__in=schedules.values('id'))),
+        ('schedules', schedules),
+        ('interest accruals', InterestAccrual.objects.filter(account_id__in=accounts)),
+        ('audit discrepancies', AuditDiscrepancy.objects.filter(account_id__in=accounts)),
+        ('holds', AuthorizationHold.objects.filter(account_id__in=accounts)),
+        ('statements', StatementJob.objects.filter(user_id=user_id)),
+        ('accounts', Account.objects.filter(user_id=user_id)),
+        ('user', CustomUser.objects.filter(pk=user_id)),
+    ]
+
+
+def delete_in_chunks(job, queryset, chunk_size):
+    model, alias = queryset.model, queryset.db
+    while True:
+        with transaction.atomic(using=alias):
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+            deleted, _ = model.objects.using(alias).filter(pk__in=ids).delete()
+        record_progress(job, rows_deleted=deleted)
+
+
+def set_stage(job, stage):
+    job.stage = stage
+    OffboardingJob.objects.filter(pk=job.pk).update(stage=stage, updated_at=timezone.now())
+
+
+def run_offboarding(job, chunk_size=None):
+    """
+    Remove an offboarded user's data in short DB transactions of at most
+    `chunk_size` rows each, instead of one user.delete() whose collector
+    loads and locks everything at once. Every stage picks up whatever is
+    left, so a failed or interrupted job is simply run again.
+    """
+    chunk_size = chunk_size or settings.OFFBOARDING_CHUNK_SIZE
+    OffboardingJob.objects.filter(pk=job.pk).update(status='RUNNING', error='', updated_at=timezone.now())
+
+    set_stage(job, 'transactions')
+    for alias in shards():
+        archive_account_transactions(job, alias, chunk_size)
+    set_stage(job, 'incoming transfers')
+    for alias in shards():
+        detach_incoming_transfers(job, alias, chunk_size)
+    remove_statement_files(job)
+    for stage, queryset in related_rows(job.user_id, job.account_ids):
+        set_stage(job, stage)
+        for alias in shards():
+            delete_in_chunks(job, queryset.using(alias), chunk_size)
+
+    OffboardingJob.objects.filter(pk=job.pk).update(
+        status='COMPLETED', stage='', finished_at=timezone.now(), updated_at=timezone.now()
+    )
+    job.refresh_from_db()
+    logger.info('Offboarded %s: %d rows archived, %d deleted', job.username, job.rows_archived, job.rows_deleted)
+    return job
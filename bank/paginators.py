@@ -0,0 +1,36 @@
+# paginators.py
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# below this many rows the exact count is cheap enough to run
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimated_count(queryset):
+    """Planner row estimate for the queryset (Postgres only, None elsewhere)."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin paginator for the big tables. Counts exactly up to
+    EXACT_COUNT_LIMIT with a LIMITed subquery, past that uses the planner's
+    estimate instead of a COUNT(*) over millions of rows. Page numbers near
+    the end are approximate; that is the trade.
+    """
+
+    @cached_property
+    def count(self):
+        bounded = self.object_list.order_by()[:EXACT_COUNT_LIMIT + 1].count()
+        if bounded <= EXACT_COUNT_LIMIT:
+            return bounded
+        estimate = estimated_count(self.object_list)
+        if estimate is None:
+            return super().count
+        return max(estimate, bounded)
@@ -0,0 +1,447 @@
+# posting.py
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .events import balance_changed
+from .fx import FxError, convert
+from .models import Account, AuthorizationHold, CrossShardCredit, Transaction
+from .sharding import on_shard, shard_db, shard_for_account, shards
+from .velocity import record_on_commit, release_on_commit
+
+
+class PostingError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def lock_accounts(account_ids):
+    """
+    SELECT ... FOR UPDATE the accounts in ascending id order. Every posting path
+    locks this way, so two transfers touching the same pair of accounts in
+    opposite directions queue up instead of deadlocking.
+    """
+    accounts = Account.objects.select_for_update().filter(id__in=sorted(set(account_ids))).order_by('id')
+    return {account.id: account for account in accounts}
+
+
+def check_transfer(source, recipient, amount):
+    """Validate a transfer between locked (or None) accounts; returns (credited amount, rate or None)."""
+    if source is None or not source.is_active:
+        raise PostingError('Account not found', 404)
+    if recipient is None or not recipient.is_active:
+        raise PostingError('Recipient account not found', 404)
+    if source.id == recipient.id:
+        raise PostingError('Cannot transfer to the same account')
+    if amount <= 0:
+        raise PostingError('Invalid amount')
+    if source.available_balance < amount:
+        raise PostingError('Insufficient funds')
+    if source.currency == recipient.currency:
+        return amount, None
+    try:
+        return convert(amount, source.currency, recipient.currency)
+    except FxError as e:
+        raise PostingError(str(e))
+
+
+def lock_transfer_accounts(alias, source_ids, recipient_ids):
+    """
+    Lock the sources and the recipients on shard `alias` in id order. A
+    recipient on another shard is read unlocked from its own; it is checked
+    again, under its lock, in apply_cross_shard_credit.
+    """
+    recipient_ids = {account_id for account_id in recipient_ids if account_id is not None}
+    local_ids = {account_id for account_id in recipient_ids if shard_for_account(account_id) == alias}
+    accounts = lock_accounts(list(source_ids) + list(local_ids))
+    for account_id in recipient_ids - local_ids:
+        accounts[account_id] = Account.objects.using(shard_for_account(account_id)).filter(id=account_id).first()
+    return accounts
+
+
+def post_transfers(instructions):
+    """
+    Post many transfers under one set of row locks. Must run inside
+    transaction.atomic() on the current shard. `instructions` is a list of
+    (key, source_id, recipient_id, amount, description), `amount` in the
+    source account's currency; the recipient is credited the converted
+    amount when currencies differ. Returns
+    {key: Transaction or PostingError}. Rejected instructions leave balances
+    untouched, the rest are written with one bulk UPDATE and one bulk INSERT.
+    A recipient on another shard is not credited here: the transfer is
+    debited and left PENDING, for the caller to pass to complete_transfer()
+    once the transaction has committed.
+    """
+    accounts = lock_transfer_accounts(
+        shard_db(),
+        [source for _, source, _, _, _ in instructions],
+        [recipient for _, _, recipient, _, _ in instructions],
+    )
+    results, created, touched = {}, [], {}
+    for key, source_id, recipient_id, amount, description in instructions:
+        amount = Decimal(amount)
+        source, recipient = accounts.get(source_id), accounts.get(recipient_id)
+        try:
+            credited, rate = check_transfer(source, recipient, amount)
+        except PostingError as e:
+            results[key] = e
+            continue
+
+        source.balance -= amount
+        touched[source.id] = source
+        local = recipient._state.db == source._state.db
+        if local:
+            recipient.balance += credited
+            touched[recipient.id] = recipient
+        trans = Transaction(
+            account=source,
+            transaction_type='TRANSFER',
+            amount=amount,
+            balance_after=source.balance,
+            description=description,
+            recipient_account=recipient,
+            recipient_amount=credited if rate is not None else None,
+            exchange_rate=rate,
+            status='COMPLETED' if local else 'PENDING'
+        )
+        created.append(trans)
+        results[key] = trans
+
+    if touched:
+        now = timezone.now()
+        for account in touched.values():
+            account.updated_at = now
+        Account.objects.bulk_update(list(touched.values()), ['balance', 'updated_at'])
+        Transaction.objects.bulk_create(created)
+        for account in touched.values():
+            balance_changed(account)
+    return results
+
+
+def post_transfer(source_id, recipient_id, amount, description=''):
+    """Single transfer; raises PostingError instead of returning it."""
+    with transaction.atomic(using=shard_db()):
+        result = post_transfers([(0, source_id, recipient_id, amount, description)])[0]
+    if isinstance(result, PostingError):
+        raise result
+    if result.status == 'PENDING':
+        return complete_transfer(result)
+    return result
+
+
+def post_cross_shard_transfer(source_id, recipient, amount, description=''):
+    """
+    Transfer to an account on another shard, where no single DB transaction
+    covers both rows. Phase one debits the source and records the transfer
+    PENDING on its shard; phase two credits the recipient on its shard,
+    keyed on the source row so it applies at most once; phase three marks
+    the transfer COMPLETED, or refunds it if the recipient's shard refused.
+    Each phase commits on its own; a transfer interrupted in between is
+    finished by resolve_cross_shard_transfers. Call outside any atomic
+    block. Raises PostingError if phase one rejects the transfer.
+    """
+    trans = prepare_cross_shard_transfer(source_id, recipient, Decimal(amount), description)
+    return complete_transfer(trans)
+
+
+def complete_transfer(trans):
+    """Phases two and three for a PENDING cross-shard transfer; raises PostingError if it was refunded."""
+    return finish_cross_shard_transfer(trans, apply_cross_shard_credit(trans))
+
+
+def prepare_cross_shard_transfer(source_id, recipient, amount, description):
+    alias = shard_for_account(source_id)
+    with on_shard(alias), transaction.atomic(using=alias):
+        source = lock_accounts([source_id]).get(source_id)
+        # the recipient is checked again, under its lock, in phase two
+        credited, rate = check_transfer(source, recipient, amount)
+        source.balance -= amount
+        source.save(update_fields=['balance', 'updated_at'])
+        trans = Transaction.objects.create(
+            account=source,
+            transaction_type='TRANSFER',
+            amount=amount,
+            balance_after=source.balance,
+            description=description,
+            recipient_account=recipient,
+            recipient_amount=credited if rate is not None else None,
+            exchange_rate=rate,
+            status='PENDING'
+        )
+        balance_changed(source)
+    return trans
+
+
+def apply_cross_shard_credit(trans):
+    source_shard = trans._state.db
+    alias = shard_for_account(trans.recipient_account_id)
+    credited = trans.recipient_amount or trans.amount
+    marker = {'source_shard': source_shard, 'source_transaction_id': trans.id}
+    try:
+        with on_shard(alias), transaction.atomic(using=alias):
+            recipient = lock_accounts([trans.recipient_account_id]).get(trans.recipient_account_id)
+            credit = CrossShardCredit.objects.filter(**marker).first()
+            if credit is not None:
+                return credit
+            if recipient is None or not recipient.is_active:
+                return CrossShardCredit.objects.create(
+                    **marker, account_id=trans.recipient_account_id, amount=credited, status='REJECTED',
+                )
+            recipient.balance += credited
+            recipient.save(update_fields=['balance', 'updated_at'])
+            incoming = Transaction.objects.create(
+                account=recipient,
+                transaction_type='TRANSFER_IN',
+                amount=credited,
+                balance_after=recipient.balance,
+                description=trans.description,
+                status='COMPLETED'
+            )
+            balance_changed(recipient)
+            return CrossShardCredit.objects.create(
+                **marker, account_id=recipient.id, amount=credited, status='APPLIED', transaction_id=incoming.id,
+            )
+    except IntegrityError:
+        # a concurrent attempt (the sweeper) got there first; use its outcome
+        return CrossShardCredit.objects.using(alias).get(**marker)
+
+
+def finish_cross_shard_transfer(trans, credit):
+    alias = trans._state.db
+    with on_shard(alias), transaction.atomic(using=alias):
+        rows = Transaction.objects.filter(id=trans.id)
+        trans.status = rows.select_for_update().values_list('status', flat=True).get()
+        if trans.status == 'PENDING' and credit.status == 'APPLIED':
+            trans.status = 'COMPLETED'
+            rows.update(status=trans.status)
+        if trans.status == 'COMPLETED':
+            return trans
+        if trans.status == 'PENDING':
+            # keep the debit row (later rows' balance_after include it) and refund with a new one
+            source = lock_accounts([trans.account_id])[trans.account_id]
+            source.balance += trans.amount
+            source.save(update_fields=['balance', 'updated_at'])
+            Transaction.objects.create(
+                account=source,
+                transaction_type='TRANSFER_IN',
+                amount=trans.amount,
+                balance_after=source.balance,
+                description=f'Refund of transfer #{trans.id}: recipient account not found',
+                status='COMPLETED'
+            )
+            trans.status = 'REVERSED'
+            rows.update(status=trans.status)
+            balance_changed(source)
+    raise PostingError('Recipient account not found', 404)
+
+
+def resolve_cross_shard_transfers(older_than):
+    """
+    Finish transfers left PENDING before `older_than` by a crash between
+    phases. Phase two is idempotent, so it is simply run again: it applies
+    the credit or returns the outcome already recorded. Returns
+    {'completed': n, 'reversed': n}.
+    """
+    counts = {'completed': 0, 'reversed': 0}
+    for alias in shards():
+        pending = (
+            Transaction.objects.using(alias)
+            .filter(status='PENDING', transaction_type='TRANSFER', created_at__lt=older_than)
+            .order_by('id')
+        )
+        for trans in pending.iterator():
+            try:
+                complete_transfer(trans)
+                counts['completed'] += 1
+            except PostingError:
+                counts['reversed'] += 1
+    return counts
+
+
+def reserve_funds(account_id, kind, amount, recipient_id=None, description=''):
+    """
+    Reserve `amount` of the account's available balance for a TRANSFER or
+    WITHDRAWAL hold, posted later by settle_holds. The balance check and the
+    reservation are one conditional UPDATE, so the account row stays locked
+    for that statement and the hold's INSERT only, not across validation,
+    lookups and posting. The reservation is what counts toward the
+    account's velocity limits, so queued holds count before they settle.
+    Raises PostingError if the account is missing or closed, or its
+    available balance is short.
+    """
+    amount = Decimal(amount)
+    if amount <= 0:
+        raise PostingError('Invalid amount')
+    alias = shard_for_account(account_id)
+    now = timezone.now()
+    with on_shard(alias), transaction.atomic(using=alias):
+        reserved = Account.objects.filter(
+            id=account_id, is_active=True, balance__gte=F('held_balance') + amount,
+        ).update(held_balance=F('held_balance') + amount, updated_at=now)
+        if not reserved:
+            if Account.objects.filter(id=account_id, is_active=True).exists():
+                raise PostingError('Insufficient funds')
+            raise PostingError('Account not found', 404)
+        record_on_commit(account_id, amount)
+        return AuthorizationHold.objects.create(
+            account_id=account_id,
+            kind=kind,
+            amount=amount,
+            recipient_account_id=recipient_id,
+            description=description,
+            expires_at=now + timedelta(seconds=settings.HOLD_EXPIRY_SECONDS),
+        )
+
+
+def hold_transaction(hold, source, recipient):
+    """Move the balances for `hold` and return its unsaved Transaction; raises PostingError if refused."""
+    if hold.kind == 'WITHDRAWAL':
+        if source is None or not source.is_active:
+            raise PostingError('Account not found', 404)
+        source.balance -= hold.amount
+        return Transaction(
+            account=source,
+            transaction_type='WITHDRAWAL',
+            amount=hold.amount,
+            balance_after=source.balance,
+            description=hold.description,
+            status='COMPLETED'
+        )
+    credited, rate = check_transfer(source, recipient, hold.amount)
+    source.balance -= hold.amount
+    local = recipient._state.db == source._state.db
+    if local:
+        recipient.balance += credited
+    return Transaction(
+        account=source,
+        transaction_type='TRANSFER',
+        amount=hold.amount,
+        balance_after=source.balance,
+        description=hold.description,
+        recipient_account=recipient,
+        recipient_amount=credited if rate is not None else None,
+        exchange_rate=rate,
+        # credited on the recipient's shard after the commit
+        status='COMPLETED' if local else 'PENDING'
+    )
+
+
+def settle_holds(alias, limit=None, **filters):
+    """
+    Post the open holds on shard `alias` matching `filters`, oldest first and
+    at most `limit`, under one set of row locks: the queued debits of a hot
+    account cost one UPDATE of its row instead of a locked transaction each.
+    Holds another settlement has locked are skipped. A hold whose posting is
+    refused now (recipient closed, no FX rate) is RELEASED with the reason.
+    Transfers to another shard are debited here and credited after the
+    commit, as in post_cross_shard_transfer. Call outside any atomic block.
+    Returns [(hold, Transaction or PostingError)].
+    """
+    results = []
+    with on_shard(alias):
+        with transaction.atomic(using=alias):
+            holds = list(
+                AuthorizationHold.objects.select_for_update(skip_locked=True)
+                .filter(status='HELD', **filters).order_by('id')[:limit]
+            )
+            if not holds:
+                return results
+            accounts = lock_transfer_accounts(
+                alias, [hold.account_id for hold in holds], [hold.recipient_account_id for hold in holds],
+            )
+
+            now = timezone.now()
+            created, touched = [], {}
+            for hold in holds:
+                source = hold.account = accounts[hold.account_id]
+                recipient = accounts.get(hold.recipient_account_id)
+                # settled or refused, the reservation ends here
+                source.held_balance -= hold.amount
+                touched[source.id] = source
+                hold.settled_at = now
+                try:
+                    trans = hold_transaction(hold, source, recipient)
+                except PostingError as e:
+                    hold.status, hold.error = 'RELEASED', e.message
+                    release_on_commit(hold.account_id, hold.amount, hold.created_at)
+                    results.append((hold, e))
+                    continue
+                if trans.status == 'COMPLETED' and trans.recipient_account_id is not None:
+                    touched[recipient.id] = recipient
+                hold.status = 'SETTLED'
+                created.append((hold, trans))
+                results.append((hold, trans))
+
+            for account in touched.values():
+                account.updated_at = now
+            Account.objects.bulk_update(list(touched.values()), ['balance', 'held_balance', 'updated_at'])
+            Transaction.objects.bulk_create([trans for _, trans in created])
+            for hold, trans in created:
+                hold.transaction_id = trans.id
+            AuthorizationHold.objects.bulk_update(holds, ['status', 'error', 'transaction_id', 'settled_at'])
+            for account in touched.values():
+                balance_changed(account)
+
+    for index, (hold, result) in enumerate(results):
+        if isinstance(result, Transaction) and result.status == 'PENDING':
+            try:
+                results[index] = (hold, complete_transfer(result))
+            except PostingError as e:
+                # refunded: nothing left the account after all
+                release_on_commit(hold.account_id, hold.amount, hold.created_at)
+                results[index] = (hold, e)
+    return results
+
+
+def settle_hold(hold):
+    """Settle one hold now; returns its Transaction or raises PostingError, like post_transfer."""
+    results = settle_holds(hold._state.db, id=hold.id)
+    if results:
+        result = results[0][1]
+    else:
+        # the settlement task or the sweeper got to it first
+        hold.refresh_from_db()
+        if hold.status != 'SETTLED':
+            raise PostingError(hold.error or 'Authorization is no longer open', 409)
+        result = Transaction.objects.using(hold._state.db).get(id=hold.transaction_id)
+    if isinstance(result, PostingError):
+        raise result
+    return result
+
+
+def release_expired_holds(now=None, chunk_size=1000):
+    """
+    Return the funds of holds still open past expires_at to the available
+    balance. Each hold is claimed with an UPDATE conditional on its status,
+    so one a settlement has locked is left to that settlement. Returns the
+    number released.
+    """
+    now = now or timezone.now()
+    released = 0
+    for alias in shards():
+        with on_shard(alias):
+            while True:
+                expired = list(
+                    AuthorizationHold.objects.filter(status='HELD', expires_at__lt=now)
+                    .order_by('id').values_list('id', 'account_id', 'amount', 'created_at')[:chunk_size]
+                )
+                if not expired:
+                    break
+                for hold_id, account_id, amount, reserved_at in expired:
+                    with transaction.atomic(using=alias):
+                        claimed = AuthorizationHold.objects.filter(id=hold_id, status='HELD').update(
+                            status='EXPIRED', error='Not settled before it expired', settled_at=now,
+                        )
+                        if claimed:
+                            Account.objects.filter(id=account_id).update(
+                                held_balance=F('held_balance') - amount, updated_at=now,
+                            )
+                            release_on_commit(account_id, amount, reserved_at)
+                            released += claimed
+    return released
@@ -0,0 +1,178 @@
+# reconciliation.py
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from multiprocessing import get_context
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Account, AuditDiscrepancy, AuditRun, Transaction, TransactionArchive
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+CREDIT_TYPES = ('DEPOSIT', 'INTEREST', 'TRANSFER_IN')
+
+
+def events_sql(table):
+    """
+    An account's signed movements from one table: its own rows (debits and
+    credits, with the balance_after they recorded) and the transfers it
+    received, which only exist as the sender's row. Own rows count unless
+    FAILED: a cross-shard debit has moved the balance while PENDING, and a
+    REVERSED one is refunded by a later TRANSFER_IN row.
+    """
+    credits = ', '.join(f"'{kind}'" for kind in CREDIT_TYPES)
+    return (
+        f"SELECT account_id, id, 0 AS incoming, balance_after, "
+        f"CASE WHEN transaction_type IN ({credits}) THEN amount ELSE -amount END AS delta "
+        f"FROM {table} WHERE status <> 'FAILED' AND account_id BETWEEN %s AND %s "
+        f"UNION ALL "
+        f"SELECT recipient_account_id, id, 1, NULL, COALESCE(recipient_amount, amount) "
+        f"FROM {table} WHERE status = 'COMPLETED' AND transaction_type = 'TRANSFER' "
+        f"AND recipient_account_id BETWEEN %s AND %s"
+    )
+
+
+# For every own row, balance_after minus the running sum of movements up to
+# it is the balance the account must have opened with; along an intact chain
+# that value never changes. The last row's opening plus all movements has to
+# equal Account.balance. The balance check is driven from the accounts, so
+# one with no own rows is held to an opening of 0 plus whatever it received.
+# One statement, so Postgres checks a single snapshot.
+AUDIT_SQL = """
+WITH events AS ({hot} UNION ALL {archive}),
+accts AS (
+    SELECT id, balance FROM {accounts} WHERE id BETWEEN %s AND %s
+),
+chain AS (
+    SELECT account_id, id, balance_after,
+           balance_after - SUM(delta) OVER (
+               PARTITION BY account_id ORDER BY id, incoming ROWS UNBOUNDED PRECEDING
+           ) AS opening
+    FROM events
+),
+totals AS (
+    SELECT account_id, SUM(delta) AS total FROM events GROUP BY account_id
+),
+own AS (
+    SELECT account_id, id, balance_after, opening,
+           LAG(opening) OVER (PARTITION BY account_id ORDER BY id) AS prev_opening,
+           ROW_NUMBER() OVER (PARTITION BY account_id ORDER BY id DESC) AS from_end
+    FROM chain WHERE balance_after IS NOT NULL
+)
+SELECT 'CHAIN', account_id, id, prev_opening + balance_after - opening, balance_after
+FROM own WHERE prev_opening IS NOT NULL AND ROUND(opening - prev_opening, 2) <> 0
+UNION ALL
+SELECT 'BALANCE', acc.id, own.id, COALESCE(own.opening, 0) + COALESCE(totals.total, 0), acc.balance
+FROM accts acc
+LEFT JOIN own ON own.account_id = acc.id AND own.from_end = 1
+LEFT JOIN totals ON totals.account_id = acc.id
+WHERE ROUND(acc.balance - (COALESCE(own.opening, 0) + COALESCE(totals.total, 0)), 2) <> 0
+UNION ALL
+SELECT 'SUMMARY', (SELECT COUNT(*) FROM accts), (SELECT COUNT(*) FROM own), NULL, NULL
+"""
+
+
+def audit_sql():
+    return AUDIT_SQL.format(
+        hot=events_sql(Transaction._meta.db_table),
+        archive=events_sql(TransactionArchive._meta.db_table),
+        accounts=Account._meta.db_table,
+    )
+
+
+def to_cents(value):
+    return Decimal(str(value)).quantize(CENT)
+
+
+def audit_chunk(bounds):
+    """Check the accounts on shard `alias` with ids in [first, last]; returns (last, accounts, rows, discrepancies)."""
+    alias, first, last = bounds
+    with connections[alias].cursor() as cursor:
+        cursor.execute(audit_sql(), [first, last] * 5)
+        rows = cursor.fetchall()
+    accounts = checked = 0
+    discrepancies = []
+    for kind, account_id, transaction_id, expected, actual in rows:
+        if kind == 'SUMMARY':
+            accounts, checked = account_id, transaction_id
+        else:
+            discrepancies.append((kind, account_id, transaction_id, to_cents(expected), to_cents(actual)))
+    return last, accounts, checked, discrepancies
+
+
+def record_chunk(run, result, elapsed):
+    last, accounts, checked, discrepancies = result
+    with transaction.atomic(using=run._state.db):
+        AuditDiscrepancy.objects.using(run._state.db).bulk_create([
+            AuditDiscrepancy(
+                run=run, kind=kind, account_id=account_id, transaction_id=transaction_id,
+                expected=expected, actual=actual,
+            )
+            for kind, account_id, transaction_id, expected, actual in discrepancies
+        ])
+        run.last_account_id = last
+        run.accounts_checked += accounts
+        run.rows_checked += checked
+        run.discrepancy_count += len(discrepancies)
+        run.seconds_elapsed += elapsed
+        run.save(update_fields=[
+            'last_account_id', 'accounts_checked', 'rows_checked', 'discrepancy_count', 'seconds_elapsed',
+        ])
+
+
+def current_run(restart=False, alias=DEFAULT_DB_ALIAS):
+    """
+    Shard `alias`'s unfinished run to resume, or a new one covering every
+    account on it now. Each shard is audited on its own, its run and
+    discrepancies stored next to the accounts they cover.
+    """
+    run = AuditRun.objects.using(alias).filter(status='RUNNING').order_by('-started_at').first()
+    if run is None or restart:
+        max_id = Account.objects.using(alias).aggregate(max_id=Max('id'))['max_id'] or 0
+        run = AuditRun.objects.using(alias).create(max_account_id=max_id)
+    return run
+
+
+def reconcile_balances(run=None, chunk_size=1000, workers=1):
+    """
+    Audit every account of the run's shard after its high-water mark in
+    chunks of `chunk_size` account ids, `workers` processes at a time.
+    Results are recorded in chunk order, so the high-water mark only moves
+    past chunks whose discrepancies are saved and an interrupted run
+    resumes from it.
+    """
+    run = run or current_run()
+    alias = run._state.db
+    chunks = [
+        (alias, first, min(first + chunk_size - 1, run.max_account_id))
+        for first in range(run.last_account_id + 1, run.max_account_id + 1, chunk_size)
+    ]
+    started = time.monotonic()
+    if workers > 1 and chunks:
+        # forked children open their own connections; they must not inherit ours
+        connections.close_all()
+        with ProcessPoolExecutor(workers, mp_context=get_context('fork')) as pool:
+            for result in pool.map(audit_chunk, chunks):
+                now = time.monotonic()
+                record_chunk(run, result, now - started)
+                started = now
+    else:
+        for chunk in chunks:
+            result = audit_chunk(chunk)
+            now = time.monotonic()
+            record_chunk(run, result, now - started)
+            started = now
+
+    run.status = 'COMPLETED'
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'finished_at'])
+    logger.info(
+        'Audit %s on %s: %d accounts, %d rows, %d discrepancies in %.1fs',
+        run.pk, alias, run.accounts_checked, run.rows_checked, run.discrepancy_count, run.seconds_elapsed,
+    )
+    return run
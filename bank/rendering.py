@@ -0,0 +1,22 @@
+# rendering.py
+# PDF rendering for Celery workers only: weasyprint takes a noticeable share of
+# a process's import time and memory, so nothing imported by the web
+# processes (views, urls, tasks at module level) may import this module.
+from weasyprint import HTML
+
+
+def statement_pdf(transactions):
+    html_string = "<h2>Transactions</h2><table><tr><th>Date&nbsp&nbsp&nbsp&nbsp</th><th>Time&nbsp&nbsp&nbsp&nbsp</th><th>Type&nbsp&nbsp&nbsp&nbsp</th><th>Amount&nbsp&nbsp&nbsp&nbsp</th><th>Balance</th></tr>"
+    for tx in transactions:
+        html_string += f"""
+                        <tr>
+                            <td>{tx.created_at.date()}&nbsp&nbsp&nbsp&nbsp</td>
+                            <td>{tx.created_at.strftime("%H:%M")}&nbsp&nbsp&nbsp&nbsp</td>
+                            <td> {tx.transaction_type}&nbsp&nbsp&nbsp&nbsp</td>
+                            <td>{tx.amount}&nbsp&nbsp&nbsp&nbsp</td>
+                            <td>{tx.balance_after}</td>
+                        </tr>
+                        """
+
+    html_string += "</table>"
+    return HTML(string=html_string).write_pdf()
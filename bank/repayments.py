@@ -0,0 +1,141 @@
+# repayments.py
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .events import balance_changed, publish_on_commit
+from .models import Account, Loan, LoanInterest, Transaction
+from .posting import lock_accounts
+from .scheduling import chunked
+from .sharding import on_shard, shards
+
+CHUNK_SIZE = 500
+PAYMENT_INTERVAL = timedelta(days=30)
+
+
+def due_loan_ids(today):
+    # range scan on the partial (status='ACCEPTED', next_payment_date) index;
+    # overdue loans stay in the set until an installment is collected
+    return (
+        Loan.objects.filter(status='ACCEPTED', next_payment_date__lte=today)
+        .order_by('next_payment_date')
+        .values_list('loan_id', flat=True)
+        .iterator(chunk_size=5000)
+    )
+
+
+def paid_totals(loan_ids):
+    rows = (
+        LoanInterest.objects.filter(loan_id__in=loan_ids)
+        .values('loan_id')
+        .annotate(total=Sum('amount'))
+        .values_list('loan_id', 'total')
+    )
+    return {loan_id: Decimal(total).quantize(Decimal('0.01')) for loan_id, total in rows}
+
+
+def collect_installments(loan_ids, today=None, alias=DEFAULT_DB_ALIAS):
+    """
+    Auto-debit one installment for each due loan of a chunk on shard
+    `alias`, in one DB transaction. Loans are locked first (skipping ones
+    another worker holds), then borrower accounts in id order, the same
+    order every posting path uses. Balances are written with one bulk
+    UPDATE, transactions and payments with bulk INSERTs. Loans whose
+    account cannot cover the installment are left due and retried on the
+    next run.
+    """
+    today = today or timezone.localdate()
+    with on_shard(alias), transaction.atomic(using=alias):
+        loans = list(
+            Loan.objects.select_for_update(skip_locked=True)
+            .filter(loan_id__in=loan_ids, status='ACCEPTED', next_payment_date__lte=today)
+            .order_by('loan_id')
+        )
+        if not loans:
+            return {'collected': 0, 'failed': 0, 'paid_off': 0, 'payments': []}
+
+        paid = paid_totals([loan.loan_id for loan in loans])
+        accounts = lock_accounts([loan.borrower_id for loan in loans])
+
+        collected, trans_list, failed, paid_off, touched = [], [], 0, 0, {}
+        for loan in loans:
+            remaining = max(loan.total_payable() - paid.get(loan.loan_id, Decimal('0.00')), Decimal('0.00'))
+            if remaining <= 0:
+                # settled by earlier manual payments, nothing to debit
+                loan.status = 'PAID'
+                loan.version += 1
+                loan.next_payment_date = None
+                paid_off += 1
+                continue
+
+            amount = min(loan.monthly_payment, remaining)
+            account = accounts.get(loan.borrower_id)
+            if account is None or not account.is_active or account.available_balance < amount:
+                failed += 1
+                continue
+
+            account.balance -= amount
+            touched[account.id] = account
+            trans_list.append(Transaction(
+                account=account,
+                transaction_type='LOAN_PAYMENT',
+                amount=amount,
+                balance_after=account.balance,
+                description=f'EMI for loan #{loan.loan_id}',
+                status='COMPLETED'
+            ))
+            collected.append(LoanInterest(
+                loan=loan, amount=amount, payment_method='Auto-debit',
+                notes=f'Installment due {loan.next_payment_date}',
+            ))
+            loan.last_payment_date = today
+            if remaining - amount <= 0:
+                loan.status = 'PAID'
+                loan.version += 1
+                loan.next_payment_date = None
+                paid_off += 1
+            else:
+                loan.next_payment_date += PAYMENT_INTERVAL
+
+        now = timezone.now()
+        for account in touched.values():
+            account.updated_at = now
+        for loan in loans:
+            loan.updated_at = now
+        Account.objects.bulk_update(list(touched.values()), ['balance', 'updated_at'])
+        Transaction.objects.bulk_create(trans_list)
+        for payment, trans in zip(collected, trans_list):
+            payment.transaction_id = str(trans.id)
+        LoanInterest.objects.bulk_create(collected)
+        Loan.objects.bulk_update(loans, ['status', 'last_payment_date', 'next_payment_date', 'updated_at', 'version'])
+
+        for account in touched.values():
+            balance_changed(account)
+        for payment in collected:
+            publish_on_commit(accounts[payment.loan.borrower_id].user_id, 'loan_payment', {
+                'loan_id': payment.loan.loan_id,
+                'amount': payment.amount,
+                'status': payment.loan.status,
+            })
+
+    return {
+        'collected': len(collected),
+        'failed': failed,
+        'paid_off': paid_off,
+        'payments': [(payment.loan_id, payment.id) for payment in collected],
+    }
+
+
+def dispatch_due_loans(enqueue, today=None, chunk_size=CHUNK_SIZE):
+    """Hand each shard's due loan ids to `enqueue(ids, today, alias)` in chunks; returns how many chunks were sent."""
+    today = today or timezone.localdate()
+    chunks = 0
+    for alias in shards():
+        with on_shard(alias):
+            for chunk in chunked(due_loan_ids(today), chunk_size):
+                enqueue(chunk, today, alias)
+                chunks += 1
+    return chunks
@@ -0,0 +1,150 @@
+# routers.py
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from . import sharding
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+
+
+class RoutingState:
+    def __init__(self, use_replica=False):
+        self.use_replica = use_replica
+        self.wrote = False
+        # credentials handed out by the request (login, registration), pinned along with its own
+        self.issued = []
+
+
+_routing = contextvars.ContextVar('bank_db_routing', default=None)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def begin_request(use_replica):
+    state = RoutingState(use_replica=use_replica)
+    return state, _routing.set(state)
+
+
+def end_request(token):
+    _routing.reset(token)
+
+
+def issue_credential(credential):
+    """
+    Note an Authorization header value the current request hands out, so
+    the client's next requests with it are pinned to the primary as well.
+    """
+    state = _routing.get()
+    if state is not None:
+        state.issued.append(credential)
+
+
+def in_request_context(iterator):
+    """
+    Step `iterator` in a copy of the current context. A streaming body is
+    consumed after the middleware has ended the request; this keeps its
+    queries routed the way the request's were.
+    """
+    # copied now, not on the first next(), which runs after the request ended
+    return _stepped(iter(iterator), contextvars.copy_context())
+
+
+def _stepped(iterator, context):
+    while True:
+        try:
+            item = context.run(next, iterator)
+        except StopIteration:
+            return
+        yield item
+
+
+@contextmanager
+def read_from_primary():
+    """Force reads inside the block to the primary, e.g. right before a write."""
+    state = _routing.get()
+    if state is None:
+        yield
+        return
+    previous = state.use_replica
+    state.use_replica = False
+    try:
+        yield
+    finally:
+        state.use_replica = previous
+
+
+class ShardRouter:
+    """
+    With more than one entry in ACCOUNT_SHARDS, sends accounts and the rows
+    hanging off them (sharding.SHARDED_MODELS) to a shard: an instance's own
+    shard (or the one its account id maps to), else the shard set with
+    sharding.on_shard(). Returns None for everything else, and for all
+    models when there is a single shard, leaving the decision to
+    PrimaryReplicaRouter.
+    """
+
+    def shard(self, model, hints):
+        if not sharding.sharding_enabled() or model._meta.model_name not in sharding.SHARDED_MODELS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._meta.model_name in sharding.SHARDED_MODELS:
+            if instance._state.db:
+                return instance._state.db
+            account_id = sharding.shard_key(instance)
+            if account_id is not None:
+                return sharding.shard_for_account(account_id)
+        return sharding.current_shard()
+
+    def db_for_read(self, model, **hints):
+        return self.shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self.shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # users are copied to every shard holding their accounts; transfers reference accounts anywhere
+        aliases = set(sharding.shards())
+        if len(aliases) > 1 and obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads to the replica only while a read-only request is being served
+    (see ReplicaRoutingMiddleware). Everything else - writes, reads inside an
+    atomic block (select_for_update), Celery tasks, management commands - goes
+    to the primary. Once a request writes, the rest of it reads from the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or not state.use_replica or not replica_configured():
+            return PRIMARY
+        if connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+            state.use_replica = False
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        dbs = {PRIMARY, REPLICA}
+        if obj1._state.db in dbs and obj2._state.db in dbs:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA:
+            return False
+        return None
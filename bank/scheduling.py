@@ -0,0 +1,171 @@
+# scheduling.py
+from datetime import timedelta
+from itertools import islice
+
+from dateutil.relativedelta import relativedelta
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ScheduledTransfer, ScheduledTransferRun
+from .posting import PostingError, complete_transfer, post_transfers
+from .sharding import on_shard, shards
+
+CHUNK_SIZE = 200
+RETRY_DELAY = timedelta(minutes=15)
+# a claim older than this belongs to a lost task and may be dispatched again
+CLAIM_TIMEOUT = timedelta(minutes=10)
+UPDATE_FIELDS = [
+    'due_at', 'next_run_at', 'status', 'run_count', 'failure_count',
+    'last_run_at', 'last_error', 'dispatched_at', 'updated_at',
+]
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def next_occurrence(schedule):
+    if schedule.frequency == 'DAILY':
+        return schedule.due_at + timedelta(days=1)
+    if schedule.frequency == 'WEEKLY':
+        return schedule.due_at + timedelta(weeks=1)
+    if schedule.frequency == 'MONTHLY':
+        # day= keeps the original day of month, clamped on shorter months
+        return schedule.due_at + relativedelta(months=1, day=schedule.start_at.day)
+    return None
+
+
+def unclaimed(now):
+    return Q(dispatched_at__isnull=True) | Q(dispatched_at__lt=now - CLAIM_TIMEOUT)
+
+
+def due_schedule_ids(now):
+    # range scan on the partial (status='ACTIVE', next_run_at) index
+    return (
+        ScheduledTransfer.objects.filter(unclaimed(now), status='ACTIVE', next_run_at__lte=now)
+        .order_by('next_run_at')
+        .values_list('id', flat=True)
+    )
+
+
+def claim(schedule_ids, now):
+    """Mark the schedules dispatched unless another dispatch holds them; returns the ids claimed."""
+    ScheduledTransfer.objects.filter(unclaimed(now), id__in=schedule_ids, status='ACTIVE').update(dispatched_at=now)
+    return list(
+        ScheduledTransfer.objects.filter(id__in=schedule_ids, dispatched_at=now)
+        .order_by('id').values_list('id', flat=True)
+    )
+
+
+def advance(schedule, now):
+    following = next_occurrence(schedule)
+    schedule.failure_count = 0
+    if following is None or (schedule.end_date and following.date() > schedule.end_date):
+        schedule.status = 'COMPLETED'
+        return
+    schedule.due_at = following
+    schedule.next_run_at = following
+
+
+def execute_schedules(schedule_ids, now=None, alias=DEFAULT_DB_ALIAS):
+    """
+    Run one chunk of due schedules on shard `alias` in a single DB
+    transaction: lock the schedules (skipping ones another worker holds),
+    post all transfers through post_transfers(), then write schedule state
+    and run records in bulk. Transfers to another shard's accounts are
+    credited after the commit; one the recipient's shard refuses is
+    refunded and its run marked FAILED.
+    """
+    now = now or timezone.now()
+    with on_shard(alias):
+        counts, pending = run_schedules(schedule_ids, now, alias)
+        for schedule_id, trans in pending:
+            try:
+                complete_transfer(trans)
+            except PostingError as e:
+                ScheduledTransferRun.objects.filter(schedule_id=schedule_id, transaction_id=trans.id).update(
+                    status='FAILED', error=e.message,
+                )
+                ScheduledTransfer.objects.filter(id=schedule_id).update(last_error=e.message, updated_at=timezone.now())
+                counts['completed'] -= 1
+                counts['failed'] += 1
+    return counts
+
+
+def run_schedules(schedule_ids, now, alias):
+    """The DB transaction of execute_schedules; returns (counts, [(schedule id, PENDING cross-shard Transaction)])."""
+    with transaction.atomic(using=alias):
+        schedules = list(
+            ScheduledTransfer.objects.select_for_update(skip_locked=True)
+            .filter(id__in=schedule_ids, status='ACTIVE', next_run_at__lte=now)
+            .order_by('id')
+        )
+        if not schedules:
+            return {'completed': 0, 'failed': 0}, []
+
+        results = post_transfers([
+            (schedule.id, schedule.account_id, schedule.recipient_account_id, schedule.amount, schedule.description)
+            for schedule in schedules
+        ])
+
+        runs, completed, failed, pending = [], 0, 0, []
+        for schedule in schedules:
+            result = results[schedule.id]
+            schedule.dispatched_at = None
+            schedule.last_run_at = now
+            schedule.updated_at = now
+            if isinstance(result, PostingError):
+                failed += 1
+                schedule.failure_count += 1
+                schedule.last_error = result.message
+                runs.append(ScheduledTransferRun(
+                    schedule=schedule, due_at=schedule.due_at, run_at=now,
+                    attempt=schedule.failure_count, status='FAILED', error=result.message,
+                ))
+                if schedule.failure_count > schedule.max_retries:
+                    # give up on this occurrence; one-off transfers fail for good
+                    if schedule.frequency == 'ONCE':
+                        schedule.status = 'FAILED'
+                    else:
+                        advance(schedule, now)
+                else:
+                    schedule.next_run_at = now + RETRY_DELAY * (2 ** (schedule.failure_count - 1))
+                continue
+
+            completed += 1
+            if result.status == 'PENDING':
+                pending.append((schedule.id, result))
+            runs.append(ScheduledTransferRun(
+                schedule=schedule, due_at=schedule.due_at, run_at=now,
+                attempt=schedule.failure_count + 1, status='COMPLETED', transaction_id=result.id,
+            ))
+            schedule.run_count += 1
+            schedule.last_error = ''
+            advance(schedule, now)
+
+        ScheduledTransfer.objects.bulk_update(schedules, UPDATE_FIELDS)
+        ScheduledTransferRun.objects.bulk_create(runs)
+    return {'completed': completed, 'failed': failed}, pending
+
+
+def dispatch_due_transfers(enqueue, now=None, chunk_size=CHUNK_SIZE):
+    """
+    Claim each shard's due schedule ids in chunks and hand each claimed
+    chunk to `enqueue(ids, now, alias)`; returns how many chunks were sent.
+    Schedules still waiting in the queue from an earlier run stay claimed,
+    so a backlog longer than the dispatch interval is not queued twice.
+    """
+    now = now or timezone.now()
+    chunks = 0
+    for alias in shards():
+        with on_shard(alias):
+            # claimed schedules drop out of due_schedule_ids, so this ends
+            while chunk := list(due_schedule_ids(now)[:chunk_size]):
+                claimed = claim(chunk, now)
+                if claimed:
+                    enqueue(claimed, now, alias)
+                    chunks += 1
+    return chunks
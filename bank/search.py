@@ -0,0 +1,145 @@
+# search.py
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Account, CustomUser, Transaction
+
+MIN_TERM_LENGTH = 3
+RESULT_LIMIT = 50
+
+
+class SearchError(ValueError):
+    pass
+
+
+# SQLite: external-content FTS5 tables with the trigram tokenizer (substring,
+# case-insensitive matching), kept in step with their tables by triggers.
+# Postgres gets pg_trgm GIN indexes instead, see migrations 0014 and 0021.
+SQLITE_INDEXES = {
+    'bank_transaction_fts': ('bank_transaction', ['description']),
+    'bank_transactionarchive_fts': ('bank_transactionarchive', ['description']),
+    'bank_customuser_fts': ('bank_customuser', ['username', 'email']),
+}
+
+
+def sqlite_index_sql(fts, table, columns):
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old});"
+    insert = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN {delete} {insert} END",
+    ]
+
+
+def install_sqlite_indexes(using_connection=None):
+    """
+    Create the FTS tables and triggers if missing. Runs after every migrate:
+    SQLite rebuilds a table to alter it, which drops its triggers, so a
+    trigger found missing means the index has to be rebuilt from the table.
+    """
+    conn = using_connection or connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        for fts, (table, columns) in SQLITE_INDEXES.items():
+            cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s", [f'{fts}_a_'])
+            complete = cursor.fetchone()[0] == 3
+            for statement in sqlite_index_sql(fts, table, columns):
+                cursor.execute(statement)
+            if not complete:
+                cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def on_post_migrate(sender, using='default', **kwargs):
+    install_sqlite_indexes(connections[using])
+
+
+def clean_term(term):
+    term = (term or '').strip()
+    if len(term) < MIN_TERM_LENGTH:
+        raise SearchError(f'Search needs at least {MIN_TERM_LENGTH} characters')
+    return term
+
+
+def fts_phrase(term):
+    # the term is matched as one quoted phrase, so FTS query syntax in it is inert
+    return '"' + term.replace('"', '""') + '"'
+
+
+def fts_ids(fts, term):
+    return RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', [fts_phrase(term)])
+
+
+def account_number_prefix(queryset, prefix, field='account_number'):
+    # a range on the unique index; LIKE 'x%' only uses it under some collations
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return queryset.filter(**{f'{field}__gte': prefix, f'{field}__lt': upper})
+
+
+def text_index(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def match_transactions(queryset, term):
+    """
+    Transactions (live or archived) whose description contains `term`, or
+    whose account number starts with it if numeric.
+    """
+    term = clean_term(term)
+    if term.isdigit():
+        accounts = account_number_prefix(Account.objects.all(), term).values('id')
+        return queryset.filter(account_id__in=accounts)
+    if connection.vendor == 'sqlite':
+        return queryset.filter(id__in=fts_ids(text_index(queryset.model), term))
+    # served by the pg_trgm index on UPPER(description)
+    return queryset.filter(description__icontains=term)
+
+
+def match_users(queryset, term):
+    term = clean_term(term)
+    if connection.vendor == 'sqlite':
+        return queryset.filter(id__in=fts_ids('bank_customuser_fts', term))
+    return queryset.filter(Q(username__icontains=term) | Q(email__icontains=term))
+
+
+def match_accounts(queryset, term):
+    """Accounts by account-number prefix, or by owner username/email substring."""
+    term = clean_term(term)
+    if term.isdigit():
+        return account_number_prefix(queryset, term)
+    return queryset.filter(user_id__in=match_users(CustomUser.objects.all(), term).values('id'))
+
+
+def search_transactions(term, queryset=None, limit=RESULT_LIMIT, model=Transaction):
+    """
+    The newest `limit` matches, over every row of `model` (Transaction or
+    TransactionArchive) or within `queryset` (a customer's own). A scoped
+    search is driven by the account index and checks the description of
+    those few rows directly, which beats probing the text index once per
+    row; a global one on SQLite takes the newest rowids straight from the
+    FTS index instead of materialising every match.
+    """
+    term = clean_term(term)
+    if term.isdigit():
+        queryset = model.objects.all() if queryset is None else queryset
+        return match_transactions(queryset, term).order_by('-id')[:limit]
+    if queryset is not None:
+        return queryset.filter(description__icontains=term).order_by('-id')[:limit]
+    if connection.vendor == 'sqlite':
+        fts = text_index(model)
+        newest = RawSQL(
+            f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s ORDER BY rowid DESC LIMIT %s', [fts_phrase(term), limit],
+        )
+        return model.objects.filter(id__in=newest).order_by('-id')
+    return match_transactions(model.objects.all(), term).order_by('-id')[:limit]
+
+
+def search_accounts(term, queryset=None, limit=RESULT_LIMIT):
+    queryset = Account.objects.all() if queryset is None else queryset
+    return match_accounts(queryset, term).order_by('account_number')[:limit]
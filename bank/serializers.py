@@ -1,7 +1,15 @@
 # serializers.py
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from .models import CustomUser, Account, Transaction, Loan, LoanInterest
+from datetime import timedelta
+from decimal import Decimal
+from django.utils import timezone
+from .models import CustomUser, Account, Transaction, Loan, LoanInterest, ScheduledTransfer, FxRate, OffboardingJob, AuthorizationHold
+from .fx import is_supported
+from .decisions import MAX_BATCH, TRANSITIONS
+from .sharding import shard_for_account_number
+
+CENT = Decimal('0.01')
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -42,16 +50,22 @@ class AccountSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Account
-        fields = ['id', 'user', 'account_number', 'account_type', 'balance', 'currency', 'is_active', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'account_number', 'created_at', 'updated_at', 'is_active']
+        fields = ['id', 'user', 'account_number', 'account_type', 'balance', 'held_balance', 'currency', 'is_active', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'account_number', 'held_balance', 'created_at', 'updated_at', 'is_active']
+
+    def validate_currency(self, value):
+        value = value.upper()
+        if not is_supported(value):
+            raise serializers.ValidationError(f"Unsupported currency {value}")
+        return value
 
 class TransactionSerializer(serializers.ModelSerializer):
     recipient_account_number = serializers.CharField(source='recipient_account.account_number', read_only=True)
     
     class Meta:
         model = Transaction
-        fields = ['id', 'account', 'transaction_type', 'amount', 'balance_after', 'description', 'recipient_account', 'recipient_account_number', 'status', 'created_at']
-        read_only_fields = ['id', 'balance_after', 'status', 'created_at']
+        fields = ['id', 'account', 'transaction_type', 'amount', 'balance_after', 'description', 'recipient_account', 'recipient_account_number', 'recipient_amount', 'exchange_rate', 'status', 'created_at']
+        read_only_fields = ['id', 'balance_after', 'recipient_amount', 'exchange_rate', 'status', 'created_at']
 
 class LoanSerializer(serializers.ModelSerializer):
     borrower_name = serializers.CharField(source='borrower.user.username', read_only=True)
@@ -64,10 +78,10 @@ class LoanSerializer(serializers.ModelSerializer):
         fields = [
             'loan_id', 'borrower', 'borrower_name', 'loan_amount', 'interest_rate', 
             'loan_term_months', 'monthly_payment', 'status', 'is_accepted', 
-            'applied_date', 'accepted_date', 'next_payment_date', 'last_payment_date',
+            'applied_date', 'accepted_date', 'next_payment_date', 'last_payment_date', 'version',
         'purpose', 'total_payable', 'remaining_amount', 'total_paid'
         ]
-        read_only_fields = ['loan_id', 'monthly_payment', 'status', 'is_accepted', 'applied_date', 'accepted_date', 'borrower']
+        read_only_fields = ['loan_id', 'monthly_payment', 'status', 'is_accepted', 'applied_date', 'accepted_date', 'borrower', 'version']
     
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -80,4 +94,175 @@ class LoanInterestSerializer(serializers.ModelSerializer):
     class Meta:
         model = LoanInterest
         fields = ['id', 'loan', 'amount', 'payment_date', 'payment_method', 'notes', 'transaction_id']
-        read_only_fields = ['id', 'loan', 'payment_date', 'payment_method']
\ No newline at end of file
+        read_only_fields = ['id', 'loan', 'payment_date', 'payment_method']
+
+class ScheduledTransferSerializer(serializers.ModelSerializer):
+    recipient_account_number = serializers.CharField(write_only=True)
+
+    class Meta:
+        model = ScheduledTransfer
+        fields = [
+            'id', 'account', 'recipient_account_number', 'amount', 'description', 'frequency',
+            'start_at', 'end_date', 'next_run_at', 'status', 'run_count', 'failure_count',
+            'last_run_at', 'last_error', 'created_at'
+        ]
+        read_only_fields = ['id', 'account', 'next_run_at', 'status', 'run_count', 'failure_count', 'last_run_at', 'last_error', 'created_at']
+
+    def validate_start_at(self, value):
+        if value < timezone.now() - timedelta(minutes=5):
+            raise serializers.ValidationError("Start time must not be in the past")
+        return value
+
+    def validate(self, data):
+        try:
+            number = data.pop('recipient_account_number')
+            data['recipient_account'] = Account.objects.using(shard_for_account_number(number)).get(account_number=number, is_active=True)
+        except Account.DoesNotExist:
+            raise serializers.ValidationError("Recipient account not found")
+        if data.get('end_date') and data['end_date'] < data['start_at'].date():
+            raise serializers.ValidationError("End date is before the start")
+        return data
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        representation['recipient_account_number'] = instance.recipient_account.account_number
+        return representation
+
+class FxRateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FxRate
+        fields = ['currency', 'rate', 'as_of', 'updated_at']
+
+class OffboardingJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OffboardingJob
+        fields = ['id', 'user_id', 'username', 'account_ids', 'status', 'stage', 'rows_archived', 'rows_deleted', 'error', 'created_at', 'updated_at', 'finished_at']
+
+class AuthorizationHoldSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuthorizationHold
+        fields = ['id', 'account', 'kind', 'amount', 'recipient_account', 'description', 'status', 'error', 'transaction_id', 'expires_at', 'created_at', 'settled_at']
+
+class RevaluationRowSerializer(serializers.Serializer):
+    currency = serializers.CharField()
+    accounts = serializers.IntegerField()
+    balance = serializers.DecimalField(max_digits=18, decimal_places=2)
+    rate = serializers.DecimalField(max_digits=18, decimal_places=8, allow_null=True)
+    converted = serializers.DecimalField(max_digits=18, decimal_places=2, allow_null=True)
+
+class LoanVersionSerializer(serializers.Serializer):
+    loan_id = serializers.IntegerField()
+    version = serializers.IntegerField(min_value=0, required=False)
+
+class LoanDecisionSerializer(serializers.Serializer):
+    """Either `loan_ids`, or `loans` with the version each was read at to reject stale decisions."""
+    action = serializers.ChoiceField(choices=list(TRANSITIONS))
+    loan_ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=MAX_BATCH)
+    loans = LoanVersionSerializer(many=True, required=False, max_length=MAX_BATCH)
+
+    def validate(self, data):
+        if ('loan_ids' in data) == ('loans' in data):
+            raise serializers.ValidationError("Send either 'loan_ids' or 'loans'")
+        if 'loan_ids' in data:
+            data['loans'] = [(loan_id, None) for loan_id in data.pop('loan_ids')]
+        else:
+            data['loans'] = [(item['loan_id'], item.get('version')) for item in data['loans']]
+        if not data['loans']:
+            raise serializers.ValidationError('No loans given')
+        return data
+
+class RevaluationSerializer(serializers.Serializer):
+    currency = serializers.CharField()
+    rows = RevaluationRowSerializer(many=True)
+    total = serializers.DecimalField(max_digits=18, decimal_places=2)
+    missing_rates = serializers.ListField(child=serializers.CharField())
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path for large listings: builds plain dicts from
+    queryset.values() rows, with the same keys and value formats as the
+    matching ModelSerializer but no model instances or field objects (a
+    lookup through a null relation gives None where DRF drops the key).
+    `fields` is a sequence of (output key, lookup); a lookup can be
+    (ValuesSerializer subclass, relation) for a nested object.
+    """
+    fields = ()
+    decimal_fields = ()
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    @classmethod
+    def lookups(cls, prefix=''):
+        names = []
+        for _, lookup in cls.fields:
+            if isinstance(lookup, tuple):
+                nested, relation = lookup
+                names += nested.lookups(f'{prefix}{relation}__')
+            else:
+                names.append(prefix + lookup)
+        return names
+
+    @classmethod
+    def build(cls, row, prefix=''):
+        item = {}
+        for key, lookup in cls.fields:
+            if isinstance(lookup, tuple):
+                nested, relation = lookup
+                item[key] = nested.build(row, f'{prefix}{relation}__')
+                continue
+            value = row[prefix + lookup]
+            if value is not None and key in cls.decimal_fields:
+                # DecimalField output: fixed-point string
+                value = format(value, 'f')
+            item[key] = value
+        return item
+
+    @property
+    def data(self):
+        build = self.build
+        return [build(row) for row in self.queryset.values(*self.lookups())]
+
+class UserValuesSerializer(ValuesSerializer):
+    fields = [(name, name) for name in UserSerializer.Meta.fields]
+
+class AccountValuesSerializer(ValuesSerializer):
+    fields = [
+        ('id', 'id'), ('user', (UserValuesSerializer, 'user')), ('account_number', 'account_number'),
+        ('account_type', 'account_type'), ('balance', 'balance'), ('held_balance', 'held_balance'),
+        ('currency', 'currency'), ('is_active', 'is_active'), ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    ]
+    decimal_fields = ('balance', 'held_balance')
+
+class TransactionValuesSerializer(ValuesSerializer):
+    fields = [
+        ('id', 'id'), ('account', 'account_id'), ('transaction_type', 'transaction_type'), ('amount', 'amount'),
+        ('balance_after', 'balance_after'), ('description', 'description'), ('recipient_account', 'recipient_account_id'),
+        ('recipient_account_number', 'recipient_account__account_number'), ('recipient_amount', 'recipient_amount'),
+        ('exchange_rate', 'exchange_rate'), ('status', 'status'), ('created_at', 'created_at'),
+    ]
+    decimal_fields = ('amount', 'balance_after', 'recipient_amount', 'exchange_rate')
+
+class LoanValuesSerializer(ValuesSerializer):
+    """Expects Loan.objects.with_payment_totals(); fills the computed totals like LoanSerializer does."""
+    fields = [
+        ('loan_id', 'loan_id'), ('borrower', 'borrower_id'), ('borrower_name', 'borrower__user__username'),
+        ('loan_amount', 'loan_amount'), ('interest_rate', 'interest_rate'), ('loan_term_months', 'loan_term_months'),
+        ('monthly_payment', 'monthly_payment'), ('status', 'status'), ('is_accepted', 'is_accepted'),
+        ('applied_date', 'applied_date'), ('accepted_date', 'accepted_date'), ('next_payment_date', 'next_payment_date'),
+        ('last_payment_date', 'last_payment_date'), ('version', 'version'), ('purpose', 'purpose'),
+        ('total_paid', 'paid_total'),
+    ]
+    decimal_fields = ('loan_amount', 'interest_rate', 'monthly_payment')
+
+    @classmethod
+    def build(cls, row, prefix=''):
+        item = super().build(row, prefix)
+        paid = Decimal(item.pop('total_paid')).quantize(CENT)
+        payable = row[prefix + 'monthly_payment'] * row[prefix + 'loan_term_months']
+        # same values (and key order) as Loan.total_payable()/remaining_amount()/total_paid()
+        item['total_payable'] = payable
+        item['remaining_amount'] = max((payable - paid).quantize(CENT), Decimal('0.00'))
+        item['total_paid'] = paid
+        return item
@@ -0,0 +1,148 @@
+# sharding.py
+import contextvars
+import zlib
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+# Models stored on the account's shard; everything else lives on 'default'.
+# Users are copied to the shards holding their accounts (see replicate_user)
+# so Account.user keeps its foreign key and joins to it stay local. The
+# accrual and audit runs keep one checkpoint per shard, next to the rows
+# they cover, so each commits with its chunk.
+SHARDED_MODELS = {
+    'account', 'transaction', 'transactionarchive', 'crossshardcredit', 'authorizationhold',
+    'loan', 'loaninterest', 'scheduledtransfer', 'scheduledtransferrun',
+    'interestaccrual', 'accrualrun', 'auditrun', 'auditdiscrepancy',
+}
+# the attribute holding an unsaved row's account id, when it is not account_id;
+# loan ids follow their borrower's residue class (see Loan.save)
+SHARD_KEYS = {'account': 'pk', 'loan': 'borrower_id', 'loaninterest': 'loan_id'}
+
+_shard = contextvars.ContextVar('bank_shard', default=None)
+
+
+def shards():
+    return settings.ACCOUNT_SHARDS
+
+
+def sharding_enabled():
+    return len(settings.ACCOUNT_SHARDS) > 1
+
+
+
+def shard_for_account(account_id):
+    """Account ids are allocated so that id modulo the shard count is the shard's index."""
+    aliases = shards()
+    return aliases[int(account_id) % len(aliases)]
+
+
+def shard_for_loan(loan_id):
+    """Loan ids are allocated in their borrower's residue class, so they map like account ids."""
+    return shard_for_account(loan_id)
+
+
+def shard_key(instance):
+    """The account id deciding an unsaved row's shard, None if it has none."""
+    return getattr(instance, SHARD_KEYS.get(instance._meta.model_name, 'account_id'), None)
+
+
+def shard_for_account_number(account_number):
+    aliases = shards()
+    return aliases[zlib.crc32(account_number.encode()) % len(aliases)]
+
+
+def current_shard():
+    """The shard set by on_shard(), None outside one."""
+    return _shard.get()
+
+
+def shard_db():
+    """Alias to open transactions and on_commit hooks on for the current shard."""
+    return _shard.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def on_shard(alias):
+    """Route sharded models without a more specific hint to `alias` inside the block."""
+    token = _shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _shard.reset(token)
+
+
+def atomic_on_shard(func):
+    """transaction.atomic on the current shard, resolved per call (views run inside ShardedAccountMixin)."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with transaction.atomic(using=shard_db()):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class ShardedAccountMixin:
+    """
+    For views scoped to one account (or loan): everything the request does
+    runs on that account's shard. Routes without the kwarg are left alone.
+    """
+    shard_kwarg = 'account_id'
+
+    def dispatch(self, request, *args, **kwargs):
+        if kwargs.get(self.shard_kwarg) is None:
+            return super().dispatch(request, *args, **kwargs)
+        with on_shard(shard_for_account(kwargs[self.shard_kwarg])):
+            return super().dispatch(request, *args, **kwargs)
+
+
+def per_shard(queryset):
+    """The queryset once per shard, for reads that span all accounts of a user."""
+    if not sharding_enabled():
+        return [queryset]
+    return [queryset.using(alias) for alias in shards()]
+
+
+def next_id(alias, table, column='id'):
+    """
+    Next free id on `alias` in that shard's residue class. Two concurrent
+    creations can pick the same id; the loser's INSERT fails on the primary
+    key and save_with_shard_id retries.
+    """
+    aliases = shards()
+    index, count = aliases.index(alias), len(aliases)
+    with connections[alias].cursor() as cursor:
+        cursor.execute(f'SELECT MAX({column}) FROM {table}')
+        highest = cursor.fetchone()[0] or 0
+    candidate = highest + 1
+    return candidate + (index - candidate) % count
+
+
+# fields a login touches; not worth a write to every shard
+UNREPLICATED_FIELDS = {'last_login'}
+
+
+def replicate_user(user, alias):
+    """Insert or refresh `user`'s row on `alias`."""
+    model = type(user)
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    copy = model(pk=user.pk, **{field.attname: getattr(user, field.attname) for field in fields})
+    model.objects.using(alias).bulk_create(
+        [copy], update_conflicts=True, unique_fields=['id'], update_fields=[field.name for field in fields],
+    )
+
+
+def on_user_saved(sender, instance, using=DEFAULT_DB_ALIAS, update_fields=None, **kwargs):
+    if using != DEFAULT_DB_ALIAS or not sharding_enabled():
+        return
+    if update_fields and set(update_fields) <= UNREPLICATED_FIELDS:
+        return
+    values = {
+        field.attname: getattr(instance, field.attname)
+        for field in sender._meta.concrete_fields if not field.primary_key
+    }
+    # only shards that already hold a copy, i.e. one of the user's accounts
+    for alias in shards():
+        if alias != DEFAULT_DB_ALIAS:
+            sender.objects.using(alias).filter(pk=instance.pk).update(**values)
@@ -0,0 +1,43 @@
+# statements.py
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+
+
+def storage_dir():
+    path = Path(settings.STATEMENT_STORAGE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def statement_filename(job):
+    return f"statement_{job.user_id}_{job.task_id}.pdf"
+
+
+def statement_path(job):
+    return storage_dir() / os.path.basename(job.file_path)
+
+
+def statement_response(job, download_name="transactions.pdf"):
+    """
+    Serve a rendered statement. With STATEMENT_SENDFILE_HEADER set the web
+    server (nginx X-Accel-Redirect / Apache X-Sendfile) sends the file and
+    the worker is released immediately; otherwise it is streamed from disk.
+    """
+    header = settings.STATEMENT_SENDFILE_HEADER
+    if header in ('X-Accel-Redirect', 'X-Sendfile'):
+        response = HttpResponse(content_type='application/pdf')
+        if header == 'X-Accel-Redirect':
+            response[header] = settings.STATEMENT_ACCEL_PREFIX + os.path.basename(job.file_path)
+        else:
+            response[header] = str(statement_path(job))
+        response['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    else:
+        response = FileResponse(
+            open(statement_path(job), 'rb'), as_attachment=True,
+            filename=download_name, content_type='application/pdf'
+        )
+    response['ETag'] = job.etag()
+    return response
@@ -1,14 +1,25 @@
 import time, os
+from itertools import chain
 from celery import shared_task
-from django.core.mail import EmailMessage
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
-from .models import CustomUser, Transaction, Account, Loan, LoanInterest
+from .models import CustomUser, Loan, LoanInterest, StatementJob, OffboardingJob
+from .statements import storage_dir, statement_filename
+from .events import publish
+from .scheduling import chunked, dispatch_due_transfers, execute_schedules
+from .repayments import dispatch_due_loans, collect_installments
+from .accrual import accrue_savings_interest as run_accrual
+from .archive import archive_transactions, transaction_sources
+from .offboarding import run_offboarding
+from .posting import PostingError, release_expired_holds, settle_holds, resolve_cross_shard_transfers as resolve_pending
+from .sharding import on_shard, per_shard, shard_for_account, shard_for_loan, shards
 from django.template.loader import render_to_string
 from django.db.models.functions import TruncDate
 from dateutil.relativedelta import relativedelta
 from django.utils import timezone
-from weasyprint import HTML
-from datetime import timedelta
+from django.utils.dateparse import parse_datetime
+from datetime import date, timedelta
+from decimal import Decimal
 
 def load_email_template(filename):
     path = os.path.join(settings.BASE_DIR, filename)
@@ -85,78 +96,100 @@ def send_transfer_email(amount, transaction_type, transfer, deposit, description
 
 
 @shared_task
-def generate_transaction_pdf(user_id):
-    user = CustomUser.objects.get(id=user_id)
-    one_mth = timezone.now() - relativedelta(month=1)
-    transactions = Transaction.objects.filter(account__user__username=user.username, created_at__gte=one_mth)
-    html_string = "<h2>Transactions</h2><table><tr><th>Date&nbsp&nbsp&nbsp&nbsp</th><th>Time&nbsp&nbsp&nbsp&nbsp</th><th>Type&nbsp&nbsp&nbsp&nbsp</th><th>Amount&nbsp&nbsp&nbsp&nbsp</th><th>Balance</th></tr>"
-    for tx in transactions:
-        html_string += f"""
-                        <tr>
-                            <td>{tx.created_at.date()}&nbsp&nbsp&nbsp&nbsp</td>
-                            <td>{tx.created_at.strftime("%H:%M")}&nbsp&nbsp&nbsp&nbsp</td>
-                            <td> {tx.transaction_type}&nbsp&nbsp&nbsp&nbsp</td>
-                            <td>{tx.amount}&nbsp&nbsp&nbsp&nbsp</td>
-                            <td>{tx.balance_after}</td>
-                        </tr>
-                        """
-        
-    html_string += "</table>"
-    pdf_file = HTML(string=html_string).write_pdf()
-    filename = f"statement_{user.id}.pdf"
-    with open(filename, "wb") as f:
-        f.write(pdf_file)
+def generate_transaction_pdf(job_id):
+    # weasyprint loads here, in the worker, not in every web process importing this module
+    from .rendering import statement_pdf
+
+    job = StatementJob.objects.get(id=job_id)
+    StatementJob.objects.filter(id=job_id).update(status="RUNNING", updated_at=timezone.now())
+    try:
+        one_mth = timezone.now() - relativedelta(months=1)
+        transactions = chain.from_iterable(
+            shard_queryset
+            for queryset in transaction_sources(one_mth)
+            for shard_queryset in per_shard(queryset.filter(account__user_id=job.user_id))
+        )
+        pdf_file = statement_pdf(transactions)
+        filename = statement_filename(job)
+        with open(storage_dir() / filename, "wb") as f:
+            f.write(pdf_file)
+    except Exception as e:
+        StatementJob.objects.filter(id=job_id).update(status="FAILED", error=str(e), updated_at=timezone.now())
+        publish(job.user_id, "statement", {"task_id": job.task_id, "status": "failed"})
+        raise
+
+    now = timezone.now()
+    StatementJob.objects.filter(id=job_id).update(
+        status="READY",
+        file_path=filename,
+        file_size=len(pdf_file),
+        completed_at=now,
+        expires_at=now + timedelta(hours=settings.STATEMENT_TTL_HOURS),
+        updated_at=now,
+    )
+    publish(job.user_id, "statement", {"task_id": job.task_id, "status": "ready"})
     return filename
 
 
 @shared_task
-def loan_accepted(loan, user):
-    user = CustomUser.objects.get(username=user)
-    loan = Loan.objects.get(borrower__user__username=user.username, loan_id=loan)
+def sweep_expired_statements(batch_size=500):
+    now = timezone.now()
+    removed = 0
+    while True:
+        jobs = list(
+            StatementJob.objects.filter(status="READY", expires_at__lte=now)
+            .values_list("id", "file_path")[:batch_size]
+        )
+        if not jobs:
+            break
+        for job_id, file_path in jobs:
+            try:
+                os.remove(storage_dir() / os.path.basename(file_path))
+            except FileNotFoundError:
+                pass
+        StatementJob.objects.filter(id__in=[job_id for job_id, _ in jobs]).update(
+            status="EXPIRED", file_path="", updated_at=now
+        )
+        removed += len(jobs)
+    return removed
+
+
+def loan_status_email(loan, email_address):
     if loan.is_accepted:
         subject = "Loan Accepted"
-        from_email = settings.EMAIL_HOST_USER
-        to = [user.email]
         content = f"Your Loan for the amount {loan.loan_amount} is accepted. Please pay your monthly intrest payment of {loan.monthly_payment} for {loan.loan_term_months} months."
-        email = EmailMessage(
-            subject, 
-            content,
-            from_email,
-            to
-        )
-        email.content_subtype = "Plain"
-        email.send()
-    
     elif loan.status == "PENDING":
         subject = "Recieved Loan Interest"
-        from_email = settings.EMAIL_HOST_USER
-        to = [user.email]
         content = f"Your Loan for the amount {loan.loan_amount} is being processed. Please wait for approval of the loan."
-        email = EmailMessage(
-            subject, 
-            content,
-            from_email,
-            to
-        )
-        email.content_subtype = "Plain"
-        email.send()
     else:
         subject = "Loan Rejected"
-        from_email = settings.EMAIL_HOST_USER
-        to = [user.email]
         content = f"Your Loan for the amount {loan.loan_amount} is rejected. Please apply afterwrds for another if known."
-        email = EmailMessage(
-            subject, 
-            content,
-            from_email,
-            to
-        )
-        email.content_subtype = "Plain"
-        email.send()
+    email = EmailMessage(subject, content, settings.EMAIL_HOST_USER, [email_address])
+    email.content_subtype = "Plain"
+    return email
+
+@shared_task
+def loan_accepted(loan, user):
+    user = CustomUser.objects.get(username=user)
+    with on_shard(shard_for_loan(loan)):
+        loan = Loan.objects.get(borrower__user__username=user.username, loan_id=loan)
+    loan_status_email(loan, user.email).send()
+
+@shared_task
+def notify_loan_decisions(loan_ids, batch_size=500):
+    # one task per admin decision batch; mails go out over a single SMTP connection
+    sent = 0
+    with get_connection() as connection:
+        for chunk in chunked(loan_ids, batch_size):
+            loans = per_shard(Loan.objects.filter(loan_id__in=chunk).select_related('borrower__user'))
+            sent += connection.send_messages(
+                [loan_status_email(loan, loan.borrower.user.email) for queryset in loans for loan in queryset]
+            ) or 0
+    return sent
 
 @shared_task
 def loan_payment_due():
-    loans = Loan.objects.filter(status="ACCEPTED")
+    loans = chain.from_iterable(per_shard(Loan.objects.filter(status="ACCEPTED")))
     payment_due = timezone.now().date() + timedelta(days=28)
     for loan in loans:
         if (loan.next_payment_date - payment_due).days <= 2 :
@@ -182,7 +215,7 @@ def loan_payment_due():
 @shared_task
 def loan_paid():
     today = timezone.now().date()
-    loans = Loan.objects.filter(last_payment_date=today, status="PAID")
+    loans = chain.from_iterable(per_shard(Loan.objects.filter(last_payment_date=today, status="PAID")))
     from_email = settings.EMAIL_HOST_USER
     subject = "Loan Successfully Paid"
     for loan in loans:
@@ -202,9 +235,10 @@ def loan_paid():
 
 @shared_task
 def loan_payment_interest(loan, int_id):
-    loan = Loan.objects.get(loan_id=loan)
-    loanint = LoanInterest.objects.get(id=int_id)
-    remaining = loan.remaining_amount()
+    with on_shard(shard_for_loan(loan)):
+        loan = Loan.objects.get(loan_id=loan)
+        loanint = LoanInterest.objects.get(id=int_id)
+        remaining = loan.remaining_amount()
     content = load_email_template("loan_interest.html").format(
         uname=loan.borrower.user.username,
         loanid = loan.loan_id,
@@ -224,4 +258,113 @@ def loan_payment_interest(loan, int_id):
     )
     email.content_subtype= "html"
     email.send()
-    
\ No newline at end of file
+
+@shared_task
+def run_scheduled_transfers():
+    return dispatch_due_transfers(
+        lambda ids, now, alias: execute_scheduled_transfers.delay(ids, now.isoformat(), alias)
+    )
+
+@shared_task
+def execute_scheduled_transfers(schedule_ids, now, alias='default'):
+    return execute_schedules(schedule_ids, parse_datetime(now), alias)
+
+@shared_task
+def accrue_savings_interest(accrual_date=None):
+    # defaults to yesterday: the job runs after midnight for the day just closed
+    day = date.fromisoformat(accrual_date) if accrual_date else timezone.localdate() - timedelta(days=1)
+    runs = run_accrual(day, chunk_size=settings.ACCRUAL_CHUNK_SIZE)
+    return {
+        'accrual_date': str(day),
+        'accounts': sum(run.accounts_processed for run in runs),
+        'credited': sum(run.accounts_credited for run in runs),
+        'interest': str(sum((run.total_interest for run in runs), Decimal('0.00'))),
+        'seconds': max(run.seconds_elapsed for run in runs),
+    }
+
+@shared_task
+def run_loan_collection():
+    return dispatch_due_loans(
+        lambda ids, today, alias: collect_loan_installments.delay(ids, today.isoformat(), alias)
+    )
+
+@shared_task
+def collect_loan_installments(loan_ids, today, alias='default'):
+    result = collect_installments(loan_ids, date.fromisoformat(today), alias)
+    # receipts go out once the chunk has committed
+    for loan_id, payment_id in result.pop('payments'):
+        loan_payment_interest.delay(loan_id, payment_id)
+    return result
+
+@shared_task
+def archive_old_transactions():
+    moved, seconds = archive_transactions(time_limit=settings.TRANSACTION_ARCHIVE_TIME_LIMIT)
+    return {'archived': moved, 'seconds': round(seconds, 2)}
+
+@shared_task
+def offboard_user(job_id):
+    job = OffboardingJob.objects.get(id=job_id)
+    try:
+        job = run_offboarding(job)
+    except Exception as e:
+        OffboardingJob.objects.filter(id=job_id).update(status="FAILED", error=str(e), updated_at=timezone.now())
+        raise
+    return {'archived': job.rows_archived, 'deleted': job.rows_deleted}
+
+@shared_task
+def resolve_cross_shard_transfers():
+    older_than = timezone.now() - timedelta(seconds=settings.CROSS_SHARD_RESOLVE_AFTER_SECONDS)
+    return resolve_pending(older_than)
+
+def notify_settled(results):
+    """Tell the owners how their holds ended; the mails match what the API sends when it settles inline."""
+    for hold, result in results:
+        trans = None if isinstance(result, PostingError) else result
+        publish(hold.account.user_id, "hold", {
+            "hold_id": hold.id,
+            "status": hold.status,
+            "transaction_id": trans.id if trans else None,
+            "error": result.message if trans is None else "",
+        })
+        if trans is None:
+            continue
+        username = hold.account.user.username
+        if trans.transaction_type == 'WITHDRAWAL':
+            send_transaction_email.delay(username, trans.amount, trans.transaction_type, trans.description)
+        elif trans.status == 'COMPLETED':
+            send_transfer_email.delay(
+                trans.amount, trans.transaction_type, username, trans.recipient_account.user.username, trans.description
+            )
+
+@shared_task
+def settle_account_holds(account_id):
+    alias = shard_for_account(account_id)
+    settled = 0
+    while True:
+        results = settle_holds(alias, limit=settings.HOLD_SETTLEMENT_BATCH, account_id=account_id)
+        with on_shard(alias):
+            notify_settled(results)
+        settled += len(results)
+        if len(results) < settings.HOLD_SETTLEMENT_BATCH:
+            return settled
+
+@shared_task
+def sweep_authorization_holds():
+    """
+    Settle any holds an async settlement task missed, then release the
+    expired ones left: a hold the API answered 202 for is posted however
+    long the queue was, only holds nothing will settle (inline requests
+    that died after reserving) run out.
+    """
+    settled = 0
+    if settings.SETTLE_HOLDS_ASYNC:
+        for alias in shards():
+            while True:
+                results = settle_holds(alias, limit=settings.HOLD_SETTLEMENT_BATCH)
+                with on_shard(alias):
+                    notify_settled(results)
+                settled += len(results)
+                if len(results) < settings.HOLD_SETTLEMENT_BATCH:
+                    break
+    released = release_expired_holds()
+    return {'released': released, 'settled': settled}
@@ -1,3 +1,1496 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import os
+import tempfile
+import time
+import types
+import zlib
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from celery import Celery
+from celery.contrib.testing.worker import start_worker
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connections, transaction
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from .accrual import accrue_chunk, accrue_savings_interest
+from .archive import ARCHIVED_UNTIL_KEY, archive_transactions, transaction_sources
+from .events import get_broker, publish, user_channel
+from .exports import EXPORT_COLUMNS
+from .management.commands import startup_benchmark
+from .fx import FxError, bump_version, convert, load_rates
+from .metrics import WORKERS_KEY, QueryCollector, registry
+from .models import (
+    AccrualRun, Account, AuthorizationHold, CrossShardCredit, CustomUser, FxRate, InterestAccrual, Loan,
+    LoanInterest, OffboardingJob, ScheduledTransfer, StatementJob, Transaction, TransactionArchive,
+)
+from .offboarding import run_offboarding, start_offboarding
+from .posting import (
+    PostingError, apply_cross_shard_credit, prepare_cross_shard_transfer, release_expired_holds, reserve_funds,
+    resolve_cross_shard_transfers, settle_holds,
+)
+from .reconciliation import current_run, reconcile_balances
+from .routers import PrimaryReplicaRouter, begin_request, end_request, in_request_context
+from .renderers import ORJSONRenderer
+from .repayments import collect_installments, dispatch_due_loans
+from .scheduling import dispatch_due_transfers, execute_schedules
+from .search import search_transactions
+from .serializers import (
+    AccountSerializer, AccountValuesSerializer, LoanSerializer, LoanValuesSerializer, TransactionSerializer,
+    TransactionValuesSerializer,
+)
+from .tasks import generate_transaction_pdf, settle_account_holds, sweep_expired_statements
+from .throttling import LocalBuckets, get_buckets, parse_rate
+from .velocity import SlidingWindow, VelocityExceeded, check_velocity, get_store
+
+
+@override_settings(CELERY_BROKER_URL='memory://', CELERY_RESULT_BACKEND='cache+memory://')
+class TaskLaneTests(TransactionTestCase):
+    """Routing and lane metrics, end to end through an in-memory broker and a worker thread."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.app = Celery('lanes-test', set_as_current=False)
+        cls.app.config_from_object('django.conf:settings', namespace='CELERY')
+        cls.app.loader.import_module('bank.tasks')
+
+    def test_tasks_are_routed_to_their_lane(self):
+        router = self.app.amqp.router
+        for lane, tasks in settings.TASK_LANE_ROUTES.items():
+            for name in tasks:
+                self.assertEqual(router.route({}, name)['queue'].name, lane, name)
+        self.assertEqual(router.route({}, 'bank.tasks.accrue_savings_interest')['queue'].name, 'batch')
+
+    def test_lane_time_limits(self):
+        pdf = self.app.tasks['bank.tasks.generate_transaction_pdf']
+        self.assertEqual(pdf.time_limit, settings.TASK_LANES['pdf']['time_limit'])
+        self.assertEqual(pdf.soft_time_limit, settings.TASK_LANES['pdf']['soft_time_limit'])
+
+    def test_worker_records_latency_per_lane(self):
+        CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        CustomUser.objects.create_user(username='bob', email='bob@example.com', password='x')
+        registry.reset()
+        with start_worker(self.app, pool='solo', queues=list(settings.TASK_LANES), perform_ping_check=False):
+            result = self.app.tasks['bank.tasks.send_transfer_email'].delay('10.00', 'TRANSFER', 'alice', 'bob', 'rent')
+            result.get(timeout=10)
+        self.assertEqual(len(mail.outbox), 2)
+        samples = registry.collect()
+        self.assertEqual(samples[(
+            'bank_celery_task_latency_seconds_count',
+            (('lane', 'realtime'), ('task', 'bank.tasks.send_transfer_email')),
+        )], 1)
+
+
+def number_on_shard(index, count=2):
+    """An account number whose hash lands on shard `index`."""
+    number = 100000000000
+    while zlib.crc32(str(number).encode()) % count != index:
+        number += 1
+    return str(number)
+
+
+@override_settings(ACCOUNT_SHARDS=['default', 'shard1'])
+@mock.patch('bank.views.send_transfer_email.delay')
+class ShardingTests(TransactionTestCase):
+    """Accounts spread over two SQLite databases, with transfers between them."""
+    databases = {'default', 'shard1'}
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.bob = CustomUser.objects.create_user(username='bob', email='bob@example.com', password='x')
+        self.source = Account.objects.create(
+            user=self.alice, account_number=number_on_shard(0), account_type='SAVINGS', balance=Decimal('5000.00'),
+        )
+        self.recipient = Account.objects.create(
+            user=self.bob, account_number=number_on_shard(1), account_type='SAVINGS', balance=Decimal('1000.00'),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def balance(self, account):
+        return Account.objects.using(account._state.db).get(id=account.id).balance
+
+    def test_accounts_are_placed_by_number_and_found_by_id(self, send_email):
+        self.assertEqual((self.source._state.db, self.source.id % 2), ('default', 0))
+        self.assertEqual((self.recipient._state.db, self.recipient.id % 2), ('shard1', 1))
+        self.assertFalse(Account.objects.using('default').filter(id=self.recipient.id).exists())
+        # the owner is copied along so Account.user stays a local foreign key
+        self.assertTrue(CustomUser.objects.using('shard1').filter(id=self.bob.id).exists())
+
+        self.client.force_authenticate(self.bob)
+        response = self.client.get(f'/api/accounts/{self.recipient.id}/balance/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data['balance']), Decimal('1000.00'))
+        response = self.client.get('/api/accounts/')
+        self.assertEqual([row['account_number'] for row in response.data], [self.recipient.account_number])
+        self.assertEqual(response.data[0]['user']['username'], 'bob')
+
+    def test_cross_shard_transfer(self, send_email):
+        response = self.client.post(f'/api/accounts/{self.source.id}/transfer/', {
+            'amount': '250.00', 'recipient_account_number': self.recipient.account_number, 'description': 'rent',
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['recipient_account_number'], self.recipient.account_number)
+        self.assertEqual(self.balance(self.source), Decimal('4750.00'))
+        self.assertEqual(self.balance(self.recipient), Decimal('1250.00'))
+        self.assertEqual(Transaction.objects.using('default').get(account_id=self.source.id).status, 'COMPLETED')
+        incoming = Transaction.objects.using('shard1').get(account_id=self.recipient.id)
+        self.assertEqual((incoming.transaction_type, incoming.balance_after), ('TRANSFER_IN', Decimal('1250.00')))
+        self.assertEqual(CrossShardCredit.objects.using('shard1').get().status, 'APPLIED')
+        send_email.assert_called_once()
+
+    def test_interrupted_transfer_is_finished_once(self, send_email):
+        trans = prepare_cross_shard_transfer(self.source.id, self.recipient, Decimal('100.00'), '')
+        apply_cross_shard_credit(trans)
+        # a crash before phase three; the sweeper re-runs phase two, which must not credit again
+        later = timezone.now() + timedelta(seconds=1)
+        self.assertEqual(resolve_cross_shard_transfers(later), {'completed': 1, 'reversed': 0})
+        self.assertEqual(resolve_cross_shard_transfers(later), {'completed': 0, 'reversed': 0})
+        self.assertEqual(self.balance(self.source), Decimal('4900.00'))
+        self.assertEqual(self.balance(self.recipient), Decimal('1100.00'))
+
+    def test_refused_credit_is_refunded(self, send_email):
+        trans = prepare_cross_shard_transfer(self.source.id, self.recipient, Decimal('100.00'), '')
+        Account.objects.using('shard1').filter(id=self.recipient.id).update(is_active=False)
+        later = timezone.now() + timedelta(seconds=1)
+        self.assertEqual(resolve_cross_shard_transfers(later), {'completed': 0, 'reversed': 1})
+        self.assertEqual(self.balance(self.source), Decimal('5000.00'))
+        self.assertEqual(self.balance(self.recipient), Decimal('1000.00'))
+        self.assertEqual(Transaction.objects.using('default').get(id=trans.id).status, 'REVERSED')
+
+    @mock.patch('bank.views.notify_loan_decisions.delay')
+    @mock.patch('bank.views.loan_accepted.delay')
+    def test_loans_live_and_are_collected_on_the_borrowers_shard(self, loan_accepted, notify, send_email):
+        self.client.force_authenticate(self.bob)
+        response = self.client.post(f'/api/accounts/{self.recipient.id}/loan/', {
+            'loan_amount': '10000.00', 'interest_rate': '5.00', 'loan_term_months': 120,
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        loan_id = response.data['loan_id']
+        self.assertEqual(loan_id % 2, 1)
+        self.assertTrue(Loan.objects.using('shard1').filter(loan_id=loan_id).exists())
+
+        admin = CustomUser.objects.create_user(username='admin', email='admin@example.com', password='x', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.put(f'/api/admin/loans/{loan_id}/', {'action': 'accept'})
+        self.assertEqual(response.status_code, 200, response.data)
+        notify.assert_called_once_with([loan_id])
+
+        today = timezone.localdate() + timedelta(days=30)
+        chunks = dispatch_due_loans(lambda ids, day, alias: collect_installments(ids, day, alias), today)
+        self.assertEqual(chunks, 1)
+        loan = Loan.objects.using('shard1').get(loan_id=loan_id)
+        self.assertEqual(loan.payments.get().amount, loan.monthly_payment)
+        self.assertEqual(self.balance(self.recipient), Decimal('1000.00') - loan.monthly_payment)
+
+        self.client.force_authenticate(self.bob)
+        response = self.client.get('/api/home/')
+        self.assertEqual([row['loan_id'] for row in response.data['loans']], [loan_id])
+        self.assertEqual(response.data['transactions'][0]['transaction_type'], 'LOAN_PAYMENT')
+
+    def test_scheduled_transfer_to_another_shard(self, send_email):
+        response = self.client.post(f'/api/accounts/{self.source.id}/scheduled-transfers/', {
+            'recipient_account_number': self.recipient.account_number, 'amount': '300.00',
+            'frequency': 'ONCE', 'start_at': timezone.now().isoformat(),
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        later = timezone.now() + timedelta(minutes=1)
+        enqueued = []
+        self.assertEqual(dispatch_due_transfers(lambda ids, now, alias: enqueued.append((ids, now, alias)), later), 1)
+        self.assertEqual(execute_schedules(*enqueued[0]), {'completed': 1, 'failed': 0})
+        self.assertEqual(self.balance(self.source), Decimal('4700.00'))
+        self.assertEqual(self.balance(self.recipient), Decimal('1300.00'))
+        self.assertEqual(Transaction.objects.using('default').get(account_id=self.source.id).status, 'COMPLETED')
+
+        response = self.client.get(f'/api/accounts/{self.source.id}/scheduled-transfers/')
+        self.assertEqual(response.data[0]['recipient_account_number'], self.recipient.account_number)
+        self.assertEqual(response.data[0]['status'], 'COMPLETED')
+
+    def test_accrual_and_audit_run_on_every_shard(self, send_email):
+        day = timezone.localdate()
+        runs = accrue_savings_interest(day)
+        self.assertEqual([(run._state.db, run.accounts_credited) for run in runs], [('default', 1), ('shard1', 1)])
+        # a second run for the date finds both shards done
+        self.assertEqual([run.accounts_processed for run in accrue_savings_interest(day)], [1, 1])
+        self.assertEqual(InterestAccrual.objects.using('shard1').get().account_id, self.recipient.id)
+
+        for alias in ('default', 'shard1'):
+            run = reconcile_balances(current_run(alias=alias))
+            self.assertEqual((run._state.db, run.accounts_checked, run.discrepancy_count), (alias, 1, 0))
+
+    @mock.patch('bank.offboarding.cache')
+    def test_offboarding_clears_every_shard(self, cache, send_email):
+        self.client.post(f'/api/accounts/{self.source.id}/transfer/', {
+            'amount': '250.00', 'recipient_account_number': self.recipient.account_number,
+        })
+        ScheduledTransfer.objects.create(
+            account=self.source, recipient_account=self.recipient, amount=Decimal('10.00'), start_at=timezone.now(),
+        )
+        job, queue = start_offboarding(self.bob)
+        self.assertTrue(queue)
+        self.assertEqual(job.account_ids, [self.recipient.id])
+        self.assertEqual(ScheduledTransfer.objects.using('default').get().status, 'CANCELLED')
+
+        job = run_offboarding(job)
+        self.assertEqual(job.status, 'COMPLETED')
+        self.assertFalse(Account.objects.using('shard1').filter(id=self.recipient.id).exists())
+        self.assertFalse(CustomUser.objects.using('shard1').filter(id=self.bob.id).exists())
+        self.assertFalse(CustomUser.objects.using('default').filter(id=self.bob.id).exists())
+        self.assertEqual(TransactionArchive.objects.using('shard1').get().transaction_type, 'TRANSFER_IN')
+        # alice's transfer to bob stays, without the link to the removed account
+        self.assertIsNone(Transaction.objects.using('default').get(account_id=self.source.id).recipient_account_id)
+
+
+@mock.patch('bank.views.send_transfer_email.delay')
+class AuthorizationHoldTests(TransactionTestCase):
+    """Funds reserved by a conditional UPDATE, posted by settlement, released when refused or expired."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.bob = CustomUser.objects.create_user(username='bob', email='bob@example.com', password='x')
+        self.source = Account.objects.create(
+            user=self.alice, account_number='100000000001', account_type='SAVINGS', balance=Decimal('5000.00'),
+        )
+        self.recipient = Account.objects.create(
+            user=self.bob, account_number='100000000002', account_type='SAVINGS', balance=Decimal('1000.00'),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def balances(self, account):
+        account.refresh_from_db()
+        return account.balance, account.held_balance
+
+    def transfer(self, amount):
+        return self.client.post(f'/api/accounts/{self.source.id}/transfer/', {
+            'amount': amount, 'recipient_account_number': self.recipient.account_number,
+        })
+
+    def test_reserve_then_settle(self, send_email):
+        hold = reserve_funds(self.source.id, 'TRANSFER', '300.00', self.recipient.id)
+        self.assertEqual(self.balances(self.source), (Decimal('5000.00'), Decimal('300.00')))
+
+        [(settled, trans)] = settle_holds('default')
+        self.assertEqual((settled.id, settled.status, trans.status), (hold.id, 'SETTLED', 'COMPLETED'))
+        self.assertEqual(self.balances(self.source), (Decimal('4700.00'), Decimal('0.00')))
+        self.assertEqual(self.balances(self.recipient)[0], Decimal('1300.00'))
+        hold.refresh_from_db()
+        self.assertEqual((hold.status, hold.transaction_id), ('SETTLED', trans.id))
+        self.assertEqual(settle_holds('default'), [])
+
+    def test_held_funds_are_not_available(self, send_email):
+        reserve_funds(self.source.id, 'WITHDRAWAL', '4000.00')
+        with self.assertRaisesMessage(PostingError, 'Insufficient funds'):
+            reserve_funds(self.source.id, 'TRANSFER', '1500.00', self.recipient.id)
+        response = self.transfer('1500.00')
+        self.assertEqual((response.status_code, response.data), (400, {'error': 'Insufficient funds'}))
+        self.assertEqual(self.balances(self.source), (Decimal('5000.00'), Decimal('4000.00')))
+        self.assertEqual(AuthorizationHold.objects.count(), 1)
+
+    def test_inline_transfer(self, send_email):
+        response = self.transfer('250.00')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual((response.data['transaction_type'], response.data['status']), ('TRANSFER', 'COMPLETED'))
+        self.assertEqual(self.balances(self.source), (Decimal('4750.00'), Decimal('0.00')))
+        self.assertEqual(AuthorizationHold.objects.get().status, 'SETTLED')
+        send_email.assert_called_once()
+
+    def test_refused_settlement_releases_the_hold(self, send_email):
+        hold = reserve_funds(self.source.id, 'TRANSFER', '300.00', self.recipient.id)
+        Account.objects.filter(id=self.recipient.id).update(is_active=False)
+        [(released, error)] = settle_holds('default')
+        self.assertEqual(error.message, 'Recipient account not found')
+        hold.refresh_from_db()
+        self.assertEqual((hold.status, hold.error, hold.transaction_id), ('RELEASED', 'Recipient account not found', None))
+        self.assertEqual(self.balances(self.source), (Decimal('5000.00'), Decimal('0.00')))
+        self.assertFalse(Transaction.objects.exists())
+
+        response = self.transfer('100.00')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.balances(self.source), (Decimal('5000.00'), Decimal('0.00')))
+        send_email.assert_not_called()
+
+    def test_expired_holds_are_released(self, send_email):
+        hold = reserve_funds(self.source.id, 'WITHDRAWAL', '300.00')
+        self.assertEqual(release_expired_holds(), 0)
+        later = timezone.now() + timedelta(seconds=settings.HOLD_EXPIRY_SECONDS + 1)
+        self.assertEqual(release_expired_holds(later), 1)
+        hold.refresh_from_db()
+        self.assertEqual(hold.status, 'EXPIRED')
+        self.assertEqual(self.balances(self.source), (Decimal('5000.00'), Decimal('0.00')))
+        self.assertEqual(settle_holds('default'), [])
+
+    @override_settings(SETTLE_HOLDS_ASYNC=True, HOLD_SETTLEMENT_BATCH=2)
+    @mock.patch('bank.tasks.publish')
+    @mock.patch('bank.views.settle_account_holds.delay')
+    def test_async_settlement(self, settle_later, publish, send_email):
+        for _ in range(3):
+            response = self.transfer('100.00')
+            self.assertEqual(response.status_code, 202, response.data)
+        self.assertEqual((response.data['kind'], response.data['status']), ('TRANSFER', 'HELD'))
+        self.assertEqual(settle_later.call_count, 3)
+        send_email.assert_not_called()
+        self.assertEqual(self.balances(self.source), (Decimal('5000.00'), Decimal('300.00')))
+
+        # one task settles the account's whole queue, in batches
+        self.assertEqual(settle_account_holds(self.source.id), 3)
+        self.assertEqual(self.balances(self.source), (Decimal('4700.00'), Decimal('0.00')))
+        self.assertEqual(self.balances(self.recipient)[0], Decimal('1300.00'))
+        self.assertEqual(set(AuthorizationHold.objects.values_list('status', flat=True)), {'SETTLED'})
+        self.assertEqual(send_email.call_count, 3)
+        self.assertEqual(publish.call_args.args[1], 'hold')
+
+    @override_settings(SETTLE_HOLDS_ASYNC=True, VELOCITY_HOURLY_COUNT=2)
+    @mock.patch('bank.views.settle_account_holds.delay')
+    def test_queued_holds_count_toward_velocity(self, settle_later, send_email):
+        get_store().clear()
+        self.addCleanup(get_store().clear)
+        for _ in range(2):
+            self.assertEqual(self.transfer('100.00').status_code, 202)
+        # nothing has settled, the reservations alone use up the hourly count
+        response = self.transfer('100.00')
+        self.assertEqual(response.status_code, 403, response.data)
+        self.assertEqual(get_store().totals(self.source.id, time.time())['hour'], (2, Decimal('200.00')))
+
+        Account.objects.filter(id=self.recipient.id).update(is_active=False)
+        self.assertEqual(len(settle_holds('default')), 2)
+        self.assertEqual(get_store().totals(self.source.id, time.time())['hour'], (0, Decimal('0.00')))
+        self.assertEqual(self.transfer('100.00').status_code, 202)
+
+
+class ReconciliationTests(TransactionTestCase):
+    """The audit's chain and balance checks, over the hot table and the archive."""
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.sender = Account.objects.create(
+            user=user, account_number='100000000001', account_type='SAVINGS', balance=Decimal('700.00'),
+        )
+        self.receiver = Account.objects.create(
+            user=user, account_number='100000000002', account_type='SAVINGS', balance=Decimal('300.00'),
+        )
+
+    def post(self, account, kind, amount, balance_after, recipient=None):
+        return Transaction.objects.create(
+            account=account, transaction_type=kind, amount=Decimal(amount), balance_after=Decimal(balance_after),
+            recipient_account=recipient, status='COMPLETED',
+        )
+
+    def discrepancies(self):
+        run = reconcile_balances(current_run())
+        return run, list(run.discrepancies.values_list('kind', 'account_id', 'transaction_id', 'expected', 'actual'))
+
+    def test_consistent_ledger(self):
+        self.post(self.sender, 'DEPOSIT', '1000.00', '1000.00')
+        self.post(self.sender, 'TRANSFER', '300.00', '700.00', self.receiver)
+        run, found = self.discrepancies()
+        self.assertEqual(found, [])
+        self.assertEqual((run.accounts_checked, run.rows_checked), (2, 2))
+
+    def test_account_without_own_rows_is_checked(self):
+        self.post(self.sender, 'DEPOSIT', '1000.00', '1000.00')
+        self.post(self.sender, 'TRANSFER', '300.00', '700.00', self.receiver)
+        # the receiver's only movement is the sender's row; 50.00 appeared from nowhere
+        Account.objects.filter(id=self.receiver.id).update(balance=Decimal('350.00'))
+        _, found = self.discrepancies()
+        self.assertEqual(found, [('BALANCE', self.receiver.id, None, Decimal('300.00'), Decimal('350.00'))])
+
+    def test_chain_break(self):
+        self.post(self.sender, 'DEPOSIT', '1000.00', '1000.00')
+        broken = self.post(self.sender, 'WITHDRAWAL', '100.00', '850.00')
+        self.post(self.sender, 'WITHDRAWAL', '150.00', '700.00')
+        Account.objects.filter(id=self.receiver.id).update(balance=Decimal('0.00'))
+        _, found = self.discrepancies()
+        self.assertIn(('CHAIN', self.sender.id, broken.id, Decimal('900.00'), Decimal('850.00')), found)
+
+
+@mock.patch('bank.views.offboard_user.delay')
+class OffboardingTests(TransactionTestCase):
+    """DELETE on a user deactivates at once and queues the chunked removal, once."""
+
+    def setUp(self):
+        admin = CustomUser.objects.create_user(username='admin', email='admin@example.com', password='x', is_staff=True)
+        self.user = CustomUser.objects.create_user(username='carol', email='carol@example.com', password='x')
+        self.account = Account.objects.create(
+            user=self.user, account_number='100000000003', account_type='SAVINGS', balance=Decimal('100.00'),
+        )
+        Transaction.objects.create(
+            account=self.account, transaction_type='DEPOSIT', amount=Decimal('100.00'),
+            balance_after=Decimal('100.00'), status='COMPLETED',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def delete(self):
+        response = self.client.delete(f'/api/admin/users/{self.user.id}/')
+        self.assertEqual(response.status_code, 202, response.data)
+        return response.data['job']
+
+    @mock.patch('bank.offboarding.cache')
+    def test_offboarding_runs_once_and_can_be_rerun(self, cache, offboard_later):
+        job = self.delete()
+        self.assertFalse(Account.objects.get().is_active)
+        # a second request while the job is pending does not queue it again
+        self.assertEqual(self.delete()['id'], job['id'])
+        offboard_later.assert_called_once_with(job['id'])
+
+        job = run_offboarding(OffboardingJob.objects.get(id=job['id']))
+        self.assertEqual((job.status, job.rows_archived), ('COMPLETED', 1))
+        self.assertFalse(CustomUser.objects.filter(id=self.user.id).exists())
+        self.assertEqual(TransactionArchive.objects.get().account_id, self.account.id)
+        # running a finished job again finds nothing left
+        self.assertEqual(run_offboarding(job).rows_deleted, job.rows_deleted)
+
+    def test_stale_job_is_queued_again(self, offboard_later):
+        job = self.delete()
+        OffboardingJob.objects.filter(id=job['id']).update(status='RUNNING')
+        self.delete()
+        offboard_later.assert_called_once()
+
+        stale = timezone.now() - timedelta(seconds=settings.OFFBOARDING_STALE_SECONDS + 1)
+        OffboardingJob.objects.filter(id=job['id']).update(updated_at=stale)
+        self.assertEqual(self.delete()['id'], job['id'])
+        self.assertEqual(offboard_later.call_count, 2)
+        # the re-queue claimed it: another request right after does not queue a third run
+        self.delete()
+        self.assertEqual(offboard_later.call_count, 2)
+
+
+class ScheduledTransferTests(TransactionTestCase):
+    """Due schedules are claimed by the dispatcher, then posted in chunks by execute_schedules."""
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.source = Account.objects.create(
+            user=user, account_number='100000000001', account_type='SAVINGS', balance=Decimal('500.00'),
+        )
+        self.recipient = Account.objects.create(
+            user=user, account_number='100000000002', account_type='SAVINGS', balance=Decimal('0.00'),
+        )
+        self.now = timezone.now()
+        self.start = self.now - timedelta(minutes=1)
+
+    def schedule(self, amount):
+        return ScheduledTransfer.objects.create(
+            account=self.source, recipient_account=self.recipient, amount=Decimal(amount), start_at=self.start,
+        )
+
+    def dispatch(self, now):
+        queued = []
+        dispatch_due_transfers(lambda ids, at, alias: queued.append((ids, alias)), now)
+        return queued
+
+    def test_due_schedule_runs_once_and_moves_to_next_month(self):
+        schedule = self.schedule('200.00')
+        self.assertEqual(self.dispatch(self.now), [([schedule.id], 'default')])
+        # still claimed by the queued chunk: the next dispatch leaves it alone
+        self.assertEqual(self.dispatch(self.now + timedelta(minutes=1)), [])
+
+        self.assertEqual(execute_schedules([schedule.id], self.now), {'completed': 1, 'failed': 0})
+        # a duplicate delivery of the chunk finds nothing due
+        self.assertEqual(execute_schedules([schedule.id], self.now), {'completed': 0, 'failed': 0})
+        self.source.refresh_from_db()
+        self.assertEqual(self.source.balance, Decimal('300.00'))
+        schedule.refresh_from_db()
+        self.assertEqual((schedule.status, schedule.run_count, schedule.dispatched_at), ('ACTIVE', 1, None))
+        self.assertEqual(schedule.next_run_at, self.start + relativedelta(months=1))
+        self.assertEqual(schedule.runs.get().status, 'COMPLETED')
+
+    def test_failed_run_is_retried_later(self):
+        schedule = self.schedule('900.00')
+        self.assertEqual(execute_schedules([schedule.id], self.now), {'completed': 0, 'failed': 1})
+        schedule.refresh_from_db()
+        self.assertEqual((schedule.failure_count, schedule.last_error), (1, 'Insufficient funds'))
+        self.assertEqual(schedule.next_run_at, self.now + timedelta(minutes=15))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_lost_claim_is_dispatched_again(self):
+        schedule = self.schedule('200.00')
+        self.assertEqual(len(self.dispatch(self.now)), 1)
+        # the task holding the claim never ran
+        later = self.now + timedelta(minutes=11)
+        self.assertEqual(self.dispatch(later), [([schedule.id], 'default')])
+
+
+class InterestAccrualTests(TransactionTestCase):
+    """One day of savings interest per date, resumable from the run's high-water mark."""
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.accounts = [
+            Account.objects.create(
+                user=user, account_number=f'10000000000{n}', account_type='SAVINGS', balance=Decimal('36500.00'),
+            )
+            for n in range(1, 4)
+        ]
+        self.day = date(2025, 3, 1)
+
+    def balances(self):
+        return [account.balance for account in Account.objects.order_by('id')]
+
+    def test_accrual_credits_once_per_date(self):
+        [run] = accrue_savings_interest(self.day, chunk_size=2, annual_rate='5.00')
+        self.assertEqual((run.status, run.accounts_credited, run.total_interest), ('COMPLETED', 3, Decimal('15.00')))
+        self.assertEqual(self.balances(), [Decimal('36505.00')] * 3)
+
+        [again] = accrue_savings_interest(self.day, chunk_size=2, annual_rate='5.00')
+        self.assertEqual(again.pk, run.pk)
+        self.assertEqual(self.balances(), [Decimal('36505.00')] * 3)
+        self.assertEqual(InterestAccrual.objects.count(), 3)
+        self.assertEqual(Transaction.objects.filter(transaction_type='INTEREST').count(), 3)
+
+    def test_interrupted_run_resumes_after_its_high_water_mark(self):
+        # the first account's chunk committed before the process died
+        accrue_chunk(AccrualRun.objects.create(accrual_date=self.day), self.day, Decimal('5.00'), 365, 1)
+        self.assertEqual(self.balances(), [Decimal('36505.00'), Decimal('36500.00'), Decimal('36500.00')])
+
+        [run] = accrue_savings_interest(self.day, annual_rate='5.00')
+        self.assertEqual((run.status, run.accounts_processed, run.accounts_credited), ('COMPLETED', 3, 3))
+        self.assertEqual(self.balances(), [Decimal('36505.00')] * 3)
+        self.assertEqual(InterestAccrual.objects.count(), 3)
+
+
+class LoanRepaymentTests(TransactionTestCase):
+    """Installments auto-debited from the borrower's account by collect_installments."""
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.account = Account.objects.create(
+            user=user, account_number='100000000001', account_type='SAVINGS', balance=Decimal('150.00'),
+        )
+        self.today = timezone.localdate()
+        self.loan = Loan.objects.create(
+            borrower=self.account, loan_amount=Decimal('1000.00'), loan_term_months=2, monthly_payment=Decimal('100.00'),
+            status='ACCEPTED', is_accepted=True, next_payment_date=self.today,
+        )
+
+    def test_installments_are_collected_until_paid_off(self):
+        queued = []
+        self.assertEqual(dispatch_due_loans(lambda ids, today, alias: queued.append(ids), self.today), 1)
+        self.assertEqual(queued, [[self.loan.loan_id]])
+
+        result = collect_installments(queued[0], self.today)
+        self.assertEqual((result['collected'], result['failed'], result['paid_off']), (1, 0, 0))
+        # the same chunk delivered twice: the loan is no longer due
+        self.assertEqual(collect_installments(queued[0], self.today)['collected'], 0)
+        self.account.refresh_from_db()
+        self.loan.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('50.00'))
+        self.assertEqual(self.loan.next_payment_date, self.today + timedelta(days=30))
+        self.assertEqual(Transaction.objects.get().transaction_type, 'LOAN_PAYMENT')
+
+        Account.objects.filter(id=self.account.id).update(balance=Decimal('100.00'))
+        result = collect_installments([self.loan.loan_id], self.loan.next_payment_date)
+        self.assertEqual((result['collected'], result['paid_off']), (1, 1))
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.status, self.loan.next_payment_date, self.loan.version), ('PAID', None, 1))
+        self.assertEqual(self.loan.total_paid(), Decimal('200.00'))
+
+    def test_short_balance_leaves_the_installment_due(self):
+        Account.objects.filter(id=self.account.id).update(balance=Decimal('99.99'))
+        result = collect_installments([self.loan.loan_id], self.today)
+        self.assertEqual((result['collected'], result['failed']), (0, 1))
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.next_payment_date, self.today)
+        self.assertFalse(Transaction.objects.exists())
+
+    @mock.patch('bank.views.loan_payment_interest.delay')
+    def test_manual_payoff_bumps_the_version(self, payment_task):
+        client = APIClient()
+        client.force_authenticate(self.account.user)
+        url = f'/api/accounts/{self.account.id}/loan/{self.loan.loan_id}/payment/'
+        self.assertEqual(client.post(url, {'amount': '150.00'}).status_code, 201)
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.status, self.loan.version), ('ACCEPTED', 0))
+
+        self.assertEqual(client.post(url, {'amount': '50.00'}).status_code, 201)
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.status, self.loan.next_payment_date, self.loan.version), ('PAID', None, 1))
+
+
+@override_settings(FX_VERSION_CHECK_SECONDS=0)
+class FxTests(TransactionTestCase):
+    """Cross-currency transfers at the cached rate table, which new rates invalidate."""
+
+    def setUp(self):
+        bump_version()
+        load_rates({'USD': Decimal('133.45')}, date(2025, 3, 1))
+        self.alice = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        bob = CustomUser.objects.create_user(username='bob', email='bob@example.com', password='x')
+        self.source = Account.objects.create(
+            user=self.alice, account_number='100000000001', account_type='SAVINGS', balance=Decimal('5000.00'),
+        )
+        self.recipient = Account.objects.create(
+            user=bob, account_number='100000000002', account_type='SAVINGS', balance=Decimal('0.00'), currency='USD',
+        )
+
+    @mock.patch('bank.views.send_transfer_email.delay')
+    def test_transfer_credits_the_recipient_in_its_currency(self, send_email):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        response = client.post(f'/api/accounts/{self.source.id}/transfer/', {
+            'amount': '1334.50', 'recipient_account_number': self.recipient.account_number,
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        trans = Transaction.objects.get()
+        self.assertEqual((trans.amount, trans.recipient_amount), (Decimal('1334.50'), Decimal('10.00')))
+        self.assertEqual(trans.exchange_rate, Decimal('0.00749344'))
+        self.recipient.refresh_from_db()
+        self.assertEqual(self.recipient.balance, Decimal('10.00'))
+
+    def test_new_rates_replace_the_cached_table(self):
+        self.assertEqual(convert('100', 'USD', 'NPR'), (Decimal('13345.00'), Decimal('133.45')))
+        load_rates({'USD': Decimal('140.00')}, date(2025, 3, 2))
+        self.assertEqual(convert('100', 'USD', 'NPR')[0], Decimal('14000.00'))
+        # an admin edit goes through the model signals
+        FxRate.objects.filter(currency='USD').get().delete()
+        with self.assertRaisesMessage(FxError, 'No exchange rate for USD'):
+            convert('100', 'USD', 'NPR')
+
+    def test_another_process_loading_rates_is_noticed(self):
+        self.assertEqual(convert('100', 'USD', 'NPR')[0], Decimal('13345.00'))
+        # an update() fires no signal and bumps nothing here, as with a load in another process
+        FxRate.objects.filter(currency='USD').update(rate=Decimal('150.00'), updated_at=timezone.now())
+        self.assertEqual(convert('100', 'USD', 'NPR')[0], Decimal('15000.00'))
+        with override_settings(FX_VERSION_CHECK_SECONDS=60), self.assertNumQueries(0):
+            convert('100', 'USD', 'NPR')
+
+
+class TransactionArchiveTests(TransactionTestCase):
+    """Rows past the hot horizon move to the archive and stay readable through transaction_sources()."""
+
+    def setUp(self):
+        cache.delete(ARCHIVED_UNTIL_KEY)
+        self.user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        account = Account.objects.create(
+            user=self.user, account_number='100000000001', account_type='SAVINGS', balance=Decimal('300.00'),
+        )
+        self.old, self.recent = [
+            Transaction.objects.create(
+                account=account, transaction_type='DEPOSIT', amount=Decimal('150.00'),
+                balance_after=Decimal(balance), status='COMPLETED',
+            )
+            for balance in ('150.00', '300.00')
+        ]
+        self.long_ago = timezone.now() - timedelta(days=settings.TRANSACTION_HOT_DAYS + 30)
+        Transaction.objects.filter(id=self.old.id).update(created_at=self.long_ago)
+
+    def ids(self, sources):
+        return sorted(row_id for queryset in sources for row_id in queryset.values_list('id', flat=True))
+
+    def test_archive_moves_old_rows_once(self):
+        self.assertEqual(archive_transactions()[0], 1)
+        self.assertEqual(archive_transactions()[0], 0)
+        self.assertEqual(list(Transaction.objects.values_list('id', flat=True)), [self.recent.id])
+        self.assertEqual(TransactionArchive.objects.get().id, self.old.id)
+        self.assertIsNotNone(TransactionArchive.objects.get().archived_at)
+
+    def test_sources_reach_the_archive_only_when_needed(self):
+        self.assertEqual(len(transaction_sources()), 1)
+        archive_transactions()
+        self.assertEqual(self.ids(transaction_sources()), [self.old.id, self.recent.id])
+        self.assertEqual(self.ids(transaction_sources(start=self.long_ago - timedelta(days=1))), [self.old.id, self.recent.id])
+        recent = transaction_sources(start=timezone.now() - timedelta(days=1))
+        self.assertEqual((len(recent), self.ids(recent)), (1, [self.recent.id]))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/transactions/export/', {'output': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        # oldest first: the archived row, then the hot one
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.old.id, self.recent.id])
+
+
+@mock.patch('bank.views.notify_loan_decisions.delay')
+class LoanDecisionTests(TransactionTestCase):
+    """Bulk accept/reject with optimistic versions: loans decided or changed elsewhere come back as conflicts."""
+
+    def setUp(self):
+        admin = CustomUser.objects.create_user(username='admin', email='admin@example.com', password='x', is_staff=True)
+        user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        account = Account.objects.create(
+            user=user, account_number='100000000001', account_type='SAVINGS', balance=Decimal('0.00'),
+        )
+        self.loans = [
+            Loan.objects.create(borrower=account, loan_amount=Decimal('1000.00'), loan_term_months=12)
+            for _ in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def decide(self, **data):
+        response = self.client.post('/api/admin/loans/decisions/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['decided'], response.data['conflicts']
+
+    def test_bulk_accept_then_repeat(self, notify):
+        ids = [loan.loan_id for loan in self.loans]
+        self.assertEqual(self.decide(action='accept', loan_ids=ids), (ids, []))
+        notify.assert_called_once_with(ids)
+        loan = Loan.objects.get(loan_id=ids[0])
+        self.assertEqual((loan.status, loan.is_accepted, loan.version), ('ACCEPTED', True, 1))
+        self.assertEqual(loan.next_payment_date, loan.accepted_date.date() + timedelta(days=30))
+
+        # a second admin sending the same batch overwrites nothing
+        self.assertEqual(self.decide(action='reject', loan_ids=ids), ([], ids))
+        self.assertEqual(set(Loan.objects.values_list('status', flat=True)), {'ACCEPTED'})
+        notify.assert_called_once()
+
+    def test_stale_version_is_a_conflict(self, notify):
+        first, second, third = self.loans
+        # changed since the caller read version 0
+        Loan.objects.filter(loan_id=second.loan_id).update(version=1)
+        decided, conflicts = self.decide(action='reject', loans=[
+            {'loan_id': first.loan_id, 'version': 0},
+            {'loan_id': second.loan_id, 'version': 0},
+            {'loan_id': third.loan_id},
+        ])
+        self.assertEqual((decided, conflicts), ([first.loan_id, third.loan_id], [second.loan_id]))
+        self.assertEqual(Loan.objects.get(loan_id=second.loan_id).status, 'PENDING')
+
+
+class MetricsTests(TransactionTestCase):
+    """Request instrumentation and the /metrics endpoint, which also reports the workers' task metrics."""
+
+    def setUp(self):
+        registry.reset()
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        # no broker here to read lane depths from
+        depth = mock.patch('bank.views.queue_depth', return_value=0)
+        depth.start()
+        self.addCleanup(depth.stop)
+
+    def scrape(self, **headers):
+        return self.client.get('/metrics', headers=headers)
+
+    def test_metrics_needs_the_scrape_token(self):
+        with override_settings(METRICS_AUTH_TOKEN=''):
+            self.assertEqual(self.scrape(Authorization='Bearer ').status_code, 403)
+        with override_settings(METRICS_AUTH_TOKEN='secret'):
+            self.assertEqual(self.scrape().status_code, 401)
+            self.assertEqual(self.scrape(Authorization='Bearer wrong').status_code, 401)
+            response = self.scrape(Authorization='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('bank_http_requests_total{view="metrics",method="GET",status="401"} 2', response.content.decode())
+
+    @override_settings(METRICS_AUTH_TOKEN='secret')
+    def test_worker_metrics_are_merged(self):
+        worker = f'{WORKERS_KEY}:worker-1:42'
+        cache.set(worker, {('bank_celery_tasks_total', (('task', 'bank.tasks.loan_paid'), ('state', 'SUCCESS'))): 3.0}, 60)
+        # a worker whose snapshot expired
+        cache.set(WORKERS_KEY, {worker, f'{WORKERS_KEY}:worker-2:7'}, None)
+        body = self.scrape(Authorization='Bearer secret').content.decode()
+        self.assertIn('bank_celery_tasks_total{task="bank.tasks.loan_paid",state="SUCCESS"} 3', body)
+        self.assertEqual(cache.get(WORKERS_KEY), {worker})
+
+    def test_query_collector_keeps_the_slowest(self):
+        collector = QueryCollector(max_queries=2)
+        context = {'connection': connections['default']}
+        timings = [0.1, 0.5, 0.2, 0.9, 0.3]
+        clock = iter(value for elapsed in timings for value in (0.0, elapsed))
+        with mock.patch('bank.metrics.time.perf_counter', lambda: next(clock)):
+            for n, elapsed in enumerate(timings):
+                collector(lambda *args: None, f'SELECT {n}', (), False, context)
+        self.assertEqual((collector.count, round(collector.duration, 6)), (5, 2.0))
+        self.assertEqual(collector.slowest(), [(0.9, 'default', 'SELECT 3'), (0.5, 'default', 'SELECT 1')])
+
+    @mock.patch('bank.middleware.record_request')
+    def test_streaming_response_is_timed_until_closed(self, record):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/transactions/export/')
+        self.assertEqual(response.status_code, 200)
+        record.assert_not_called()
+        b''.join(response.streaming_content)
+        record.assert_called_once()
+        self.assertEqual(record.call_args.args[:3], ('api/transactions/export/', 'GET', 200))
+
+
+class GenerateDataTests(TransactionTestCase):
+    """The synthetic data generator: consistent balances, and no history in the future."""
+
+    def test_short_history_stays_in_the_past(self):
+        call_command(
+            'generate_data', users=30, transactions=10, loan_ratio=1, days=1, batch_size=10, seed=7, stdout=StringIO(),
+        )
+        now = timezone.now()
+        self.assertEqual((CustomUser.objects.count(), Account.objects.count(), Loan.objects.count()), (30, 30, 30))
+        for model, field in (
+            (CustomUser, 'date_joined'), (Account, 'created_at'), (Transaction, 'created_at'),
+            (Loan, 'applied_date'), (Loan, 'accepted_date'), (LoanInterest, 'payment_date'),
+        ):
+            self.assertFalse(model.objects.filter(**{f'{field}__gt': now}).exists(), f'{model.__name__}.{field}')
+        self.assertFalse(Loan.objects.filter(last_payment_date__gt=now.date()).exists())
+        self.assertTrue(LoanInterest.objects.exists())
+        # every account ends on its last transaction's balance
+        for account in Account.objects.all():
+            last = account.transactions.order_by('-created_at', '-id').first()
+            if last is not None:
+                self.assertEqual(account.balance, last.balance_after)
+
+    def test_offset_appends_to_existing_data(self):
+        options = {'users': 5, 'transactions': 5, 'loan_ratio': 0.5, 'stdout': StringIO()}
+        call_command('generate_data', **options)
+        call_command('generate_data', offset=5, **options)
+        self.assertEqual(CustomUser.objects.count(), 10)
+        self.assertEqual(Account.objects.values('account_number').distinct().count(), 10)
+
+
+@mock.patch('bank.routers.replica_configured', return_value=True)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Reads go to the replica during read-only requests, except for a client that has just written."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='secret')
+        self.router = PrimaryReplicaRouter()
+
+    def test_a_write_moves_the_rest_of_the_request_to_the_primary(self, configured):
+        state, token = begin_request(use_replica=True)
+        try:
+            self.assertEqual(self.router.db_for_read(Account), 'replica')
+            self.assertEqual(self.router.db_for_write(Account), 'default')
+            self.assertEqual(self.router.db_for_read(Account), 'default')
+            self.assertTrue(state.wrote)
+        finally:
+            end_request(token)
+        # outside a request (tasks, commands) everything is on the primary
+        self.assertEqual(self.router.db_for_read(Account), 'default')
+
+    def test_login_pins_the_issued_token(self, configured):
+        with mock.patch('bank.routers.begin_request', wraps=begin_request) as begin:
+            response = self.client.post('/api/auth/login/', {'username': 'alice', 'password': 'secret'})
+            self.assertEqual(response.status_code, 200, response.content)
+            # without the pin this GET would read from the replica, which this test does not have
+            response = self.client.get('/api/auth/profile/', headers={'Authorization': f"Token {response.json()['token']}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([call.args[0] for call in begin.call_args_list], [False, False])
+
+    def test_streamed_body_keeps_the_request_routing(self, configured):
+        def reads():
+            for _ in range(2):
+                yield self.router.db_for_read(Account)
+
+        state, token = begin_request(use_replica=True)
+        try:
+            body = in_request_context(reads())
+        finally:
+            end_request(token)
+        # consumed after the request ended, as a server does with a streaming response
+        self.assertEqual(list(body), ['replica', 'replica'])
+
+
+class TransactionExportTests(TransactionTestCase):
+    """Streamed CSV/NDJSON exports of the caller's transactions (or everyone's, for admins)."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        bob = CustomUser.objects.create_user(username='bob', email='bob@example.com', password='x', is_staff=True)
+        self.account = Account.objects.create(
+            user=self.alice, account_number='100000000001', account_type='SAVINGS', balance=Decimal('0.00'),
+        )
+        other = Account.objects.create(
+            user=bob, account_number='100000000002', account_type='SAVINGS', balance=Decimal('0.00'),
+        )
+        self.rows = [
+            Transaction.objects.create(
+                account=account, transaction_type='DEPOSIT', amount=Decimal('10.00'),
+                balance_after=Decimal('10.00'), description='pay, "june"', status='COMPLETED',
+            )
+            for account in (self.account, other, self.account)
+        ]
+        Transaction.objects.filter(id=self.rows[0].id).update(created_at=timezone.now() - timedelta(days=10))
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.bob = bob
+
+    def export(self, **params):
+        response = self.client.get('/api/transactions/export/', params)
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content)
+        return response, gzip.decompress(body) if params.get('gzip') else body
+
+    def test_csv_export_of_own_transactions(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(body.decode().splitlines()))
+        self.assertEqual(rows[0], [name for name, _ in EXPORT_COLUMNS])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.rows[0].id, self.rows[2].id])
+        self.assertEqual(rows[1][1:6], ['100000000001', 'DEPOSIT', '10.00', '10.00', 'pay, "june"'])
+
+    def test_ndjson_gzip_and_date_range(self):
+        since = timezone.localdate() - timedelta(days=1)
+        response, body = self.export(output='ndjson', gzip='1', **{'from': since.isoformat()})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.ndjson.gz"'))
+        self.assertEqual([json.loads(line)['id'] for line in body.decode().splitlines()], [self.rows[2].id])
+
+    def test_invalid_parameters(self):
+        for params in ({'output': 'xml'}, {'from': '2025-13-01'}, {'account': 'abc'}):
+            self.assertEqual(self.client.get('/api/transactions/export/', params).status_code, 400, params)
+
+    def test_admin_export_covers_every_account(self):
+        self.client.force_authenticate(self.bob)
+        response = self.client.get('/api/admin/transactions/export/', {'output': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.get('/api/admin/transactions/export/').status_code, 403)
+
+
+@mock.patch('bank.throttling.queue_depth', return_value=0)
+@mock.patch('bank.views.generate_transaction_pdf.apply_async')
+class StatementTests(TransactionTestCase):
+    """PDF statements rendered by a task into STATEMENT_STORAGE_DIR, polled and downloaded by task id."""
+
+    def setUp(self):
+        storage = tempfile.TemporaryDirectory()
+        self.addCleanup(storage.cleanup)
+        settings_override = override_settings(STATEMENT_STORAGE_DIR=storage.name, STATEMENT_SENDFILE_HEADER='')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def request_statement(self):
+        response = self.client.get('/api/download-pdf/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['task_id']
+
+    def status(self, task_id, **headers):
+        return self.client.get(f'/api/check-pdf-status/{task_id}/', headers=headers)
+
+    @mock.patch('bank.tasks.publish')
+    def render(self, task_id, publish):
+        fake = types.SimpleNamespace(statement_pdf=lambda transactions: b'%PDF-1.4 statement')
+        with mock.patch.dict('sys.modules', {'bank.rendering': fake}):
+            generate_transaction_pdf(StatementJob.objects.get(task_id=task_id).id)
+
+    def test_poll_then_download(self, render_later, depth):
+        task_id = self.request_statement()
+        render_later.assert_called_once()
+        response = self.status(task_id)
+        self.assertEqual((response.json(), response['Retry-After']), ({'status': 'pending'}, '3'))
+        self.assertEqual(self.status(task_id, **{'If-None-Match': response['ETag']}).status_code, 304)
+
+        self.render(task_id)
+        response = self.status(task_id)
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'application/pdf'))
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 statement')
+        with override_settings(STATEMENT_SENDFILE_HEADER='X-Accel-Redirect'):
+            response = self.status(task_id)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/statements/statement_{self.user.id}_{task_id}.pdf')
+
+    def test_expired_statement_is_gone(self, render_later, depth):
+        task_id = self.request_statement()
+        self.render(task_id)
+        StatementJob.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(sweep_expired_statements(), 1)
+        self.assertEqual(sweep_expired_statements(), 0)
+        self.assertEqual(os.listdir(settings.STATEMENT_STORAGE_DIR), [])
+        self.assertEqual(self.status(task_id).status_code, 410)
+
+    def test_other_users_statement_is_not_found(self, render_later, depth):
+        task_id = self.request_statement()
+        self.client.force_authenticate(CustomUser.objects.create_user(username='bob', email='bob@example.com', password='x'))
+        self.assertEqual(self.status(task_id).status_code, 404)
+
+
+class HomeViewTests(TransactionTestCase):
+    """The home screen in one request, with a query count that does not grow with the user's data."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.add_account()
+
+    def add_account(self):
+        account = Account.objects.create(
+            user=self.user, account_number=f'1000000000{Account.objects.count() + 10}', account_type='SAVINGS',
+            balance=Decimal('100.00'),
+        )
+        Transaction.objects.create(
+            account=account, transaction_type='DEPOSIT', amount=Decimal('100.00'),
+            balance_after=Decimal('100.00'), status='COMPLETED',
+        )
+        loan = Loan.objects.create(
+            borrower=account, loan_amount=Decimal('1000.00'), loan_term_months=10, monthly_payment=Decimal('105.00'),
+            status='ACCEPTED', is_accepted=True,
+        )
+        LoanInterest.objects.create(loan=loan, amount=Decimal('105.00'))
+
+    def home(self, **params):
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get('/api/home/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data, len(queries)
+
+    def test_queries_do_not_grow_with_accounts(self):
+        data, queries = self.home()
+        self.assertEqual(set(data), {'profile', 'accounts', 'transactions', 'loans'})
+        self.assertEqual(data['loans'][0]['total_paid'], Decimal('105.00'))
+        self.assertEqual(data['loans'][0]['remaining_amount'], Decimal('945.00'))
+        for _ in range(3):
+            self.add_account()
+        data, more_queries = self.home()
+        self.assertEqual((len(data['accounts']), len(data['loans'])), (4, 4))
+        self.assertEqual(more_queries, queries)
+
+    def test_fields_and_limit(self):
+        for _ in range(2):
+            self.add_account()
+        data, _ = self.home(fields='accounts,transactions,bogus', transactions=2)
+        self.assertEqual(set(data), {'accounts', 'transactions'})
+        self.assertEqual(len(data['transactions']), 2)
+        self.assertEqual(self.client.get('/api/home/', {'transactions': 'many'}).status_code, 400)
+
+
+class EventStreamTests(TransactionTestCase):
+    """Server-Sent Events: committed balance changes pushed to the owner's open stream."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.token = Token.objects.create(user=self.user)
+        self.account = Account.objects.create(
+            user=self.user, account_number='100000000001', account_type='SAVINGS', balance=Decimal('100.00'),
+        )
+
+    async def test_stream_delivers_published_events(self):
+        response = await AsyncClient().get('/api/events/', {'token': self.token.key})
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'text/event-stream'))
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+            pending = asyncio.ensure_future(anext(stream))
+            channel = user_channel(self.user.id)
+            while channel not in get_broker()._subscribers:
+                await asyncio.sleep(0.01)
+            publish(self.user.id, 'balance', {'account_id': self.account.id, 'balance': Decimal('150.00')})
+            event = await asyncio.wait_for(pending, 5)
+        finally:
+            await stream.aclose()
+        self.assertEqual(event, b'event: balance\ndata: {"account_id": %d, "balance": "150.00"}\n\n' % self.account.id)
+
+    async def test_stream_needs_a_token(self):
+        response = await AsyncClient().get('/api/events/', {'token': 'nope'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_wsgi_request_gets_no_stream(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/api/events/', {'token': self.token.key}).status_code, 204)
+
+    @mock.patch('bank.views.send_transaction_email.delay')
+    @mock.patch('bank.events.get_broker')
+    def test_balance_events_wait_for_the_commit(self, broker, send_email):
+        admin = CustomUser.objects.create_user(username='admin', email='admin@example.com', password='x', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        with transaction.atomic():
+            response = client.post(f'/api/accounts/{self.account.id}/withdraw/', {'amount': '40.00'})
+            self.assertEqual(response.status_code, 201, response.data)
+            broker.return_value.publish.assert_not_called()
+        calls = broker.return_value.publish.call_args_list
+        self.assertEqual({call.args[0] for call in calls}, {user_channel(self.user.id)})
+        events = {message['event']: message['data'] for message in (json.loads(call.args[1]) for call in calls)}
+        self.assertEqual(set(events), {'balance', 'transaction'})
+        self.assertEqual(events['balance'], {'account_id': self.account.id, 'balance': '60.00', 'currency': 'NPR'})
+
+
+@mock.patch('bank.views.send_transfer_email.delay')
+class ThrottleTests(TransactionTestCase):
+    """Token-bucket rate limits per client (429) and queue backpressure on PDF requests (503), both with Retry-After."""
+
+    def setUp(self):
+        get_buckets().clear()
+        self.addCleanup(get_buckets().clear)
+        self.user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        bob = CustomUser.objects.create_user(username='bob', email='bob@example.com', password='x')
+        self.source = Account.objects.create(
+            user=self.user, account_number='100000000001', account_type='SAVINGS', balance=Decimal('1000.00'),
+        )
+        self.recipient = Account.objects.create(
+            user=bob, account_number='100000000002', account_type='SAVINGS', balance=Decimal('0.00'),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def transfer(self):
+        return self.client.post(f'/api/accounts/{self.source.id}/transfer/', {
+            'amount': '1.00', 'recipient_account_number': self.recipient.account_number,
+        })
+
+    @mock.patch.dict(api_settings.DEFAULT_THROTTLE_RATES, {'transfers': '2/min'})
+    def test_burst_then_429(self, send_email):
+        self.assertEqual([self.transfer().status_code for _ in range(2)], [201, 201])
+        response = self.transfer()
+        self.assertEqual(response.status_code, 429)
+        # one token every 30 seconds
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_bucket_refills_over_time(self, send_email):
+        buckets = LocalBuckets()
+        capacity, refill = parse_rate('2/min')
+        self.assertEqual([buckets.take('k', capacity, refill, 100.0) for _ in range(3)], [0, 0, 30.0])
+        self.assertEqual(buckets.take('k', capacity, refill, 115.0), 15.0)
+        self.assertEqual(buckets.take('k', capacity, refill, 130.0), 0)
+        # another client has its own bucket
+        self.assertEqual(buckets.take('other', capacity, refill, 130.0), 0)
+
+    @mock.patch('bank.throttling.queue_depth')
+    @mock.patch('bank.views.generate_transaction_pdf.apply_async')
+    def test_deep_pdf_queue_answers_503(self, render_later, depth, send_email):
+        depth.return_value = settings.CELERY_BACKPRESSURE_DEPTH + 1
+        response = self.client.get('/api/download-pdf/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(settings.CELERY_BACKPRESSURE_CHECK_SECONDS))
+        self.assertFalse(StatementJob.objects.exists())
+
+        depth.return_value = settings.CELERY_BACKPRESSURE_DEPTH
+        self.assertEqual(self.client.get('/api/download-pdf/').status_code, 200)
+        render_later.assert_called_once()
+
+
+@override_settings(VELOCITY_HOURLY_COUNT=3, VELOCITY_HOURLY_AMOUNT=Decimal('500'), VELOCITY_DAILY_COUNT=0, VELOCITY_DAILY_AMOUNT=0)
+class VelocityTests(TransactionTestCase):
+    """Hourly and daily outflow limits over bucketed sliding windows, seeded from the database."""
+
+    def setUp(self):
+        get_store().clear()
+        self.addCleanup(get_store().clear)
+        user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.account = Account.objects.create(
+            user=user, account_number='100000000001', account_type='SAVINGS', balance=Decimal('5000.00'),
+        )
+
+    def test_window_slides_bucket_by_bucket(self):
+        window = SlidingWindow(3600, 60)
+        for at in (0, 30, 600):
+            window.add(at, Decimal('10'))
+        window.expire(3599)
+        self.assertEqual((window.count, window.amount), (3, Decimal('30')))
+        # the first bucket leaves whole, though the event at 30s is still inside the hour
+        window.expire(3600)
+        self.assertEqual((window.count, window.amount), (1, Decimal('10')))
+        window.remove(600, Decimal('10'))
+        self.assertEqual((window.count, window.amount), (0, Decimal('0')))
+
+    def test_count_and_amount_limits(self):
+        now = time.time()
+        for amount in ('100', '100'):
+            check_velocity(self.account.id, amount, now)
+            get_store().record(self.account.id, Decimal(amount), now)
+        with self.assertRaisesMessage(VelocityExceeded, 'Outgoing amount limit per hour is 500, 200.00 already used'):
+            check_velocity(self.account.id, '301', now)
+        check_velocity(self.account.id, '300', now)
+        get_store().record(self.account.id, Decimal('1'), now)
+        with self.assertRaisesMessage(VelocityExceeded, 'Too many outgoing transactions this hour, limit is 3'):
+            check_velocity(self.account.id, '1', now)
+        # an hour and a bucket later the window is empty again
+        check_velocity(self.account.id, '500', now + 3660)
+
+    def test_cold_start_counts_recent_outflows(self):
+        for kind, status in (('WITHDRAWAL', 'COMPLETED'), ('TRANSFER', 'COMPLETED'), ('DEPOSIT', 'COMPLETED'),
+                             ('WITHDRAWAL', 'FAILED')):
+            Transaction.objects.create(
+                account=self.account, transaction_type=kind, amount=Decimal('100.00'),
+                balance_after=Decimal('5000.00'), status=status,
+            )
+        old = Transaction.objects.create(
+            account=self.account, transaction_type='WITHDRAWAL', amount=Decimal('100.00'),
+            balance_after=Decimal('5000.00'), status='COMPLETED',
+        )
+        Transaction.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(hours=2))
+        totals = get_store().totals(self.account.id, time.time())
+        self.assertEqual(totals['hour'], (2, Decimal('200.00')))
+        self.assertEqual(totals['day'], (3, Decimal('300.00')))
+
+
+class ValuesSerializerTests(TransactionTestCase):
+    """The values() fast path renders the same JSON as the ModelSerializer it stands in for."""
+
+    def setUp(self):
+        alice = CustomUser.objects.create_user(
+            username='alice', email='alice@example.com', password='x', first_name='Alice', phone='9800000000',
+        )
+        bob = CustomUser.objects.create_user(username='bob', email='bob@example.com', password='x')
+        self.source = Account.objects.create(
+            user=alice, account_number='100000000001', account_type='SAVINGS', balance=Decimal('1234.50'),
+        )
+        recipient = Account.objects.create(
+            user=bob, account_number='100000000002', account_type='CHECKING', balance=Decimal('7.00'), currency='USD',
+        )
+        Transaction.objects.create(
+            account=self.source, transaction_type='TRANSFER', amount=Decimal('1334.50'), balance_after=Decimal('1234.50'),
+            recipient_account=recipient, recipient_amount=Decimal('10.00'), exchange_rate=Decimal('0.00749344'),
+            description='rent', status='COMPLETED',
+        )
+        loan = Loan.objects.create(
+            borrower=self.source, loan_amount=Decimal('1000.00'), loan_term_months=12, status='ACCEPTED', is_accepted=True,
+            next_payment_date=timezone.localdate(),
+        )
+        LoanInterest.objects.create(loan=loan, amount=loan.monthly_payment)
+
+    def render(self, data):
+        return ORJSONRenderer().render(data)
+
+    def test_same_output_as_the_model_serializers(self):
+        cases = (
+            (AccountSerializer, AccountValuesSerializer, Account.objects.select_related('user')),
+            (TransactionSerializer, TransactionValuesSerializer, Transaction.objects.select_related('recipient_account')),
+            (LoanSerializer, LoanValuesSerializer, Loan.objects.with_payment_totals().select_related('borrower__user')),
+        )
+        for model_serializer, values_serializer, queryset in cases:
+            with self.subTest(values_serializer.__name__):
+                expected = self.render(model_serializer(queryset.order_by('pk'), many=True).data)
+                self.assertEqual(self.render(values_serializer(queryset.order_by('pk')).data), expected)
+
+    def test_null_relation_gives_none(self):
+        Transaction.objects.create(
+            account=self.source, transaction_type='DEPOSIT', amount=Decimal('5.00'), balance_after=Decimal('1239.50'),
+            status='COMPLETED',
+        )
+        deposit = Transaction.objects.filter(transaction_type='DEPOSIT')
+        [fast] = TransactionValuesSerializer(deposit).data
+        [model] = TransactionSerializer(deposit, many=True).data
+        # DRF drops a key whose source runs through a null relation
+        self.assertIsNone(fast.pop('recipient_account_number'))
+        self.assertEqual(json.loads(self.render(fast)), json.loads(self.render(model)))
+
+
+class ConditionalGetTests(TransactionTestCase):
+    """Profile, account and loan reads answer If-None-Match with 304 until the data changes."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.account = Account.objects.create(
+            user=self.user, account_number='100000000001', account_type='SAVINGS', balance=Decimal('2000.00'),
+        )
+        Loan.objects.create(borrower=self.account, loan_amount=Decimal('1000.00'), loan_term_months=12)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('private', first['Cache-Control'])
+        self.assertIn('no-cache', first['Cache-Control'])
+        return first, self.client.get(url, headers={'If-None-Match': first['ETag']})
+
+    def test_unchanged_resources_are_not_modified(self):
+        for url in ('/api/auth/profile/', '/api/accounts/', f'/api/accounts/{self.account.id}/', '/api/loans/',
+                    f'/api/accounts/{self.account.id}/loan/'):
+            with self.subTest(url):
+                first, second = self.revalidate(url)
+                self.assertEqual(second.status_code, 304)
+                self.assertEqual(second['ETag'], first['ETag'])
+                self.assertEqual(second.content, b'')
+
+    def test_changes_invalidate_the_etag(self):
+        url = f'/api/accounts/{self.account.id}/'
+        first = self.client.get(url)
+        Account.objects.filter(pk=self.account.pk).update(
+            balance=Decimal('2500.00'), updated_at=timezone.now() + timedelta(seconds=1),
+        )
+        second = self.client.get(url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second.json()['balance'], '2500.00')
+
+        # the nested owner is part of every representation
+        first = self.client.get('/api/accounts/')
+        CustomUser.objects.filter(pk=self.user.pk).update(updated_at=timezone.now() + timedelta(seconds=2))
+        self.user.refresh_from_db()
+        self.assertEqual(self.client.get('/api/accounts/', headers={'If-None-Match': first['ETag']}).status_code, 200)
+
+        # a new loan changes the list count
+        first = self.client.get('/api/loans/')
+        Loan.objects.create(borrower=self.account, loan_amount=Decimal('500.00'), loan_term_months=6)
+        self.assertEqual(self.client.get('/api/loans/', headers={'If-None-Match': first['ETag']}).status_code, 200)
+
+    def test_missing_account_is_not_found(self):
+        response = self.client.get('/api/accounts/999999/', headers={'If-None-Match': '*'})
+        self.assertEqual(response.status_code, 404)
+
+
+class AdminChangelistTests(TransactionTestCase):
+    """Back-office changelists run a fixed number of queries however many rows the page shows."""
+
+    def setUp(self):
+        admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        self.client.force_login(admin)
+
+    def add_rows(self, count, start=0):
+        for i in range(start, start + count):
+            user = CustomUser.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='x')
+            account = Account.objects.create(
+                user=user, account_number=f'1000000{i:05d}', account_type='SAVINGS', balance=Decimal('1000.00'),
+            )
+            Transaction.objects.create(
+                account=account, transaction_type='DEPOSIT', amount=Decimal('10.00'), balance_after=Decimal('1000.00'),
+                description=f'salary {i}', status='COMPLETED',
+            )
+            loan = Loan.objects.create(borrower=account, loan_amount=Decimal('1000.00'), loan_term_months=12)
+            LoanInterest.objects.create(loan=loan, amount=Decimal('25.00'))
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_no_per_row_queries(self):
+        urls = ('/admin/bank/account/', '/admin/bank/transaction/', '/admin/bank/loan/', '/admin/bank/loaninterest/')
+        self.add_rows(2)
+        few = {url: self.changelist_queries(url) for url in urls}
+        self.add_rows(8, start=2)
+        for url in urls:
+            with self.subTest(url):
+                self.assertEqual(self.changelist_queries(url), few[url])
+
+    def test_loan_totals_come_from_the_annotation(self):
+        self.add_rows(1)
+        response = self.client.get('/admin/bank/loan/')
+        self.assertContains(response, 'NPR 25.00')
+        loan = response.context['cl'].result_list[0]
+        self.assertEqual(loan.paid_total, Decimal('25.00'))
+
+    def test_no_exact_count_over_the_whole_table(self):
+        self.add_rows(3)
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get('/admin/bank/transaction/')
+        self.assertEqual(response.context['cl'].paginator.count, 3)
+        counts = [query['sql'] for query in queries if 'COUNT(' in query['sql'].upper()]
+        self.assertTrue(counts)
+        # the paginator counts a LIMITed subquery; show_full_result_count is off
+        self.assertTrue(all('LIMIT' in sql.upper() for sql in counts), counts)
+
+    def test_created_month_filter(self):
+        self.add_rows(2)
+        old = Transaction.objects.order_by('id').first()
+        Transaction.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=62))
+        month = f'{timezone.localtime(timezone.now() - timedelta(days=62)):%Y-%m}'
+        response = self.client.get('/admin/bank/transaction/', {'created_month': month})
+        self.assertEqual([row.pk for row in response.context['cl'].result_list], [old.pk])
+        self.assertEqual(
+            len(self.client.get('/admin/bank/transaction/', {'created_month': 'nope'}).context['cl'].result_list), 0,
+        )
+
+    def test_indexed_search(self):
+        self.add_rows(3)
+        response = self.client.get('/admin/bank/transaction/', {'q': 'salary 1'})
+        self.assertEqual([row.description for row in response.context['cl'].result_list], ['salary 1'])
+        response = self.client.get('/admin/bank/account/', {'q': '100000000002'})
+        self.assertEqual([row.account_number for row in response.context['cl'].result_list], ['100000000002'])
+        response = self.client.get('/admin/bank/account/', {'q': 'ab'})
+        self.assertEqual(len(response.context['cl'].result_list), 0)
+        self.assertContains(response, 'at least 3 characters')
+
+
+class SearchTests(TransactionTestCase):
+    """Text and account-prefix search over the live table and the archive, through the indexes."""
+
+    def setUp(self):
+        cache.delete(ARCHIVED_UNTIL_KEY)
+        self.user = CustomUser.objects.create_user(username='alice', email='alice@example.com', password='x')
+        other = CustomUser.objects.create_user(username='bob', email='bob@example.com', password='x')
+        self.account = Account.objects.create(
+            user=self.user, account_number='100000000001', account_type='SAVINGS', balance=Decimal('1000.00'),
+        )
+        self.other = Account.objects.create(
+            user=other, account_number='200000000001', account_type='SAVINGS', balance=Decimal('1000.00'),
+        )
+        for account in (self.account, self.other):
+            for description in ('Grocery run', 'Electricity bill'):
+                Transaction.objects.create(
+                    account=account, transaction_type='WITHDRAWAL', amount=Decimal('10.00'),
+                    balance_after=Decimal('990.00'), description=description, status='COMPLETED',
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, term, url='/api/transactions/search/'):
+        response = self.client.get(url, {'q': term})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_customer_sees_only_their_own(self):
+        rows = self.search('grocery')
+        self.assertEqual([(row['account'], row['description']) for row in rows], [(self.account.id, 'Grocery run')])
+        self.assertEqual(len(self.search('1000000')), 2)
+        self.assertEqual(self.search('2000000'), [])
+
+    def test_short_terms_are_rejected(self):
+        self.assertEqual(self.client.get('/api/transactions/search/', {'q': 'ab'}).status_code, 400)
+
+    def test_text_index_follows_writes(self):
+        self.assertEqual(search_transactions('grocery').count(), 2)
+        Transaction.objects.filter(description='Grocery run', account=self.other).update(description='Rent')
+        self.assertEqual(search_transactions('grocery').count(), 1)
+        self.assertEqual(search_transactions('rent').count(), 1)
+        Transaction.objects.filter(description='Rent').delete()
+        self.assertEqual(search_transactions('rent').count(), 0)
+        # FTS query syntax in the term is matched literally
+        self.assertEqual(search_transactions('"bill OR').count(), 0)
+
+    def test_archived_transactions_are_found(self):
+        Transaction.objects.filter(description='Electricity bill').update(
+            created_at=timezone.now() - timedelta(days=settings.TRANSACTION_HOT_DAYS + 30),
+        )
+        archive_transactions()
+        self.assertEqual(Transaction.objects.filter(description='Electricity bill').count(), 0)
+
+        rows = self.search('electricity')
+        self.assertEqual([(row['account'], row['description']) for row in rows], [(self.account.id, 'Electricity bill')])
+        self.assertEqual(len(self.search('1000000')), 2)
+
+        self.user.is_staff = True
+        self.user.save()
+        found = self.search('electricity', url='/api/admin/search/')
+        self.assertEqual(sorted(row['account'] for row in found['transactions']), [self.account.id, self.other.id])
+        found = self.search('2000000', url='/api/admin/search/')
+        self.assertEqual(len(found['transactions']), 2)
+        self.assertEqual([row['account_number'] for row in found['accounts']], ['200000000001'])
+
+
+class StartupTests(TransactionTestCase):
+    """Web processes and general workers start without loading the PDF renderer."""
+
+    def test_only_the_pdf_lane_imports_weasyprint(self):
+        command = startup_benchmark.Command()
+        with mock.patch.object(startup_benchmark, 'HEAVY_MODULES', ['weasyprint', 'bank.rendering']):
+            for name, modules in startup_benchmark.PROCESS_TYPES.items():
+                with self.subTest(name):
+                    expected = ['weasyprint', 'bank.rendering'] if name == 'pdf-worker' else []
+                    self.assertEqual(command.probe(modules)['heavy'], expected)
+
+    def test_report(self):
+        out = StringIO()
+        call_command('startup_benchmark', 'web', 'pdf-worker', repeat=1, stdout=out)
+        web, pdf = out.getvalue().splitlines()
+        self.assertRegex(web, r'^web +import +[\d.]+ms +RSS +[\d.]+MB +\d+ modules +heavy: none$')
+        self.assertTrue(pdf.endswith('heavy: weasyprint'), pdf)
+
+    def test_unknown_type(self):
+        with self.assertRaisesMessage(CommandError, 'Unknown process type(s) gunicorn'):
+            call_command('startup_benchmark', 'gunicorn')
@@ -0,0 +1,222 @@
+# throttling.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+
+def parse_rate(rate):
+    """'30/min' -> (capacity 30, refill 0.5 tokens per second), same format as DRF's rates."""
+    num, period = rate.split('/')
+    capacity = int(num)
+    seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+    return capacity, capacity / seconds
+
+
+class LocalBuckets:
+    """Token buckets in process memory; the oldest idle buckets are dropped past `max_entries`."""
+
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill, now):
+        """Take one token; returns 0 when allowed, else seconds until a token is available."""
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / refill
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * refill)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / refill
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / refill * 1000))
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """
+    Buckets shared by every web process, updated atomically by a Lua script.
+    Clients already known to be out of tokens are rejected from a local
+    deny list without a round trip, so a flood costs Redis nothing.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self._script = None
+        self._denied = {}
+
+    def take(self, key, capacity, refill, now):
+        denied_until = self._denied.get(key)
+        if denied_until is not None:
+            if denied_until > now:
+                return denied_until - now
+            self._denied.pop(key, None)
+        if self._script is None:
+            import redis
+            self._script = redis.Redis.from_url(self.url).register_script(TAKE_SCRIPT)
+        wait = float(self._script(keys=[f'throttle:{key}'], args=[capacity, refill, now]))
+        if wait:
+            if len(self._denied) > 100_000:
+                self._denied.clear()
+            self._denied[key] = now + wait
+        return wait
+
+    def clear(self):
+        self._denied.clear()
+
+
+_buckets = None
+
+
+def get_buckets():
+    global _buckets
+    if _buckets is None:
+        if settings.THROTTLE_BACKEND == 'redis':
+            _buckets = RedisBuckets(settings.THROTTLE_REDIS_URL)
+        else:
+            _buckets = LocalBuckets()
+    return _buckets
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Per-client token bucket for one endpoint class. The bucket size and
+    refill come from the DRF rate for `scope` ('30/min' allows a burst of 30,
+    refilled at one every two seconds). Clients are keyed by user, so all
+    tokens of a user share a bucket; anonymous requests by IP.
+    """
+    scope = None
+    methods = None
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def allow_request(self, request, view):
+        if self.methods and request.method not in self.methods:
+            return True
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if rate is None:
+            return True
+        capacity, refill = parse_rate(rate)
+        if request.user and request.user.is_authenticated:
+            client = f'user:{request.user.pk}'
+        else:
+            client = f'ip:{self.get_ident(request)}'
+        try:
+            self.wait_seconds = get_buckets().take(f'{self.scope}:{client}', capacity, refill, time.time())
+        except Exception:
+            # never take the endpoint down with the limiter
+            logger.exception('Throttle backend unavailable, allowing request')
+            return True
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class TransferThrottle(TokenBucketThrottle):
+    scope = 'transfers'
+
+
+class LoanApplicationThrottle(TokenBucketThrottle):
+    scope = 'loans'
+    methods = ('POST',)
+
+
+class StatementThrottle(TokenBucketThrottle):
+    scope = 'statements'
+
+
+class ExportThrottle(TokenBucketThrottle):
+    scope = 'exports'
+
+
+class SearchThrottle(TokenBucketThrottle):
+    scope = 'search'
+
+
+class QueueBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many jobs queued, try again later.'
+    default_code = 'queue_busy'
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+# queue name -> (depth, monotonic time it was read)
+_depths = {}
+_broker_client = None
+
+
+def queue_depth(queue):
+    """
+    Pending messages on a Celery queue (Redis LLEN on the broker), cached for
+    CELERY_BACKPRESSURE_CHECK_SECONDS so busy endpoints do not hit the broker
+    on every request. Unknown (-1) when the broker cannot be reached.
+    """
+    now = time.monotonic()
+    cached = _depths.get(queue)
+    if cached and now - cached[1] < settings.CELERY_BACKPRESSURE_CHECK_SECONDS:
+        return cached[0]
+    global _broker_client
+    try:
+        if _broker_client is None:
+            import redis
+            _broker_client = redis.Redis.from_url(
+                settings.CELERY_BROKER_URL, socket_connect_timeout=0.2, socket_timeout=0.2
+            )
+        depth = _broker_client.llen(queue)
+    except Exception:
+        logger.warning('Could not read depth of queue %s', queue)
+        depth = -1
+    _depths[queue] = (depth, now)
+    return depth
+
+
+class QueueBackpressureThrottle(BaseThrottle):
+    """Shed requests that enqueue PDF renders while the pdf lane is already deep (503 + Retry-After)."""
+    queue = 'pdf'
+
+    def allow_request(self, request, view):
+        limit = settings.CELERY_BACKPRESSURE_DEPTH
+        if limit and queue_depth(self.queue) > limit:
+            raise QueueBusy(settings.CELERY_BACKPRESSURE_CHECK_SECONDS)
+        return True
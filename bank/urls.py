@@ -6,7 +6,10 @@ from .views import (
     DepositView, WithdrawalView, TransferView, BalanceEnquiry, 
     LoanView, LoanInterestView,
     AdminDashboardView, AdminUserManagementView, AdminAccountManagementView,
-    AdminLoanManagementView, request_transaction_pdf, check_pdf_status
+    AdminLoanManagementView, AdminLoanDecisionView, request_transaction_pdf, check_pdf_status,
+    TransactionExportView, AdminTransactionExportView, HomeView, event_stream,
+    ScheduledTransferView, FxRateView, AdminFxRevaluationView, TransactionSearchView, AdminSearchView,
+    AdminOffboardingView
 )
 
 urlpatterns = [
@@ -15,6 +18,8 @@ urlpatterns = [
     path('auth/login/', UserLoginView.as_view(), name='login'),
     path('auth/logout/', UserLogoutView.as_view(), name='logout'),
     path('auth/profile/', UserProfileView.as_view(), name='profile'),
+    path('home/', HomeView.as_view(), name='home'),
+    path('events/', event_stream, name='events'),
     
     # Accounts
     path('accounts/', AccountListCreateView.as_view(), name='account-list'),
@@ -26,6 +31,11 @@ urlpatterns = [
     path('accounts/<int:account_id>/deposit/', DepositView.as_view(), name='deposit'),  
     path('accounts/<int:account_id>/withdraw/', WithdrawalView.as_view(), name='withdraw'), 
     path('accounts/<int:account_id>/transfer/', TransferView.as_view(), name='transfer'), 
+    path('accounts/<int:account_id>/scheduled-transfers/', ScheduledTransferView.as_view(), name='scheduled-transfer-list'),
+    path('accounts/<int:account_id>/scheduled-transfers/<int:schedule_id>/', ScheduledTransferView.as_view(), name='scheduled-transfer-detail'),
+    path('transactions/export/', TransactionExportView.as_view(), name='transaction-export'),
+    path('transactions/search/', TransactionSearchView.as_view(), name='transaction-search'),
+    path('fx/rates/', FxRateView.as_view(), name='fx-rates'),
     
     # Loans
     path('loans/', LoanView.as_view(), name='loan-list'), 
@@ -36,9 +46,15 @@ urlpatterns = [
     path('admin/dashboard/', AdminDashboardView.as_view(), name='admin-dashboard'),
     path('admin/users/', AdminUserManagementView.as_view(), name='admin-users'),
     path('admin/users/<int:user_id>/', AdminUserManagementView.as_view(), name='admin-user-detail'),
+    path('admin/offboarding/', AdminOffboardingView.as_view(), name='admin-offboarding'),
+    path('admin/offboarding/<int:job_id>/', AdminOffboardingView.as_view(), name='admin-offboarding-detail'),
     path('admin/accounts/', AdminAccountManagementView.as_view(), name='admin-accounts'),
     path('admin/loans/', AdminLoanManagementView.as_view(), name='admin-loans'),
+    path('admin/loans/decisions/', AdminLoanDecisionView.as_view(), name='admin-loan-decisions'),
     path('admin/loans/<int:loan_id>/', AdminLoanManagementView.as_view(), name='admin-loan-action'),
+    path('admin/search/', AdminSearchView.as_view(), name='admin-search'),
+    path('admin/transactions/export/', AdminTransactionExportView.as_view(), name='admin-transaction-export'),
+    path('admin/fx/revaluation/', AdminFxRevaluationView.as_view(), name='admin-fx-revaluation'),
 
     path("download-pdf/", request_transaction_pdf, name="request_pdf_download"),
     path("check-pdf-status/<str:task_id>/", check_pdf_status, name="check_pdf_status"),
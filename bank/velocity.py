@@ -0,0 +1,277 @@
+# velocity.py
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import AuthorizationHold, Transaction
+from .sharding import shard_db
+
+# (name, window length, bucket size) in seconds; windows slide one bucket at a
+# time. A bucket leaves the window once its start is `length` old, so the
+# totals can under-count by up to one bucket: the part of the oldest bucket
+# that is still inside the window (at most a minute of the hour, an hour of
+# the day). Both backends behave the same way.
+WINDOWS = (('hour', 3600, 60), ('day', 86400, 3600))
+LONGEST = max(length for _, length, _ in WINDOWS)
+OUTFLOW_TYPES = ('TRANSFER', 'WITHDRAWAL')
+
+
+class VelocityExceeded(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+def load_outflows(account_id, since):
+    """
+    Cold start: the account's outflows since `since`, at most a day's worth
+    of limited activity. Funds still reserved by an open hold count, as
+    they did when reserve_funds recorded them.
+    """
+    rows = list(
+        Transaction.objects.filter(
+            account_id=account_id, transaction_type__in=OUTFLOW_TYPES,
+            status='COMPLETED', created_at__gte=since,
+        )
+        .values_list('created_at', 'amount')
+    )
+    rows += AuthorizationHold.objects.filter(
+        account_id=account_id, status='HELD', created_at__gte=since,
+    ).values_list('created_at', 'amount')
+    return [(created_at.timestamp(), amount) for created_at, amount in rows]
+
+
+class SlidingWindow:
+    """Running count/amount over fixed-size buckets; adding and reading touch only the ends of the deque."""
+    __slots__ = ('length', 'step', 'buckets', 'count', 'amount')
+
+    def __init__(self, length, step):
+        self.length = length
+        self.step = step
+        self.buckets = deque()
+        self.count = 0
+        self.amount = Decimal('0.00')
+
+    def expire(self, now):
+        cutoff = now - self.length
+        while self.buckets and self.buckets[0][0] <= cutoff:
+            _, count, amount = self.buckets.popleft()
+            self.count -= count
+            self.amount -= amount
+
+    def add(self, at, amount):
+        start = at - at % self.step
+        if self.buckets and self.buckets[-1][0] == start:
+            self.buckets[-1][1] += 1
+            self.buckets[-1][2] += amount
+        else:
+            self.buckets.append([start, 1, amount])
+        self.count += 1
+        self.amount += amount
+
+    def remove(self, at, amount):
+        start = at - at % self.step
+        for bucket in self.buckets:
+            if bucket[0] == start:
+                bucket[1] -= 1
+                bucket[2] -= amount
+                self.count -= 1
+                self.amount -= amount
+                return
+
+
+class LocalVelocity:
+    """
+    Counters in process memory, for a single web process or development.
+    Accounts are seeded from the database the first time they are seen and
+    the least recently used ones are dropped past `max_accounts`.
+    """
+
+    def __init__(self, max_accounts=100_000):
+        self.max_accounts = max_accounts
+        self._accounts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def totals(self, account_id, now):
+        with self._lock:
+            windows = self._accounts.get(account_id)
+            if windows is not None:
+                self._accounts.move_to_end(account_id)
+        if windows is None:
+            windows = {name: SlidingWindow(length, step) for name, length, step in WINDOWS}
+            for at, amount in load_outflows(account_id, datetime.fromtimestamp(now - LONGEST, dt_timezone.utc)):
+                for window in windows.values():
+                    if at > now - window.length:
+                        window.add(at, amount)
+            with self._lock:
+                windows = self._accounts.setdefault(account_id, windows)
+                if len(self._accounts) > self.max_accounts:
+                    self._accounts.popitem(last=False)
+        with self._lock:
+            result = {}
+            for name, window in windows.items():
+                window.expire(now)
+                result[name] = (window.count, window.amount)
+            return result
+
+    def record(self, account_id, amount, now):
+        with self._lock:
+            windows = self._accounts.get(account_id)
+            # an unseen account is seeded from the DB, which already has this row
+            if windows is None:
+                return
+            for window in windows.values():
+                window.add(now, amount)
+
+    def release(self, account_id, amount, at):
+        with self._lock:
+            windows = self._accounts.get(account_id)
+            if windows is None:
+                return
+            for window in windows.values():
+                window.remove(at, amount)
+
+    def clear(self):
+        with self._lock:
+            self._accounts.clear()
+
+
+class RedisVelocity:
+    """
+    Counters shared by all web processes: one hash per account and window,
+    fields '<bucket>:n' and '<bucket>:c' (count, amount in cents). A hash
+    without the 'seeded' marker is rebuilt from the database.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def totals(self, account_id, now):
+        pipe = self.client.pipeline(transaction=False)
+        for name, _, _ in WINDOWS:
+            pipe.hgetall(f'velocity:{account_id}:{name}')
+        hashes = pipe.execute()
+        if not all(b'seeded' in fields for fields in hashes):
+            hashes = self.seed(account_id, now)
+
+        result = {}
+        for (name, length, _), fields in zip(WINDOWS, hashes):
+            count, cents = 0, 0
+            for field, value in fields.items():
+                bucket, _, kind = field.decode().partition(':')
+                if kind and int(bucket) > now - length:
+                    if kind == 'n':
+                        count += int(value)
+                    else:
+                        cents += int(value)
+            result[name] = (count, Decimal(cents) / 100)
+        return result
+
+    def seed(self, account_id, now):
+        outflows = load_outflows(account_id, datetime.fromtimestamp(now - LONGEST, dt_timezone.utc))
+        pipe = self.client.pipeline()
+        hashes = []
+        for name, length, step in WINDOWS:
+            fields = {b'seeded': b'1'}
+            for at, amount in outflows:
+                if at > now - length:
+                    bucket = int(at - at % step)
+                    for kind, value in (('n', 1), ('c', int(amount * 100))):
+                        key = f'{bucket}:{kind}'.encode()
+                        fields[key] = int(fields.get(key, 0)) + value
+            key = f'velocity:{account_id}:{name}'
+            pipe.delete(key)
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, length + step)
+            hashes.append(fields)
+        pipe.execute()
+        return hashes
+
+    def record(self, account_id, amount, now):
+        pipe = self.client.pipeline(transaction=False)
+        for name, length, step in WINDOWS:
+            key = f'velocity:{account_id}:{name}'
+            bucket = int(now - now % step)
+            pipe.hincrby(key, f'{bucket}:n', 1)
+            pipe.hincrby(key, f'{bucket}:c', int(amount * 100))
+            pipe.expire(key, length + step)
+        pipe.execute()
+
+    def release(self, account_id, amount, at):
+        pipe = self.client.pipeline(transaction=False)
+        for name, length, step in WINDOWS:
+            key = f'velocity:{account_id}:{name}'
+            bucket = int(at - at % step)
+            # a bucket past the window is ignored by totals(); a hash this creates lacks 'seeded' and is rebuilt
+            pipe.hincrby(key, f'{bucket}:n', -1)
+            pipe.hincrby(key, f'{bucket}:c', -int(amount * 100))
+            pipe.expire(key, length + step)
+        pipe.execute()
+
+    def clear(self):
+        pass
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        if settings.VELOCITY_BACKEND == 'redis':
+            _store = RedisVelocity(settings.VELOCITY_REDIS_URL)
+        else:
+            _store = LocalVelocity()
+    return _store
+
+
+def limits():
+    return {
+        'hour': (settings.VELOCITY_HOURLY_COUNT, settings.VELOCITY_HOURLY_AMOUNT),
+        'day': (settings.VELOCITY_DAILY_COUNT, settings.VELOCITY_DAILY_AMOUNT),
+    }
+
+
+def check_velocity(account_id, amount, now=None):
+    """Raise VelocityExceeded if moving `amount` out of the account would break an hourly or daily limit."""
+    now = now or time.time()
+    amount = Decimal(amount)
+    totals = get_store().totals(account_id, now)
+    for name, (max_count, max_amount) in limits().items():
+        count, total = totals[name]
+        if max_count and count + 1 > max_count:
+            raise VelocityExceeded(f'Too many outgoing transactions this {name}, limit is {max_count}')
+        if max_amount and total + amount > max_amount:
+            raise VelocityExceeded(f'Outgoing amount limit per {name} is {max_amount}, {total} already used')
+
+
+def record_on_commit(account_id, amount):
+    """Count `amount` against the account's limits once the reservation taking it commits (see reserve_funds)."""
+    amount = Decimal(amount)
+    transaction.on_commit(lambda: get_store().record(account_id, amount, time.time()), using=shard_db())
+
+
+def release_on_commit(account_id, amount, reserved_at):
+    """
+    Undo record_on_commit for a hold that ended without moving money
+    (refused or expired), in the bucket it was counted in. With the local
+    backend this reaches only the releasing process's counters, so a hold a
+    worker releases keeps counting in the web process until its window
+    slides past; VELOCITY_BACKEND=redis shares one set of counters.
+    """
+    amount = Decimal(amount)
+    at = reserved_at.timestamp()
+    transaction.on_commit(lambda: get_store().release(account_id, amount, at), using=shard_db())
@@ -1,24 +1,54 @@
 # views.py
+import asyncio
+import uuid
 from decimal import Decimal
+from functools import partial
+from itertools import chain
+from operator import attrgetter, itemgetter
 from rest_framework import status, generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView    
 from rest_framework.authtoken.models import Token
-from django.http import JsonResponse, FileResponse
-from celery.result import AsyncResult
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import login
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from datetime import timedelta
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated
-from .models import CustomUser, Account, Transaction, Loan
+from .models import CustomUser, Account, Transaction, Loan, StatementJob, ScheduledTransfer, FxRate, OffboardingJob
 from .permissions import IsAdminUser
-from .tasks import send_transaction_email, send_transfer_email, welcome_user, generate_transaction_pdf, loan_accepted, loan_payment_interest
+from .metrics import registry, worker_totals
+from .exports import EXPORT_FORMATS, ExportError, export_period, filter_transactions, streaming_export
+from .archive import transaction_sources
+from .statements import statement_path, statement_response
+from .posting import PostingError, reserve_funds, settle_hold
+from .routers import issue_credential
+from .sharding import ShardedAccountMixin, atomic_on_shard, on_shard, per_shard, shard_db, shard_for_account_number, shards
+from .decisions import TRANSITIONS, decide_loans
+from .offboarding import start_offboarding
+from .search import RESULT_LIMIT, SearchError, search_accounts, search_transactions
+from .fx import is_supported, revaluation
+from .conditional import (
+    conditional, profile_validators, account_validators, account_list_validators, loan_list_validators
+)
+from .velocity import VelocityExceeded, check_velocity
+from .throttling import (
+    TransferThrottle, LoanApplicationThrottle, StatementThrottle, ExportThrottle, SearchThrottle,
+    QueueBackpressureThrottle, queue_depth
+)
+from .events import balance_changed, publish, publish_on_commit, get_broker, reaches_workers, user_channel, format_sse
+from .tasks import send_transaction_email, send_transfer_email, welcome_user, generate_transaction_pdf, loan_accepted, loan_payment_interest, notify_loan_decisions, offboard_user, settle_account_holds
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, UserSerializer,
-    AccountSerializer, TransactionSerializer, LoanSerializer, LoanInterestSerializer
+    AccountSerializer, TransactionSerializer, LoanSerializer, LoanInterestSerializer,
+    ScheduledTransferSerializer, FxRateSerializer, RevaluationSerializer, LoanDecisionSerializer, OffboardingJobSerializer, AuthorizationHoldSerializer,
+    UserValuesSerializer, AccountValuesSerializer, TransactionValuesSerializer, LoanValuesSerializer
 )
 
 
@@ -31,6 +61,7 @@ class UserRegistrationView(generics.CreateAPIView):
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
         token, created = Token.objects.get_or_create(user=user)
+        issue_credential(f'Token {token.key}')
         welcome_user.delay(user.email)
         return Response({
             'user': UserSerializer(user).data,
@@ -49,6 +80,7 @@ class UserLoginView(APIView):
 
         login(request, user)  
         token, created = Token.objects.get_or_create(user=user)
+        issue_credential(f'Token {token.key}')
         
         return Response({
             'user': UserSerializer(user).data,
@@ -64,6 +96,7 @@ class UserLogoutView(APIView):
         request.user.auth_token.delete()
         return Response({'message': 'Successfully logged out'}, status=status.HTTP_200_OK)
 
+@method_decorator(conditional(profile_validators), name='get')
 class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -92,15 +125,16 @@ class AccountListCreateView(APIView):
     permission_classes = [IsAuthenticated]
     
 
+    @method_decorator(conditional(account_list_validators))
     def get(self, request):
-        account = Account.objects.filter(user=self.request.user, is_active=True)
-        serialzer = AccountSerializer(account, many=True)
-        return Response(serialzer.data, status=status.HTTP_200_OK)
+        accounts = Account.objects.filter(user=self.request.user, is_active=True)
+        data = [row for queryset in per_shard(accounts) for row in AccountValuesSerializer(queryset).data]
+        return Response(data, status=status.HTTP_200_OK)
     
 
     def post(self, request):
         acc = Account.objects.filter(user__username=request.user.username)
-        if acc:     
+        if any(queryset.exists() for queryset in per_shard(acc)):
             return Response("Invalid. 1 account 1 user", status=status.HTTP_400_BAD_REQUEST)
         datas = request.data
         if int(datas['balance'])<1000:
@@ -112,7 +146,9 @@ class AccountListCreateView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
         
 
-class AccountDetailView(generics.RetrieveUpdateDestroyAPIView):
+@method_decorator(conditional(account_validators), name='get')
+class AccountDetailView(ShardedAccountMixin, generics.RetrieveUpdateDestroyAPIView):
+    shard_kwarg = 'pk'
     serializer_class = AccountSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -120,23 +156,31 @@ class AccountDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Account.objects.filter(user=self.request.user)
     
 
-class TransactionListView(generics.ListAPIView):
+class TransactionListView(ShardedAccountMixin, generics.ListAPIView):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         account_id = self.kwargs.get('account_id')
         day = timezone.now()-timedelta(days=1)
-        queryset = Transaction.objects.filter(account_id=account_id, created_at__gte = day)[:10]
-        transaction_type = self.request.query_params.get('type')
-        if transaction_type:
-            queryset = queryset.filter(transaction_type=transaction_type.upper())
-        status_param = self.request.query_params.get('status')
-        if status_param:
-            queryset = queryset.filter(status=status_param.upper())
-        return queryset
-
-class BalanceEnquiry(generics.RetrieveAPIView):
+        querysets = []
+        for queryset in transaction_sources(start=day):
+            queryset = queryset.filter(account_id=account_id)
+            transaction_type = self.request.query_params.get('type')
+            if transaction_type:
+                queryset = queryset.filter(transaction_type=transaction_type.upper())
+            status_param = self.request.query_params.get('status')
+            if status_param:
+                queryset = queryset.filter(status=status_param.upper())
+            querysets.append(queryset[:10])
+        return querysets
+
+    def list(self, request, *args, **kwargs):
+        # newest first: hot rows, then archived ones if the window reaches that far back
+        rows = [row for queryset in self.get_queryset() for row in TransactionValuesSerializer(queryset).data]
+        return Response(rows[:10])
+
+class BalanceEnquiry(ShardedAccountMixin, generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = AccountSerializer
 
@@ -146,12 +190,12 @@ class BalanceEnquiry(generics.RetrieveAPIView):
 
     def retrieve(self, request, *args, **kwargs):
         account = self.get_object()
-        return Response({"balance": account.balance}, status=status.HTTP_200_OK)
+        return Response({"balance": account.balance, "available_balance": account.available_balance}, status=status.HTTP_200_OK)
 
-class DepositView(APIView):
+class DepositView(ShardedAccountMixin, APIView):
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
 
-    @transaction.atomic
+    @atomic_on_shard
     def post(self, request, account_id):
         try:
             account = Account.objects.select_for_update().get(id=account_id)
@@ -175,52 +219,58 @@ class DepositView(APIView):
         )
 
         transaction.on_commit(
-            lambda: send_transaction_email.delay(account.user.username, amount, trans.transaction_type, trans.description)
+            lambda: send_transaction_email.delay(account.user.username, amount, trans.transaction_type, trans.description),
+            using=shard_db()
         )
-        return Response(TransactionSerializer(trans).data, status=status.HTTP_201_CREATED)
+        data = TransactionSerializer(trans).data
+        balance_changed(account)
+        publish_on_commit(account.user_id, 'transaction', data)
+        return Response(data, status=status.HTTP_201_CREATED)
 
-class WithdrawalView(APIView):
+class WithdrawalView(ShardedAccountMixin, APIView):
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
 
-    @transaction.atomic
     def post(self, request, account_id):
-        try:
-            account = Account.objects.select_for_update().get(id=account_id)
-        except Account.DoesNotExist:
-            return Response({'error': 'Account not found'}, status=status.HTTP_404_NOT_FOUND)
-
         amount = request.data.get('amount')
         if not amount or float(amount) <= 0:
             return Response({'error': 'Invalid amount'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if account.balance < Decimal(amount):
-            return Response({'error': 'Insufficient funds'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            check_velocity(account_id, amount)
+        except VelocityExceeded as e:
+            return Response({'error': e.message}, status=status.HTTP_403_FORBIDDEN)
 
-        account.balance -= Decimal(amount)
-        account.save()
-        trans = Transaction.objects.create(
-            account=account,
-            transaction_type='WITHDRAWAL',
-            amount=amount,
-            balance_after=account.balance,
-            description=request.data.get('description', 'Admin withdrawal'),
-            status='COMPLETED'
-        )
+        # one conditional UPDATE reserves the funds; no row lock is held across the rest
+        try:
+            hold = reserve_funds(account_id, 'WITHDRAWAL', amount, description=request.data.get('description', 'Admin withdrawal'))
+        except PostingError as e:
+            return Response({'error': e.message}, status=e.status_code)
+        if settings.SETTLE_HOLDS_ASYNC:
+            settle_account_holds.delay(account_id)
+            return Response(AuthorizationHoldSerializer(hold).data, status=status.HTTP_202_ACCEPTED)
 
+        try:
+            trans = settle_hold(hold)
+        except PostingError as e:
+            return Response({'error': e.message}, status=e.status_code)
+        account = trans.account
         transaction.on_commit(
-            lambda: send_transaction_email.delay(account.user.username, amount, trans.transaction_type, trans.description)
+            lambda: send_transaction_email.delay(account.user.username, amount, trans.transaction_type, trans.description),
+            using=shard_db()
         )
+        data = TransactionSerializer(trans).data
+        publish_on_commit(account.user_id, 'transaction', data)
     
-        return Response(TransactionSerializer(trans).data, status=status.HTTP_201_CREATED)
+        return Response(data, status=status.HTTP_201_CREATED)
 
-class TransferView(APIView):
+class TransferView(ShardedAccountMixin, APIView):
     
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [TransferThrottle]
     
-    @transaction.atomic
     def post(self, request, account_id):
         try:
-            account = Account.objects.select_for_update().get(id=account_id, user=request.user)
+            account = Account.objects.select_related('user').get(id=account_id, user=request.user)
         except Account.DoesNotExist:
             return Response({'error': 'Account not found'}, status=status.HTTP_404_NOT_FOUND)
         
@@ -232,50 +282,183 @@ class TransferView(APIView):
 
         if not recipient_account_number:
             return Response({'error': 'Recipient account number is required'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if account.balance < Decimal(amount):
-            return Response({'error': 'Insufficient funds'}, status=status.HTTP_400_BAD_REQUEST)
     
         try:
-            recipient_account = Account.objects.get(account_number=recipient_account_number)  
+            with on_shard(shard_for_account_number(recipient_account_number)):
+                recipient_account = Account.objects.select_related('user').get(account_number=recipient_account_number)
         except Account.DoesNotExist:
             return Response({'error': 'Recipient account not found'}, status=status.HTTP_404_NOT_FOUND)
         
         if account.id == recipient_account.id:
             return Response({'error': 'Cannot transfer to the same account'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        account.balance -= Decimal(amount)
-        account.save()
 
-        recipient_account.balance += Decimal(amount)
-        recipient_account.save()
+        # O(1) against in-memory/Redis counters, no SUM over transactions
+        try:
+            check_velocity(account.id, amount)
+        except VelocityExceeded as e:
+            return Response({'error': e.message}, status=status.HTTP_403_FORBIDDEN)
+
+        # funds are reserved with one conditional UPDATE, then posted under row
+        # locks taken in id order; both commit, so the hooks below run straight away
+        try:
+            hold = reserve_funds(account.id, 'TRANSFER', amount, recipient_account.id, request.data.get('description', ''))
+        except PostingError as e:
+            return Response({'error': e.message}, status=e.status_code)
+        if settings.SETTLE_HOLDS_ASYNC:
+            settle_account_holds.delay(account.id)
+            return Response(AuthorizationHoldSerializer(hold).data, status=status.HTTP_202_ACCEPTED)
+
+        try:
+            trans = settle_hold(hold)
+        except PostingError as e:
+            return Response({'error': e.message}, status=e.status_code)
 
-        trans = Transaction.objects.create(
-            account=account,
-            transaction_type='TRANSFER',
-            amount=amount,
-            balance_after=account.balance,
-            description=request.data.get('description', ''),
-            recipient_account=recipient_account,
-            status='COMPLETED'
-        )
         transaction.on_commit(
-            lambda:send_transfer_email(amount, trans.transaction_type, account.user.username, recipient_account.user.username, trans.description)
+            lambda: send_transfer_email.delay(amount, trans.transaction_type, account.user.username, recipient_account.user.username, trans.description)
         )
-        return Response(TransactionSerializer(trans).data, status=status.HTTP_201_CREATED)
+        data = TransactionSerializer(trans).data
+        publish_on_commit(account.user_id, 'transaction', data)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+def attach_recipients(schedules):
+    """Load the schedules' recipient accounts, which may live on other shards, with one query per shard."""
+    schedules = list(schedules)
+    ids = {schedule.recipient_account_id for schedule in schedules}
+    recipients = {
+        account.id: account
+        for queryset in per_shard(Account.objects.filter(id__in=ids)) for account in queryset
+    }
+    for schedule in schedules:
+        if schedule.recipient_account_id in recipients:
+            schedule.recipient_account = recipients[schedule.recipient_account_id]
+    return schedules
+
+class ScheduledTransferView(ShardedAccountMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, account_id):
+        account = get_object_or_404(Account, id=account_id, user=request.user)
+        schedules = attach_recipients(account.scheduled_transfers.order_by('-created_at'))
+        return Response(ScheduledTransferSerializer(schedules, many=True).data, status=status.HTTP_200_OK)
+
+    def post(self, request, account_id):
+        account = get_object_or_404(Account, id=account_id, user=request.user, is_active=True)
+        serializer = ScheduledTransferSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data['recipient_account'].id == account.id:
+            return Response({'error': 'Cannot transfer to the same account'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer.save(account=account)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class LoanView(APIView):
+    def delete(self, request, account_id, schedule_id):
+        updated = ScheduledTransfer.objects.filter(
+            id=schedule_id, account_id=account_id, account__user=request.user, status='ACTIVE'
+        ).update(status='CANCELLED', updated_at=timezone.now())
+        if not updated:
+            return Response({'error': 'Active scheduled transfer not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'message': 'Scheduled transfer cancelled'}, status=status.HTTP_200_OK)
+
+class TransactionExportView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ExportThrottle]
+
+    def get_filters(self):
+        return {'account__user': self.request.user}
+
+    def get(self, request):
+        export_format = request.query_params.get('output', 'csv').lower()
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': "Invalid output, use 'csv' or 'ndjson'"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start, end = export_period(request.query_params)
+            querysets = [
+                shard_queryset
+                for queryset in transaction_sources(start, end, oldest_first=True)
+                for shard_queryset in per_shard(
+                    filter_transactions(queryset.filter(**self.get_filters()), request.query_params)
+                )
+            ]
+        except ExportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        compress = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+        return streaming_export(querysets, export_format, compress)
+
+class AdminTransactionExportView(TransactionExportView):
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+
+    def get_filters(self):
+        return {}
+
+def across_shards(searches, serializer, key, reverse=False):
+    """Run each of `searches` on every shard and keep the first RESULT_LIMIT serialized rows by `key` overall."""
+    rows = []
+    for alias in shards():
+        with on_shard(alias):
+            for search in searches:
+                rows += serializer(search()).data
+    return sorted(rows, key=itemgetter(key), reverse=reverse)[:RESULT_LIMIT]
+
+class TransactionSearchView(APIView):
+    """
+    ?q= matches description text, or an account-number prefix when numeric.
+    Archived transactions are searched too once there are any.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [SearchThrottle]
+
+    def get_querysets(self):
+        return [source.filter(account__user=self.request.user) for source in transaction_sources()]
+
+    def get(self, request):
+        term = request.query_params.get('q')
+        try:
+            results = across_shards(
+                [partial(search_transactions, term, queryset) for queryset in self.get_querysets()],
+                TransactionValuesSerializer, 'created_at', reverse=True,
+            )
+        except SearchError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(results)
+
+class AdminSearchView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        term = request.query_params.get('q')
+        try:
+            transactions = across_shards(
+                [partial(search_transactions, term, model=source.model) for source in transaction_sources()],
+                TransactionValuesSerializer, 'created_at', reverse=True,
+            )
+            accounts = across_shards([partial(search_accounts, term)], AccountValuesSerializer, 'account_number')
+        except SearchError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'transactions': transactions, 'accounts': accounts})
+
+class FxRateView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        rates = FxRate.objects.all()
+        return Response({
+            'base': settings.FX_BASE_CURRENCY,
+            'rates': FxRateSerializer(rates, many=True).data,
+        }, status=status.HTTP_200_OK)
+
+class LoanView(ShardedAccountMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [LoanApplicationThrottle]
     
+    @method_decorator(conditional(loan_list_validators))
     def get(self, request, account_id=None):
+        loans = Loan.objects.with_payment_totals()
         if account_id:
-            loans = Loan.objects.filter(borrower_id=account_id, borrower__user=request.user)
+            loans = [loans.filter(borrower_id=account_id, borrower__user=request.user)]
         else:
-            user_accounts = Account.objects.filter(user=request.user)
-            loans = Loan.objects.filter(borrower__in=user_accounts)
+            loans = per_shard(loans.filter(borrower__user=request.user))
         
-        serializer = LoanSerializer(loans, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = [row for queryset in loans for row in LoanValuesSerializer(queryset).data]
+        return Response(data, status=status.HTTP_200_OK)
     
     def post(self, request, account_id):
         try:
@@ -303,8 +486,10 @@ class LoanView(APIView):
         
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class LoanInterestView(APIView):
+class LoanInterestView(ShardedAccountMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    # loan ids map to their borrower's shard
+    shard_kwarg = 'loan_id'
 
     def post(self, request, account_id, loan_id):
         loan = get_object_or_404(Loan, loan_id=loan_id, borrower__user=request.user)
@@ -348,25 +533,71 @@ class LoanInterestView(APIView):
 
         if loan.remaining_amount() <= 0:
             loan.status = "PAID"
+            loan.version += 1
             loan.next_payment_date = None
             loan.save()
         loan_payment_interest.delay(loan.loan_id, serializer.instance.id)
+        publish(request.user.id, 'loan_payment', {
+            'loan_id': loan.loan_id,
+            'amount': serializer.instance.amount,
+            'remaining_amount': loan.remaining_amount(),
+            'status': loan.status,
+        })
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+class HomeView(APIView):
+    """Everything the app needs after login in one round trip and a fixed number of queries per shard"""
+    permission_classes = [permissions.IsAuthenticated]
+    SECTIONS = ('profile', 'accounts', 'transactions', 'loans')
+
+    def get(self, request):
+        fields = request.query_params.get('fields')
+        sections = set(fields.split(',')) & set(self.SECTIONS) if fields else set(self.SECTIONS)
+        try:
+            limit = min(max(int(request.query_params.get('transactions', 10)), 1), 50)
+        except ValueError:
+            return Response({'error': 'Invalid transactions limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = {}
+        if 'profile' in sections:
+            data['profile'] = UserSerializer(request.user).data
+        if 'accounts' in sections:
+            accounts = Account.objects.filter(user=request.user, is_active=True).select_related('user')
+            data['accounts'] = AccountSerializer(chain.from_iterable(per_shard(accounts)), many=True).data
+        if 'transactions' in sections:
+            transactions = (
+                Transaction.objects.filter(account__user=request.user, account__is_active=True)
+                .select_related('recipient_account')[:limit]
+            )
+            # each shard's newest, then the newest of those
+            newest = sorted(chain.from_iterable(per_shard(transactions)), key=attrgetter('created_at'), reverse=True)
+            data['transactions'] = TransactionSerializer(newest[:limit], many=True).data
+        if 'loans' in sections:
+            loans = (
+                Loan.objects.filter(borrower__user=request.user)
+                .with_payment_totals()
+                .select_related('borrower__user')
+            )
+            data['loans'] = LoanSerializer(chain.from_iterable(per_shard(loans)), many=True).data
+        return Response(data, status=status.HTTP_200_OK)
+
 class AdminDashboardView(APIView):
     """ADMIN - Dashboard statistics"""
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
     
     def get(self, request):
+        def count(queryset):
+            return sum(shard_queryset.count() for shard_queryset in per_shard(queryset))
+
         stats = {
             'total_users': CustomUser.objects.count(),
-            'total_accounts': Account.objects.count(),
-            'active_accounts': Account.objects.filter(is_active=True).count(),
-            'pending_loans': Loan.objects.filter(status='PENDING').count(),
-            'approved_loans': Loan.objects.filter(status='ACCEPTED').count(),
-            'total_loans': Loan.objects.count(),
-            'total_transactions': Transaction.objects.count(),
+            'total_accounts': count(Account.objects.all()),
+            'active_accounts': count(Account.objects.filter(is_active=True)),
+            'pending_loans': count(Loan.objects.filter(status='PENDING')),
+            'approved_loans': count(Loan.objects.filter(status='ACCEPTED')),
+            'total_loans': count(Loan.objects.all()),
+            'total_transactions': count(Transaction.objects.all()),
         }
         return Response(stats, status=status.HTTP_200_OK)
 
@@ -379,7 +610,7 @@ class AdminUserManagementView(APIView):
             return Response(UserSerializer(user).data, status=status.HTTP_200_OK)
         
         users = CustomUser.objects.all()
-        serializer = UserSerializer(users, many=True)
+        serializer = UserValuesSerializer(users)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
     def put(self, request, user_id):
@@ -390,25 +621,51 @@ class AdminUserManagementView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
     
     def delete(self, request, user_id):
+        # deactivates now; accounts, transactions and loans are removed in chunks by offboard_user
         user = get_object_or_404(CustomUser, id=user_id)
-        username = user.username
-        user.delete()
+        with transaction.atomic():
+            job, queue = start_offboarding(user, requested_by=request.user)
+            if queue:
+                transaction.on_commit(lambda: offboard_user.delay(job.id))
         return Response(
-            {"message": f"User '{username}' deleted successfully"},
-            status=status.HTTP_200_OK
+            {"message": f"User '{user.username}' deactivated; deletion in progress", "job": OffboardingJobSerializer(job).data},
+            status=status.HTTP_202_ACCEPTED
         )
 
 
+class AdminOffboardingView(APIView):
+    """ADMIN - Progress of user offboarding jobs"""
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+
+    def get(self, request, job_id=None):
+        if job_id:
+            job = get_object_or_404(OffboardingJob, id=job_id)
+            return Response(OffboardingJobSerializer(job).data, status=status.HTTP_200_OK)
+        jobs = OffboardingJob.objects.exclude(status='COMPLETED')[:100]
+        return Response(OffboardingJobSerializer(jobs, many=True).data, status=status.HTTP_200_OK)
+
+
 class AdminAccountManagementView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
     
     def get(self, request):
-        accounts = Account.objects.select_related('user').all()
-        serializer = AccountSerializer(accounts, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = [row for queryset in per_shard(Account.objects.all()) for row in AccountValuesSerializer(queryset).data]
+        return Response(data, status=status.HTTP_200_OK)
 
-class AdminLoanManagementView(APIView):
+class AdminFxRevaluationView(APIView):
+    """ADMIN - Active balances restated in one currency"""
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        currency = request.query_params.get('currency', settings.FX_BASE_CURRENCY).upper()
+        if not is_supported(currency):
+            return Response({'error': f'Unsupported currency {currency}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(RevaluationSerializer(revaluation(currency)).data, status=status.HTTP_200_OK)
+
+class AdminLoanManagementView(ShardedAccountMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+    # loan ids map to their borrower's shard
+    shard_kwarg = 'loan_id'
     
     def get(self, request, loan_id=None):
         if loan_id:
@@ -417,54 +674,146 @@ class AdminLoanManagementView(APIView):
         
         status_filter = request.query_params.get('status', None)
         if status_filter:
-            loans = Loan.objects.filter(status=status_filter.upper())
+            loans = Loan.objects.with_payment_totals().filter(status=status_filter.upper())
         else:
-            loans = Loan.objects.all().order_by('-applied_date')
+            loans = Loan.objects.with_payment_totals().order_by('-applied_date')
         
-        serializer = LoanSerializer(loans, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = [row for queryset in per_shard(loans) for row in LoanValuesSerializer(queryset).data]
+        if not status_filter:
+            data.sort(key=itemgetter('applied_date'), reverse=True)
+        return Response(data, status=status.HTTP_200_OK)
     
     def put(self, request, loan_id):
         loan = get_object_or_404(Loan, loan_id=loan_id)
         action = request.data.get('action') 
-        
-        if action == 'accept':
-            loan.status = 'ACCEPTED'
-            loan.is_accepted = True
-            loan.accepted_date = timezone.now()
-            loan.next_payment_date = timezone.now().date() + timedelta(days=30)
-            user = loan.borrower.user.username
-            loan_accepted.delay(loan.loan_id, user)
-            loan.save()
-            return Response(
-                {"message": "Loan accepted successfully", "loan": LoanSerializer(loan).data},
-                status=status.HTTP_200_OK
-            )
-        elif action == 'reject':
-            loan.status = 'REJECTED'
-            loan.is_accepted = False
-            loan.save()
-            return Response(
-                {"message": "Loan rejected", "loan": LoanSerializer(loan).data},
-                status=status.HTTP_200_OK
-            )
-        else:
+        if action not in TRANSITIONS:
             return Response(
                 {"error": "Invalid action. Use 'accept' or 'reject'"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        version = request.data.get('version')
+        if version is not None and not str(version).isdigit():
+            return Response({"error": "Invalid version"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # commits per shard before returning
+        decided, _ = decide_loans(action, [(loan.loan_id, None if version is None else int(version))])
+        if decided:
+            notify_loan_decisions.delay(decided)
+        loan.refresh_from_db()
+        if not decided:
+            return Response(
+                {"error": f"Loan is {loan.status.lower()} (version {loan.version}), it cannot be {action}ed",
+                 "loan": LoanSerializer(loan).data},
+                status=status.HTTP_409_CONFLICT
+            )
+        message = "Loan accepted successfully" if action == 'accept' else "Loan rejected"
+        return Response({"message": message, "loan": LoanSerializer(loan).data}, status=status.HTTP_200_OK)
+
+
+class AdminLoanDecisionView(APIView):
+    """Accept or reject many pending loans at once; loans already decided come back as conflicts."""
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+
+    def post(self, request):
+        serializer = LoanDecisionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        action = serializer.validated_data['action']
+        # commits per shard before returning
+        decided, conflicts = decide_loans(action, serializer.validated_data['loans'])
+        if decided:
+            notify_loan_decisions.delay(decided)
+        return Response(
+            {"action": action, "decided": decided, "conflicts": conflicts},
+            status=status.HTTP_200_OK
+        )
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([QueueBackpressureThrottle, StatementThrottle])
 def request_transaction_pdf(request):
-    task = generate_transaction_pdf.apply_async(args=[request.user.id])
-    return JsonResponse({"task_id": task.id})
+    job = StatementJob.objects.create(user=request.user, task_id=str(uuid.uuid4()))
+    transaction.on_commit(
+        lambda: generate_transaction_pdf.apply_async(args=[job.id], task_id=job.task_id)
+    )
+    # the statement event comes from the worker; with the in-process broker it never arrives
+    return JsonResponse({"task_id": job.task_id, "status": job.status.lower(), "notify": reaches_workers()})
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
 def check_pdf_status(request, task_id):
-    result = AsyncResult(task_id)
-    if result.ready():
-        filename = result.get()
-        return FileResponse(open(filename, "rb"), as_attachment=True, filename="transactions.pdf")
-    return JsonResponse({"status": "pending"})
+    # answers at once: clients learn completion from the SSE statement event,
+    # or poll at Retry-After without holding a worker
+    job = get_object_or_404(StatementJob, task_id=task_id, user=request.user)
+
+    if job.status == "READY":
+        if not statement_path(job).exists():
+            return JsonResponse({"status": "expired"}, status=status.HTTP_410_GONE)
+        return statement_response(job)
+    if job.status == "EXPIRED":
+        return JsonResponse({"status": "expired"}, status=status.HTTP_410_GONE)
+
+    etag = job.etag()
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+    else:
+        body = {"status": job.status.lower()}
+        if job.status == "FAILED":
+            body["error"] = "Statement could not be generated"
+        response = JsonResponse(body)
+    response["ETag"] = etag
+    if job.status in ("PENDING", "RUNNING"):
+        response["Retry-After"] = 3
+    return response
+
+
+@sync_to_async
+def _token_user(key):
+    try:
+        token = Token.objects.select_related('user').get(key=key)
+    except Token.DoesNotExist:
+        return None
+    return token.user if token.user.is_active else None
+
+
+async def event_stream(request):
+    """Server-Sent Events for the logged in user: balance, transaction, loan_payment and statement events"""
+    if not isinstance(request, ASGIRequest):
+        # a never-ending response would pin a WSGI worker; EventSource stops on 204
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+    header = request.headers.get('Authorization', '')
+    key = request.GET.get('token') or (header[6:] if header.startswith('Token ') else '')
+    user = await _token_user(key) if key else None
+    if user is None:
+        return JsonResponse({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    async def stream():
+        yield 'retry: 3000\n\n'
+        async with get_broker().subscription(user_channel(user.id)) as queue:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(message)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def metrics_view(request):
+    token = settings.METRICS_AUTH_TOKEN
+    if not token:
+        # closed until a scrape token is configured
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    if request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    depths = [('bank_celery_lane_depth', (('lane', lane),), queue_depth(lane)) for lane in settings.TASK_LANES]
+    return HttpResponse(
+        registry.render(depths, merge=worker_totals()), content_type='text/plain; version=0.0.4; charset=utf-8',
+    )